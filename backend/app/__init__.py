@@ -21,25 +21,94 @@ def create_app(config=None):
     if config:
         app.config.update(config)
     
+    # Structured application logging; DEBUG also enables the diagnostic passes
+    from .log import configure_logging
+    configure_logging(
+        app.config.get('LOG_LEVEL', 'INFO'),
+        app.config.get('LOG_FORMAT', 'text'),
+        app.config.get('LOG_SAMPLING', True)
+    )
+    
+    # Time each startup phase so cold starts can be kept within budget
+    from .util.startup import StartupTimer
+    timer = StartupTimer(app.config.get('STARTUP_BUDGET_SECONDS'))
+    
     # Initialize SocketIO with app
-    socketio.init_app(app)
+    with timer.phase('socketio'):
+        socketio.init_app(app)
+    
+    # Bind the update broadcaster to SocketIO
+    with timer.phase('import socket'):
+        from .socket import register_socket_handlers, broadcaster
+    broadcaster.init_app(
+        socketio,
+        app.config.get('BROADCAST_WINDOW'),
+        app.config.get('BROADCAST_MAX_BATCH')
+    )
     
-    # Initialize database
-    from .util import init_db
-    init_db(recreate=True)
+    # Configure the connection pool and initialize database; existing data is
+    # kept unless a fresh database is explicitly requested
+    from .util import configure_pool, init_db
+    configure_pool(
+        app.config.get('DB_FILE'),
+        app.config.get('DB_POOL_SIZE'),
+        app.config.get('DB_POOL_TIMEOUT')
+    )
+    
+    # Size the in-memory hot tier for recent readings
+    from .models.hot_store import hot_readings
+    hot_readings.configure(
+        app.config.get('HOT_TIER_HOURS'),
+        app.config.get('HOT_TIER_CAPACITY'),
+        app.config.get('HOT_TIER_MAX_PATIENTS')
+    )
+    with timer.phase('db init'):
+        init_db(recreate=app.config.get('DB_RECREATE_ON_START', False))
     
     # Load patient data
-    from .services.patient_service import PatientService
-    PatientService.load_patient_csv()
+    with timer.phase('import services'):
+        from .services.patient_service import PatientService
+        from .services.data_flow_service import DataFlowService
+    with timer.phase('patient csv'):
+        PatientService.load_patient_csv(persist=app.config.get('PATIENT_CSV_PERSIST', False))
+    
+    # Size the write-behind ingestion queue and commit what it holds on SIGTERM
+    from .services.ingest_queue import ingest_queue
+    ingest_queue.configure(
+        app.config.get('INGEST_MAX_DEPTH'),
+        app.config.get('INGEST_BATCH_SIZE'),
+        app.config.get('INGEST_MAX_DELAY')
+    )
+    ingest_queue.drain_on_signal()
+    
+    # Throttle data flows nobody is subscribed to, if configured
+    DataFlowService.IDLE_INTERVAL = app.config.get('DATA_FLOW_IDLE_INTERVAL', DataFlowService.IDLE_INTERVAL)
     
     # Register socket handlers
-    from .socket import register_socket_handlers
     register_socket_handlers(socketio)
     
     # Register routes
-    from .routes import register_routes
+    with timer.phase('import routes'):
+        from .routes import register_routes
     register_routes(app)
     
+    # Register CLI commands
+    with timer.phase('import commands'):
+        from .commands import register_commands
+    register_commands(app)
+    
+    # Profile requests that ask for it; without the setting nothing is wrapped
+    if app.config.get('PROFILING_ENABLED'):
+        from .util.profiling import RequestProfiler
+        app.wsgi_app = RequestProfiler(
+            app.wsgi_app,
+            os.path.abspath(app.config.get('PROFILE_DIR', 'instance/profiles')),
+            app.config.get('PROFILE_KEEP', 50),
+            app.config.get('PROFILE_SAMPLE_INTERVAL', 0.001)
+        )
+    
+    app.extensions['startup_timing'] = timer.log_report()
+    
     # Define index route
     @app.route('/')
     def index():
@@ -0,0 +1,52 @@
+"""
+CLI commands - Flask command line tasks
+"""
+import sqlite3
+import click
+from .services.cohort_service import CohortService
+from .util import db
+from .util.migrations import run_migrations
+
+def register_commands(app):
+    """Register all CLI commands with the Flask app"""
+    
+    @app.cli.command('init-cohort')
+    @click.option('--type', 'patient_type', default=None, help='Only initialize patients of this type')
+    @click.option('--days', default=1, show_default=True, help='Days of history per patient')
+    @click.option('--workers', type=int, default=None, help='Generator processes (default: CPU count)')
+    @click.option('--seed', type=int, default=None, help='Seed for reproducible histories')
+    def init_cohort(patient_type, days, workers, seed):
+        """Generate and bulk-load glucose histories for a whole cohort"""
+        def report(done, total, readings, elapsed):
+            click.echo(f"  {done}/{total} patients, {readings} readings, "
+                       f"{readings / elapsed if elapsed else 0:,.0f} readings/s")
+        
+        result = CohortService.initialize_cohort(
+            patient_type=patient_type, days=days, workers=workers, seed=seed, progress=report
+        )
+        
+        if isinstance(result, tuple):
+            raise click.ClickException(result[0]['error'])
+        
+        click.echo(f"Initialized {result['patients']} patients with {result['data_points']} readings "
+                   f"in {result['elapsed_seconds']}s ({result['readings_per_second']:,.0f} readings/s)")
+
+    
+    @app.cli.command('migrate-db')
+    @click.argument('db_file', required=False)
+    @click.option('--vacuum', is_flag=True, help='Reclaim the space freed by the migration')
+    def migrate_db(db_file, vacuum):
+        """Bring a database file (default: the app's) up to the current schema"""
+        db_file = db_file or db.DB_FILE
+        conn = sqlite3.connect(db_file)
+        try:
+            results = run_migrations(conn)
+            if not results:
+                click.echo(f"{db_file} is up to date")
+            for name, result in results.items():
+                click.echo(f"{name}: migrated {result['migrated']} rows, skipped {result['skipped']} "
+                           f"unparseable rows in {result['seconds']}s")
+            if vacuum:
+                conn.execute("VACUUM")
+        finally:
+            conn.close()
@@ -0,0 +1,153 @@
+"""
+Logging - Structured, leveled application logging with sampling
+
+Modules log named events with key=value fields instead of printing:
+
+    log = get_logger(__name__)
+    log.info('flow_started', patient_id=patient_id, interval=interval)
+    log.debug('tick', sample=100, due=len(due))    # keep 1 in 100
+
+Messages below the configured level cost one level check. Diagnostics that
+need extra work to compute should be guarded with `if log.debug_enabled:`
+so they are skipped entirely unless LOG_LEVEL is DEBUG.
+"""
+import json
+import logging
+import sys
+import threading
+import time
+
+# Parent of every application logger
+ROOT_LOGGER = 'glucose'
+
+_PACKAGE_PREFIX = 'backend.app.'
+
+
+class StructuredFormatter(logging.Formatter):
+    """Renders records as `time LEVEL logger event key=value ...` or one JSON object per line"""
+
+    def __init__(self, json_lines=False):
+        super().__init__()
+        self.json_lines = json_lines
+
+    def format(self, record):
+        fields = getattr(record, 'fields', None) or {}
+        sample = getattr(record, 'sample', 1)
+
+        if self.json_lines:
+            entry = {
+                'time': round(record.created, 3),
+                'level': record.levelname,
+                'logger': record.name,
+                'event': record.getMessage()
+            }
+            entry.update(fields)
+            if sample > 1:
+                entry['sample'] = sample
+            if record.exc_info:
+                entry['exc_info'] = self.formatException(record.exc_info)
+            return json.dumps(entry, default=str)
+
+        parts = [
+            time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record.created)),
+            f"{record.levelname:<7}",
+            record.name,
+            record.getMessage()
+        ]
+        parts.extend(f"{key}={value}" for key, value in fields.items())
+        if sample > 1:
+            parts.append(f"sample=1/{sample}")
+        line = ' '.join(parts)
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+class SamplingFilter(logging.Filter):
+    """Passes one in `sample` records per call site for records logged with sample > 1"""
+
+    def __init__(self, enabled=True):
+        super().__init__()
+        self.enabled = enabled
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        sample = getattr(record, 'sample', 1)
+        if sample <= 1 or not self.enabled:
+            return True
+        key = (record.name, record.lineno)
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        return count % sample == 0
+
+
+class StructuredLogger:
+    """Thin wrapper over a stdlib logger taking an event name plus keyword fields"""
+
+    __slots__ = ('_logger',)
+
+    def __init__(self, logger):
+        self._logger = logger
+
+    @property
+    def name(self):
+        return self._logger.name
+
+    @property
+    def debug_enabled(self):
+        """True when DEBUG records would be emitted; guard expensive diagnostics with it"""
+        return self._logger.isEnabledFor(logging.DEBUG)
+
+    def _log(self, level, event, sample, exc_info, fields):
+        if self._logger.isEnabledFor(level):
+            # stacklevel points the record (and the sampling key) at our caller
+            self._logger.log(
+                level, event, exc_info=exc_info, stacklevel=3,
+                extra={'fields': fields, 'sample': sample}
+            )
+
+    def debug(self, event, sample=1, **fields):
+        self._log(logging.DEBUG, event, sample, None, fields)
+
+    def info(self, event, sample=1, **fields):
+        self._log(logging.INFO, event, sample, None, fields)
+
+    def warning(self, event, sample=1, **fields):
+        self._log(logging.WARNING, event, sample, None, fields)
+
+    def error(self, event, sample=1, **fields):
+        self._log(logging.ERROR, event, sample, None, fields)
+
+    def exception(self, event, sample=1, **fields):
+        """Log at ERROR with the current exception's traceback"""
+        self._log(logging.ERROR, event, sample, True, fields)
+
+
+def get_logger(name):
+    """Get the structured logger for a module, e.g. get_logger(__name__)"""
+    if name.startswith(_PACKAGE_PREFIX):
+        name = name[len(_PACKAGE_PREFIX):]
+    return StructuredLogger(logging.getLogger(f"{ROOT_LOGGER}.{name}"))
+
+
+def configure_logging(level='INFO', fmt='text', sampling=True, stream=None):
+    """Install the structured handler on the application's root logger
+
+    `fmt` is 'text' or 'json'; with sampling=False every sampled record is kept.
+    Calling again replaces the previous configuration.
+    """
+    root = logging.getLogger(ROOT_LOGGER)
+    for handler in list(root.handlers):
+        if getattr(handler, '_structured', False):
+            root.removeHandler(handler)
+
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler._structured = True
+    handler.setFormatter(StructuredFormatter(json_lines=fmt == 'json'))
+    handler.addFilter(SamplingFilter(sampling))
+    root.addHandler(handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    root.propagate = False
+    return root
@@ -0,0 +1,267 @@
+"""
+Metrics - In-process counters, gauges and histograms rendered in the Prometheus text format
+
+Modules declare their metrics once at import and update them on the hot path:
+
+    READINGS_INSERTED = metrics.counter('glucose_readings_inserted_total', 'Readings inserted into SQLite')
+    READINGS_INSERTED.inc(len(rows))
+
+    REQUEST_SECONDS = metrics.histogram('glucose_http_request_duration_seconds', 'HTTP request latency',
+                                        ('method', 'route'))
+    REQUEST_SECONDS.labels('GET', '/glucose/<patient_id>').observe(elapsed)
+
+Everything lives in this process and is scraped from GET /metrics; no client
+library, push gateway or other service is involved. Values that other
+components already keep (pool sizes, queue depths, cache counters) are copied
+in by collectors run at scrape time, so they cost nothing between scrapes.
+"""
+import bisect
+import math
+import threading
+from .log import get_logger
+
+log = get_logger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds, from sub-millisecond cache hits to multi-second cohort loads
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    """A metric family; with label names, values are kept per label combination"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        # Metrics without labels have exactly one child, created up front so it renders as 0
+        self._default = None
+        if not self.labelnames:
+            self._default = self._children[()] = self._new_child()
+
+    def labels(self, *values):
+        """Get the child for one combination of label values"""
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _unlabelled(self):
+        if self._default is None:
+            raise ValueError(f"{self.name} has labels {self.labelnames}; use labels() first")
+        return self._default
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = sorted(self._children.items())
+        for values, child in children:
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+
+class _Value:
+    """Single number, shared by counter and gauge children"""
+
+    __slots__ = ('_lock', 'value')
+
+    def __init__(self, lock):
+        self._lock = lock
+        self.value = 0.0
+
+    def render(self, name, labelnames, values):
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(self.value)}"]
+
+
+class _CounterValue(_Value):
+    __slots__ = ()
+
+    def inc(self, amount=1):
+        if amount < 0:
+            raise ValueError('Counters can only increase')
+        with self._lock:
+            self.value += amount
+
+    def set_total(self, value):
+        """Mirror a cumulative count kept elsewhere (collectors only)"""
+        with self._lock:
+            self.value = value
+
+
+class _GaugeValue(_Value):
+    __slots__ = ()
+
+    def set(self, value):
+        with self._lock:
+            self.value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+
+class _HistogramValue:
+    __slots__ = ('_lock', '_upper_bounds', '_counts', '_sum')
+
+    def __init__(self, lock, upper_bounds):
+        self._lock = lock
+        self._upper_bounds = upper_bounds
+        # One slot per bucket plus +Inf, not cumulative until rendered
+        self._counts = [0] * (len(upper_bounds) + 1)
+        self._sum = 0.0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self._upper_bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def render(self, name, labelnames, values):
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self._upper_bounds + (math.inf,), counts):
+            cumulative += count
+            labels = _format_labels(labelnames, values, ('le', _format_value(bound)))
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        labels = _format_labels(labelnames, values)
+        lines.append(f"{name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{name}_count{labels} {cumulative}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterValue(self._lock)
+
+    def inc(self, amount=1):
+        self._unlabelled().inc(amount)
+
+    def set_total(self, value):
+        self._unlabelled().set_total(value)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeValue(self._lock)
+
+    def set(self, value):
+        self._unlabelled().set(value)
+
+    def inc(self, amount=1):
+        self._unlabelled().inc(amount)
+
+    def dec(self, amount=1):
+        self._unlabelled().dec(amount)
+
+
+class Histogram(_Metric):
+    """Distribution of observations over fixed buckets"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(float(bound) for bound in buckets if bound != math.inf))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self._lock, self.buckets)
+
+    def observe(self, value):
+        self._unlabelled().observe(value)
+
+
+class MetricsRegistry:
+    """Named metrics plus the collectors that refresh mirrored values before rendering"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._collectors = {}
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"{name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets)
+
+    def add_collector(self, name, collect):
+        """Run collect() before every render; registering a name again replaces it"""
+        with self._lock:
+            self._collectors[name] = collect
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            collectors = list(self._collectors.items())
+        for name, collect in collectors:
+            try:
+                collect()
+            except Exception:
+                log.exception('metrics_collector_failed', collector=name)
+        with self._lock:
+            families = sorted(self._metrics.items())
+        lines = []
+        for _, metric in families:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry, rendered by GET /metrics
+metrics = MetricsRegistry()
@@ -1,3 +1,8 @@
 # Import model classes
 from .patient import Patient
-from .glucose_reading import GlucoseReading 
\ No newline at end of file
+from .glucose_reading import GlucoseReading
+from .glucose_rollup import GlucoseRollup
+from .reading_cache import latest_readings
+from .hot_store import hot_readings
+from .series_version import series_versions
+from .data_version import DataVersion, cache_version
@@ -0,0 +1,106 @@
+"""
+Data version - Database-wide write counter that tells process-local caches when they are stale
+"""
+import threading
+from .reading_cache import latest_readings
+from .hot_store import hot_readings
+from .series_version import series_versions
+from ..log import get_logger
+
+log = get_logger(__name__)
+
+
+class DataVersion:
+    """Single row counting committed writes to glucose_reading
+
+    Every GlucoseReading write path bumps it inside its own transaction, so a
+    write from any process sharing the database file (other server workers,
+    the CLI, migrations) moves it on. Tools writing glucose_reading with plain
+    SQL must bump it too, or running servers keep serving what they cached.
+    """
+
+    _CREATE_TABLE = '''
+        CREATE TABLE IF NOT EXISTS data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    '''
+
+    @staticmethod
+    def create_table(conn):
+        """Create the data_version table and its row if they don't exist"""
+        cursor = conn.cursor()
+        cursor.execute(DataVersion._CREATE_TABLE)
+        cursor.execute("INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)")
+        conn.commit()
+
+    @staticmethod
+    def bump(cursor):
+        """Count a write in the caller's transaction (caller commits); returns the new version"""
+        cursor.execute("UPDATE data_version SET version = version + 1 WHERE id = 1")
+        # The write lock is held from the UPDATE on, so this reads our own increment
+        cursor.execute("SELECT version FROM data_version WHERE id = 1")
+        return cursor.fetchone()[0]
+
+    @staticmethod
+    def get(conn):
+        """Get the current version, or None if the table doesn't exist yet"""
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT version FROM data_version WHERE id = 1")
+        except Exception:
+            return None
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+
+class CacheVersion:
+    """The data version the latest-reading cache, hot tier and series versions reflect
+
+    Writes of this process move it along one version at a time. When the
+    database turns out to be at a version this process didn't write, someone
+    else changed readings behind the caches, so all three are cleared and
+    refilled from SQLite. Clearing is always safe, so racing writers at worst
+    cause an extra reset.
+    """
+
+    def __init__(self):
+        self._version = None
+        self._lock = threading.Lock()
+        self.resets = 0
+
+    def reset(self, version):
+        """Clear the caches, which now reflect `version` (e.g. after init_db)"""
+        with self._lock:
+            self._reset(version)
+
+    def wrote(self, version):
+        """Record a committed write of this process that moved the database to `version`"""
+        with self._lock:
+            if self._version is not None and version <= self._version + 1:
+                self._version = max(self._version, version)
+            else:
+                self._reset(version)
+
+    def check(self, version):
+        """Clear the caches if the database moved past them; returns True if they were current"""
+        with self._lock:
+            # Everything up to the tracked version is already reflected
+            if self._version is not None and version is not None and version <= self._version:
+                return True
+            self._reset(version)
+            return False
+
+    def _reset(self, version):
+        # Caller holds the lock
+        latest_readings.clear()
+        hot_readings.clear()
+        series_versions.clear()
+        if self._version is not None:
+            log.debug('caches_reset', version=version, previous=self._version)
+        self._version = version
+        self.resets += 1
+
+
+# Shared tracker, advanced by the GlucoseReading write methods and checked by GlucoseService
+cache_version = CacheVersion()
@@ -2,31 +2,60 @@
 GlucoseReading model - Represents a glucose reading for a patient
 """
 import sqlite3
-from datetime import datetime, timedelta
+from .reading_cache import latest_readings
+from .hot_store import hot_readings
+from .glucose_rollup import GlucoseRollup
+from .series_version import series_versions
+from .data_version import DataVersion, cache_version
+from .timestamps import to_ms, now_ms, format_ms, MS_PER_HOUR
+from ..metrics import metrics
+from ..log import get_logger
+
+log = get_logger(__name__)
+
+READINGS_INSERTED = metrics.counter('glucose_readings_inserted_total', 'Glucose readings inserted into SQLite')
+
+
+def _reading_ts(reading, default):
+    """Epoch ms of an incoming reading, from 'ts' or a 'timestamp' string/datetime, else `default`"""
+    ts = reading.get('ts')
+    if ts is not None:
+        return int(ts)
+    timestamp = reading.get('timestamp')
+    return to_ms(timestamp) if timestamp else default
 
 
 class GlucoseReading:
-    """GlucoseReading model that uses SQLite3 directly instead of SQLAlchemy"""
+    """GlucoseReading model that uses SQLite3 directly instead of SQLAlchemy
     
-    @staticmethod
-    def create_table(conn):
-        """Create the glucose_reading table if it doesn't exist"""
-        cursor = conn.cursor()
-        cursor.execute('''
+    Timestamps are stored in the integer `ts` column as epoch milliseconds
+    (see models.timestamps) and returned under 'ts'; callers format them
+    only when building responses.
+    """
+    
+    _CREATE_TABLE = '''
         CREATE TABLE IF NOT EXISTS glucose_reading (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             patient_id TEXT,
             glucose REAL NOT NULL,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            ts INTEGER NOT NULL,
             FOREIGN KEY (patient_id) REFERENCES patient (id)
         )
-        ''')
-        
-        # Create index for faster queries
-        cursor.execute('''
-        CREATE INDEX IF NOT EXISTS idx_glucose_patient_time ON glucose_reading (patient_id, timestamp)
-        ''')
-        
+    '''
+    
+    # Covering index: range scans by patient and time are answered from the index
+    # alone, without visiting the table. id is the rowid, which every index entry
+    # already carries, so keyset seeks on (ts, id) need no extra column
+    _CREATE_INDEX = '''
+        CREATE INDEX IF NOT EXISTS idx_glucose_patient_ts ON glucose_reading (patient_id, ts, glucose)
+    '''
+    
+    @staticmethod
+    def create_table(conn):
+        """Create the glucose_reading table if it doesn't exist"""
+        cursor = conn.cursor()
+        cursor.execute(GlucoseReading._CREATE_TABLE)
+        cursor.execute(GlucoseReading._CREATE_INDEX)
         conn.commit()
     
     @staticmethod
@@ -34,27 +63,94 @@ class GlucoseReading:
         """Create a new glucose reading"""
         cursor = conn.cursor()
         
-        # Format timestamp if provided, otherwise use current time
-        timestamp = reading_data.get('timestamp', datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        # Use the provided timestamp if any, otherwise the current time
+        ts = _reading_ts(reading_data, now_ms())
         
-        cursor.execute(
-            "INSERT INTO glucose_reading (patient_id, glucose, timestamp) VALUES (?, ?, ?)",
-            (
-                reading_data['patient_id'],
-                reading_data['glucose'],
-                timestamp
+        try:
+            cursor.execute(
+                "INSERT INTO glucose_reading (patient_id, glucose, ts) VALUES (?, ?, ?)",
+                (
+                    reading_data['patient_id'],
+                    reading_data['glucose'],
+                    ts
+                )
             )
-        )
-        
-        reading_id = cursor.lastrowid
-        conn.commit()
+            reading_id = cursor.lastrowid
+            GlucoseRollup.apply(cursor, [(reading_data['patient_id'], reading_data['glucose'], ts)])
+            version = DataVersion.bump(cursor)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        cache_version.wrote(version)
         
-        return {
+        reading = {
             'id': reading_id,
             'patient_id': reading_data['patient_id'],
             'glucose': reading_data['glucose'],
-            'timestamp': timestamp
+            'ts': ts
         }
+        latest_readings.offer(reading)
+        hot_readings.append(reading)
+        series_versions.bump(reading['patient_id'])
+        READINGS_INSERTED.inc()
+        return reading
+    
+    @staticmethod
+    def bulk_create(conn, readings, return_ids=False, update_rollups=True):
+        """Create many glucose readings in a single transaction
+        
+        Callers loading whole histories for freshly cleared patients can pass
+        update_rollups=False and call GlucoseRollup.rebuild afterwards, which
+        aggregates in SQL and is cheaper than folding every row in Python.
+        """
+        cursor = conn.cursor()
+        
+        # Readings without a timestamp share the current time
+        now = now_ms()
+        rows = [
+            (reading['patient_id'], reading['glucose'], _reading_ts(reading, now))
+            for reading in readings
+        ]
+        
+        query = "INSERT INTO glucose_reading (patient_id, glucose, ts) VALUES (?, ?, ?)"
+        created = []
+        try:
+            if return_ids:
+                # lastrowid is only reliable per statement, so insert row by row inside the transaction
+                for patient_id, glucose, ts in rows:
+                    cursor.execute(query, (patient_id, glucose, ts))
+                    created.append({
+                        'id': cursor.lastrowid,
+                        'patient_id': patient_id,
+                        'glucose': glucose,
+                        'ts': ts
+                    })
+            else:
+                cursor.executemany(query, rows)
+            if update_rollups:
+                GlucoseRollup.apply(cursor, rows)
+            version = DataVersion.bump(cursor)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        cache_version.wrote(version)
+        
+        # Keep the latest-reading cache current; without ids the rows can't be cached, so re-read later
+        if return_ids:
+            for reading in created:
+                latest_readings.offer(reading)
+                hot_readings.append(reading)
+        else:
+            for patient_id in {row[0] for row in rows}:
+                latest_readings.invalidate(patient_id)
+                hot_readings.invalidate(patient_id)
+        for patient_id in {row[0] for row in rows}:
+            series_versions.bump(patient_id)
+        READINGS_INSERTED.inc(len(rows))
+        
+        return created if return_ids else len(rows)
     
     @staticmethod
     def get_for_patient(conn, patient_id, hours=3, limit=None):
@@ -64,8 +160,8 @@ class GlucoseReading:
         # If requesting 24 hours or more of data, return ALL data points for the patient
         # This ensures that when "Initialize" button is clicked, all 288 points are shown
         if hours >= 24:
-            print(f"Requesting 24+ hours of data for {patient_id}, returning ALL data points")
-            query = "SELECT * FROM glucose_reading WHERE patient_id = ? ORDER BY timestamp"
+            log.debug('glucose_query', patient_id=patient_id, hours=hours, mode='all')
+            query = "SELECT id, patient_id, glucose, ts FROM glucose_reading WHERE patient_id = ? ORDER BY ts"
             params = [patient_id]
             
             # Apply limit if specified
@@ -76,41 +172,21 @@ class GlucoseReading:
             cursor.execute(query, params)
             rows = cursor.fetchall()
             
-            # Log some diagnostic info about the data
-            if rows:
-                print(f"Retrieved {len(rows)} data points for patient {patient_id}")
-                if len(rows) >= 2:
-                    first_time = datetime.strptime(rows[0][3], "%Y-%m-%d %H:%M:%S")
-                    last_time = datetime.strptime(rows[-1][3], "%Y-%m-%d %H:%M:%S")
-                    time_diff = (last_time - first_time).total_seconds() / 3600  # hours
-                    print(f"Data spans {time_diff:.2f} hours from {first_time} to {last_time}")
-                    
-                    # Count data points per hour to identify any gaps
-                    hour_count = {}
-                    for row in rows:
-                        time = datetime.strptime(row[3], "%Y-%m-%d %H:%M:%S")
-                        hour_key = time.strftime("%Y-%m-%d %H")
-                        hour_count[hour_key] = hour_count.get(hour_key, 0) + 1
-                    
-                    print(f"Distribution of data points across {len(hour_count)} hours:")
-                    for hour, count in sorted(hour_count.items()):
-                        print(f"  {hour}: {count} points")
-                    
-                    if len(hour_count) < 24:
-                        print("WARNING: Data spans less than 24 distinct hours!")
+            # Coverage diagnostics walk every row, so they only run when debugging
+            if log.debug_enabled and rows:
+                GlucoseReading._log_coverage(patient_id, rows)
             
             return [{
                 'id': row[0],
                 'patient_id': row[1],
                 'glucose': row[2],
-                'timestamp': row[3]
+                'ts': row[3]
             } for row in rows]
         
         # For smaller time ranges, use the standard time filtering
-        print(f"Requesting {hours} hours of data for {patient_id} with standard time filtering")
-        hours_ago = (datetime.now() - timedelta(hours=hours)).strftime("%Y-%m-%d %H:%M:%S")
+        hours_ago = now_ms() - hours * MS_PER_HOUR
         
-        query = "SELECT * FROM glucose_reading WHERE patient_id = ? AND timestamp >= ? ORDER BY timestamp"
+        query = "SELECT id, patient_id, glucose, ts FROM glucose_reading WHERE patient_id = ? AND ts >= ? ORDER BY ts"
         params = [patient_id, hours_ago]
         
         if limit:
@@ -120,21 +196,130 @@ class GlucoseReading:
         cursor.execute(query, params)
         rows = cursor.fetchall()
         
-        print(f"Retrieved {len(rows)} data points for {hours}-hour range for patient {patient_id}")
+        log.debug('glucose_query', patient_id=patient_id, hours=hours, mode='range', count=len(rows))
         
         return [{
             'id': row[0],
             'patient_id': row[1],
             'glucose': row[2],
-            'timestamp': row[3]
+            'ts': row[3]
         } for row in rows]
     
+    @staticmethod
+    def get_for_patients(conn, patient_ids, since=None, chunk_size=500):
+        """Get readings for many patients at once, grouped as {patient_id: [reading, ...]}
+        
+        One `patient_id IN (...)` query per chunk walks the covering index patient
+        by patient, so rows arrive already grouped and in time order. `since` is
+        epoch ms, None for all readings. Patients without readings map to [].
+        """
+        cursor = conn.cursor()
+        patient_ids = list(dict.fromkeys(patient_ids))
+        grouped = {patient_id: [] for patient_id in patient_ids}
+        
+        # Stay well below SQLite's bound parameter limit
+        for start in range(0, len(patient_ids), chunk_size):
+            chunk = patient_ids[start:start + chunk_size]
+            placeholders = ','.join('?' * len(chunk))
+            query = f"SELECT id, patient_id, glucose, ts FROM glucose_reading WHERE patient_id IN ({placeholders})"
+            params = list(chunk)
+            if since is not None:
+                query += " AND ts >= ?"
+                params.append(since)
+            query += " ORDER BY patient_id, ts"
+            
+            current_id = readings = None
+            for row in cursor.execute(query, params):
+                if row[1] != current_id:
+                    current_id = row[1]
+                    readings = grouped[current_id]
+                readings.append({
+                    'id': row[0],
+                    'patient_id': row[1],
+                    'glucose': row[2],
+                    'ts': row[3]
+                })
+        
+        log.debug('glucose_batch_query', patients=len(patient_ids), since=since,
+                  count=sum(len(readings) for readings in grouped.values()))
+        return grouped
+    
+    @staticmethod
+    def _log_coverage(patient_id, rows):
+        """Debug diagnostics: time span of (id, patient_id, glucose, ts) rows and readings per hour"""
+        hour_count = {}
+        for row in rows:
+            hour_key = row[3] // MS_PER_HOUR
+            hour_count[hour_key] = hour_count.get(hour_key, 0) + 1
+        
+        log.debug(
+            'glucose_coverage',
+            patient_id=patient_id,
+            count=len(rows),
+            span_hours=round((rows[-1][3] - rows[0][3]) / MS_PER_HOUR, 2),
+            first=format_ms(rows[0][3]),
+            last=format_ms(rows[-1][3]),
+            hours_covered=len(hour_count),
+            per_hour={format_ms(hour * MS_PER_HOUR)[:13]: count for hour, count in sorted(hour_count.items())}
+        )
+        if len(hour_count) < 24:
+            log.warning('glucose_coverage_gap', patient_id=patient_id, hours_covered=len(hour_count))
+    
+    @staticmethod
+    def get_rows_since(conn, patient_id, since):
+        """Get raw (id, glucose, ts) rows for a patient from `since` (epoch ms) onwards, oldest first"""
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT id, glucose, ts FROM glucose_reading WHERE patient_id = ? AND ts >= ? ORDER BY ts",
+            [patient_id, since]
+        )
+        return cursor.fetchall()
+    
+    @staticmethod
+    def get_after(conn, patient_id, since, since_id=None, limit=None):
+        """Get readings after the cursor (since, since_id), oldest first, ordered by (ts, id)
+        
+        Keyset pagination: pass the ts and id of the last reading received to
+        get the next page. Without since_id every reading at `since` is skipped.
+        """
+        cursor = conn.cursor()
+        if since_id is None:
+            query = "SELECT id, patient_id, glucose, ts FROM glucose_reading WHERE patient_id = ? AND ts > ?"
+            params = [patient_id, since]
+        else:
+            query = "SELECT id, patient_id, glucose, ts FROM glucose_reading WHERE patient_id = ? AND (ts, id) > (?, ?)"
+            params = [patient_id, since, since_id]
+        query += " ORDER BY ts, id"
+        
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        
+        cursor.execute(query, params)
+        return [{
+            'id': row[0],
+            'patient_id': row[1],
+            'glucose': row[2],
+            'ts': row[3]
+        } for row in cursor.fetchall()]
+    
+    @staticmethod
+    def get_ts(conn, patient_id, reading_id):
+        """Get the ts of one of a patient's readings, or None if the patient has no such reading"""
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT ts FROM glucose_reading WHERE id = ? AND patient_id = ?",
+            [reading_id, patient_id]
+        )
+        row = cursor.fetchone()
+        return row[0] if row else None
+    
     @staticmethod
     def get_latest_for_patient(conn, patient_id):
         """Get the latest glucose reading for a patient"""
         cursor = conn.cursor()
         cursor.execute(
-            "SELECT * FROM glucose_reading WHERE patient_id = ? ORDER BY timestamp DESC LIMIT 1",
+            "SELECT id, patient_id, glucose, ts FROM glucose_reading WHERE patient_id = ? ORDER BY ts DESC LIMIT 1",
             [patient_id]
         )
         row = cursor.fetchone()
@@ -144,7 +329,7 @@ class GlucoseReading:
                 'id': row[0],
                 'patient_id': row[1],
                 'glucose': row[2],
-                'timestamp': row[3]
+                'ts': row[3]
             }
         return None
     
@@ -153,4 +338,30 @@ class GlucoseReading:
         """Delete all glucose readings for a patient"""
         cursor = conn.cursor()
         cursor.execute("DELETE FROM glucose_reading WHERE patient_id = ?", [patient_id])
-        conn.commit() 
\ No newline at end of file
+        GlucoseRollup.delete_for_patients(cursor, [patient_id])
+        version = DataVersion.bump(cursor)
+        conn.commit()
+        cache_version.wrote(version)
+        latest_readings.set_empty(patient_id)
+        hot_readings.set_empty(patient_id)
+        series_versions.bump(patient_id)
+    
+    @staticmethod
+    def delete_for_patients(conn, patient_ids, chunk_size=500):
+        """Delete all glucose readings for many patients in a single transaction"""
+        cursor = conn.cursor()
+        patient_ids = list(patient_ids)
+        
+        # Stay well below SQLite's bound parameter limit
+        for start in range(0, len(patient_ids), chunk_size):
+            chunk = patient_ids[start:start + chunk_size]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f"DELETE FROM glucose_reading WHERE patient_id IN ({placeholders})", chunk)
+            GlucoseRollup.delete_for_patients(cursor, chunk)
+        version = DataVersion.bump(cursor)
+        conn.commit()
+        cache_version.wrote(version)
+        for patient_id in patient_ids:
+            latest_readings.set_empty(patient_id)
+            hot_readings.set_empty(patient_id)
+            series_versions.bump(patient_id) 
\ No newline at end of file
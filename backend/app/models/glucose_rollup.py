@@ -0,0 +1,222 @@
+"""
+GlucoseRollup model - Pre-aggregated glucose statistics per patient and time bucket
+"""
+import math
+from .timestamps import MS_PER_MINUTE, MS_PER_HOUR, MS_PER_DAY
+
+# Clinical range used for time-in-range counts (mg/dL)
+HYPO_THRESHOLD = 70.0
+HYPER_THRESHOLD = 180.0
+
+# Supported bucket sizes and their widths in ms
+GRANULARITIES = ('5min', 'hour', 'day')
+BUCKET_WIDTHS = {'5min': 5 * MS_PER_MINUTE, 'hour': MS_PER_HOUR, 'day': MS_PER_DAY}
+
+
+def bucket_keys(ts):
+    """Get the (5min, hour, day) bucket starts, in epoch ms, for an epoch ms timestamp"""
+    return tuple(ts - ts % BUCKET_WIDTHS[granularity] for granularity in GRANULARITIES)
+
+
+class GlucoseRollup:
+    """Per patient 5-minute, hourly and daily aggregates, kept in step with glucose_reading
+
+    Each row holds count, min, max, sum and sum of squares plus how many
+    readings fell below, within and above the target range, so means,
+    standard deviations and time-in-range can be answered without touching
+    the raw readings.
+    """
+
+    # Same bucket boundaries as bucket_keys, for rebuilding from raw readings in SQL
+    _BUCKET_SQL = {granularity: f"ts - ts % {width}" for granularity, width in BUCKET_WIDTHS.items()}
+
+    _UPSERT = '''
+        INSERT INTO glucose_rollup
+            (patient_id, granularity, bucket, count, min, max, sum, sum_sq, below, in_range, above)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (patient_id, granularity, bucket) DO UPDATE SET
+            count = count + excluded.count,
+            min = MIN(min, excluded.min),
+            max = MAX(max, excluded.max),
+            sum = sum + excluded.sum,
+            sum_sq = sum_sq + excluded.sum_sq,
+            below = below + excluded.below,
+            in_range = in_range + excluded.in_range,
+            above = above + excluded.above
+    '''
+
+    @staticmethod
+    def create_table(conn):
+        """Create the glucose_rollup table if it doesn't exist, backfilling it from existing readings"""
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'glucose_rollup'")
+        exists = cursor.fetchone() is not None
+
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS glucose_rollup (
+            patient_id TEXT NOT NULL,
+            granularity TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            min REAL NOT NULL,
+            max REAL NOT NULL,
+            sum REAL NOT NULL,
+            sum_sq REAL NOT NULL,
+            below INTEGER NOT NULL,
+            in_range INTEGER NOT NULL,
+            above INTEGER NOT NULL,
+            PRIMARY KEY (patient_id, granularity, bucket)
+        ) WITHOUT ROWID
+        ''')
+        conn.commit()
+
+        if not exists:
+            GlucoseRollup.rebuild(conn)
+
+    @staticmethod
+    def apply(cursor, rows):
+        """Fold (patient_id, glucose, ts) rows into the rollups
+
+        Runs on the caller's cursor without committing, so the rollups change in
+        the same transaction as the readings themselves.
+        """
+        # Aggregate at 5-minute resolution first, then fold those into hours and days
+        five_min = {}
+        width = BUCKET_WIDTHS['5min']
+        for patient_id, glucose, ts in rows:
+            glucose = float(glucose)
+            key = (patient_id, ts - ts % width)
+            agg = five_min.get(key)
+            if agg is None:
+                agg = five_min[key] = [0, glucose, glucose, 0.0, 0.0, 0, 0, 0]
+            agg[0] += 1
+            if glucose < agg[1]:
+                agg[1] = glucose
+            elif glucose > agg[2]:
+                agg[2] = glucose
+            agg[3] += glucose
+            agg[4] += glucose * glucose
+            if glucose < HYPO_THRESHOLD:
+                agg[5] += 1
+            elif glucose > HYPER_THRESHOLD:
+                agg[7] += 1
+            else:
+                agg[6] += 1
+
+        upserts = []
+        coarser = ({}, {})
+        for (patient_id, bucket_5min), agg in five_min.items():
+            _, bucket_hour, bucket_day = bucket_keys(bucket_5min)
+            upserts.append((patient_id, '5min', bucket_5min, *agg))
+            for totals, bucket in zip(coarser, (bucket_hour, bucket_day)):
+                total = totals.get((patient_id, bucket))
+                if total is None:
+                    totals[(patient_id, bucket)] = list(agg)
+                else:
+                    total[0] += agg[0]
+                    total[1] = min(total[1], agg[1])
+                    total[2] = max(total[2], agg[2])
+                    for i in range(3, 8):
+                        total[i] += agg[i]
+
+        for granularity, totals in zip(('hour', 'day'), coarser):
+            upserts.extend((patient_id, granularity, bucket, *agg) for (patient_id, bucket), agg in totals.items())
+        cursor.executemany(GlucoseRollup._UPSERT, upserts)
+
+    @staticmethod
+    def rebuild(conn, patient_ids=None):
+        """Recompute rollups from the raw readings, for every patient or just the given ones"""
+        cursor = conn.cursor()
+        where = ''
+        params = []
+        if patient_ids is not None:
+            patient_ids = list(patient_ids)
+            if not patient_ids:
+                return
+            where = f"WHERE patient_id IN ({','.join('?' * len(patient_ids))})"
+            params = patient_ids
+
+        try:
+            cursor.execute(f"DELETE FROM glucose_rollup {where}", params)
+            for granularity, bucket_sql in GlucoseRollup._BUCKET_SQL.items():
+                cursor.execute(f'''
+                    INSERT INTO glucose_rollup
+                        (patient_id, granularity, bucket, count, min, max, sum, sum_sq, below, in_range, above)
+                    SELECT patient_id, ?, {bucket_sql}, COUNT(*), MIN(glucose), MAX(glucose),
+                           SUM(glucose), SUM(glucose * glucose),
+                           SUM(glucose < ?), SUM(glucose >= ? AND glucose <= ?), SUM(glucose > ?)
+                    FROM glucose_reading {where}
+                    GROUP BY patient_id, {bucket_sql}
+                ''', [granularity, HYPO_THRESHOLD, HYPO_THRESHOLD, HYPER_THRESHOLD, HYPER_THRESHOLD] + params)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    @staticmethod
+    def delete_for_patients(cursor, patient_ids):
+        """Delete the rollups of the given patients (caller commits)"""
+        patient_ids = list(patient_ids)
+        if patient_ids:
+            placeholders = ','.join('?' * len(patient_ids))
+            cursor.execute(f"DELETE FROM glucose_rollup WHERE patient_id IN ({placeholders})", patient_ids)
+
+    @staticmethod
+    def get_buckets(conn, patient_id, granularity, since=None):
+        """Get a patient's rollup rows of one granularity from bucket start `since` (epoch ms), oldest first"""
+        cursor = conn.cursor()
+        query = '''
+            SELECT bucket, count, min, max, sum, sum_sq, below, in_range, above
+            FROM glucose_rollup WHERE patient_id = ? AND granularity = ?
+        '''
+        params = [patient_id, granularity]
+        if since is not None:
+            query += " AND bucket >= ?"
+            params.append(since)
+        query += " ORDER BY bucket"
+        cursor.execute(query, params)
+
+        return [{
+            'bucket': row[0],
+            'count': row[1],
+            'min': row[2],
+            'max': row[3],
+            'sum': row[4],
+            'sum_sq': row[5],
+            'below': row[6],
+            'in_range': row[7],
+            'above': row[8]
+        } for row in cursor.fetchall()]
+
+    @staticmethod
+    def summarize(buckets):
+        """Combine rollup rows into count, mean, standard deviation, extremes and time in range"""
+        count = sum(b['count'] for b in buckets)
+        if not count:
+            return {'count': 0}
+
+        total = sum(b['sum'] for b in buckets)
+        total_sq = sum(b['sum_sq'] for b in buckets)
+        mean = total / count
+        # Population standard deviation from the accumulated sums
+        variance = max(total_sq / count - mean * mean, 0.0)
+        below = sum(b['below'] for b in buckets)
+        in_range = sum(b['in_range'] for b in buckets)
+        above = sum(b['above'] for b in buckets)
+
+        return {
+            'count': count,
+            'mean': round(mean, 1),
+            'std': round(math.sqrt(variance), 1),
+            'cv': round(100 * math.sqrt(variance) / mean, 1) if mean else None,
+            'min': min(b['min'] for b in buckets),
+            'max': max(b['max'] for b in buckets),
+            'below_range': below,
+            'in_range': in_range,
+            'above_range': above,
+            'time_below_range_pct': round(100 * below / count, 1),
+            'time_in_range_pct': round(100 * in_range / count, 1),
+            'time_above_range_pct': round(100 * above / count, 1),
+            'first_bucket': buckets[0]['bucket'],
+            'last_bucket': buckets[-1]['bucket']
+        }
@@ -0,0 +1,234 @@
+"""
+Hot reading store - Recent glucose readings per patient held in compact ring buffers
+"""
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from .timestamps import MS_PER_HOUR
+
+# complete_since value for a ring that holds every reading the patient has
+_ALL_TIME = -(2 ** 62)
+
+
+class _PatientRing:
+    """Readings of one patient in time order: int64 ids and epoch ms, float64 glucose
+
+    Storage grows up to the store's capacity and is then reused in place,
+    overwriting the oldest reading. complete_since is the earliest epoch from
+    which the ring is known to hold every reading of the patient.
+    """
+
+    __slots__ = ('ids', 'times', 'glucose', 'head', 'size', 'complete_since')
+
+    def __init__(self, complete_since):
+        self.ids = array('q')
+        self.times = array('q')
+        # float64, the same as SQLite REAL, so both tiers return identical values
+        self.glucose = array('d')
+        self.head = 0
+        self.size = 0
+        self.complete_since = complete_since
+
+    def newest(self):
+        if not self.size:
+            return None
+        return self.times[(self.head + self.size - 1) % len(self.times)]
+
+    def append(self, reading_id, when, glucose, capacity):
+        storage = len(self.times)
+        if self.size < storage:
+            # A slot freed by expiry
+            slot = (self.head + self.size) % storage
+            self.size += 1
+        elif storage < capacity:
+            # Grow; make the data contiguous first so appending keeps it in order
+            if self.head:
+                for buffer in (self.ids, self.times, self.glucose):
+                    buffer[:] = buffer[self.head:] + buffer[:self.head]
+                self.head = 0
+            self.ids.append(reading_id)
+            self.times.append(when)
+            self.glucose.append(glucose)
+            self.size += 1
+            return
+        else:
+            # Full, overwrite the oldest reading
+            slot = self.head
+            self.complete_since = max(self.complete_since, self.times[slot] + 1)
+            self.head = (self.head + 1) % storage
+
+        self.ids[slot] = reading_id
+        self.times[slot] = when
+        self.glucose[slot] = glucose
+
+    def expire(self, cutoff):
+        """Drop readings older than cutoff"""
+        storage = len(self.times)
+        while self.size and self.times[self.head] < cutoff:
+            self.complete_since = max(self.complete_since, self.times[self.head] + 1)
+            self.head = (self.head + 1) % storage
+            self.size -= 1
+
+    def ordered(self):
+        """Get (ids, times, glucose) of the held readings, oldest first"""
+        end = self.head + self.size
+        storage = len(self.times)
+        if end <= storage:
+            return tuple(buffer[self.head:end] for buffer in (self.ids, self.times, self.glucose))
+        return tuple(
+            buffer[self.head:] + buffer[:end - storage]
+            for buffer in (self.ids, self.times, self.glucose)
+        )
+
+    def nbytes(self):
+        return sum(buffer.itemsize * len(buffer) for buffer in (self.ids, self.times, self.glucose))
+
+
+class HotReadingStore:
+    """In-memory hot tier for short-range glucose queries
+
+    Holds the last `retention_hours` of readings for up to `max_patients`
+    recently queried patients (least recently used are evicted), at most
+    `capacity` readings each. A patient is loaded from SQLite on its first
+    short-range query and then kept current by the GlucoseReading write
+    methods. Queries reaching back before what a ring is known to hold
+    completely return None so the caller falls back to SQLite.
+    """
+
+    def __init__(self, retention_hours=3, capacity=4096, max_patients=10000):
+        self.retention_hours = retention_hours
+        self.capacity = capacity
+        self.max_patients = max_patients
+        self._rings = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Per-patient write counters, bumped on every change so a load based on
+        # an older database read is discarded; the epoch covers clear()
+        self._versions = {}
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, retention_hours=None, capacity=None, max_patients=None):
+        """Apply settings; retention_hours of 0 disables the store"""
+        with self._lock:
+            if retention_hours is not None:
+                self.retention_hours = retention_hours
+            if capacity is not None:
+                self.capacity = capacity
+            if max_patients is not None:
+                self.max_patients = max_patients
+            self._rings.clear()
+            self._epoch += 1
+
+    @property
+    def enabled(self):
+        return bool(self.retention_hours) and self.capacity > 0
+
+    def __contains__(self, patient_id):
+        with self._lock:
+            return patient_id in self._rings
+
+    def version(self, patient_id):
+        """Get the patient's write version; take it before reading the database"""
+        with self._lock:
+            return self._epoch, self._versions.get(patient_id, 0)
+
+    def load(self, patient_id, rows, complete_since, version):
+        """Populate a patient from database rows (id, glucose, ts), oldest first
+
+        Ignored if the patient was written to since `version` was taken.
+        """
+        ring = _PatientRing(complete_since)
+        for reading_id, glucose, ts in rows:
+            ring.append(reading_id, ts, glucose, self.capacity)
+
+        with self._lock:
+            if version != (self._epoch, self._versions.get(patient_id, 0)):
+                return False
+            self._rings[patient_id] = ring
+            self._rings.move_to_end(patient_id)
+            while len(self._rings) > self.max_patients:
+                self._rings.popitem(last=False)
+            return True
+
+    def append(self, reading):
+        """Add a newly inserted reading (dict with id, patient_id, glucose, ts)"""
+        patient_id = reading['patient_id']
+        with self._lock:
+            self._versions[patient_id] = self._versions.get(patient_id, 0) + 1
+            ring = self._rings.get(patient_id)
+            if ring is None:
+                return
+            when = reading['ts']
+            newest = ring.newest()
+            if newest is not None and when < newest:
+                # Out of order insert, let the next query reload the patient
+                del self._rings[patient_id]
+                return
+            ring.append(reading['id'], when, reading['glucose'], self.capacity)
+            ring.expire(when - int(self.retention_hours * MS_PER_HOUR))
+
+    def invalidate(self, patient_id):
+        """Forget a patient (e.g. after inserts whose ids are unknown)"""
+        with self._lock:
+            self._versions[patient_id] = self._versions.get(patient_id, 0) + 1
+            self._rings.pop(patient_id, None)
+
+    def set_empty(self, patient_id):
+        """Record that a patient has no readings (after a delete)"""
+        with self._lock:
+            self._versions[patient_id] = self._versions.get(patient_id, 0) + 1
+            if patient_id in self._rings:
+                self._rings[patient_id] = _PatientRing(_ALL_TIME)
+
+    def clear(self):
+        """Forget every patient (e.g. when the database is recreated)"""
+        with self._lock:
+            self._rings.clear()
+            self._versions.clear()
+            self._epoch += 1
+
+    def query(self, patient_id, since, limit=None):
+        """Get readings at or after `since` (epoch ms), oldest first, or None if not held completely"""
+        with self._lock:
+            ring = self._rings.get(patient_id)
+            if ring is None or since < ring.complete_since:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._rings.move_to_end(patient_id)
+            ids, times, glucose = ring.ordered()
+
+        start = bisect_left(times, since)
+        end = min(start + limit, len(times)) if limit else len(times)
+        return [
+            {
+                'id': reading_id,
+                'patient_id': patient_id,
+                'glucose': value,
+                'ts': when
+            }
+            for reading_id, when, value in zip(ids[start:end], times[start:end], glucose[start:end])
+        ]
+
+    def stats(self):
+        """Get the memory gauge and hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'retention_hours': self.retention_hours,
+                'capacity': self.capacity,
+                'patients': len(self._rings),
+                'readings': sum(ring.size for ring in self._rings.values()),
+                'bytes': sum(ring.nbytes() for ring in self._rings.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0
+            }
+
+
+# Shared store, kept up to date by the GlucoseReading write methods
+hot_readings = HotReadingStore()
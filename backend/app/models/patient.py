@@ -71,6 +71,32 @@ class Patient:
         conn.commit()
         return patient_data
     
+    @staticmethod
+    def bulk_create(conn, patients):
+        """Insert many patients in a single transaction, skipping ids that already exist"""
+        cursor = conn.cursor()
+        rows = [
+            (
+                patient['id'],
+                patient['age'],
+                patient['weight'],
+                patient['height'],
+                1 if patient['has_diabetes'] else 0,
+                patient.get('diabetes_type', None)
+            )
+            for patient in patients
+        ]
+        try:
+            cursor.executemany(
+                "INSERT OR IGNORE INTO patient (id, age, weight, height, has_diabetes, diabetes_type) VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return cursor.rowcount
+    
     @staticmethod
     def exists(conn, patient_id):
         """Check if a patient exists"""
@@ -0,0 +1,98 @@
+"""
+Latest reading cache - In-memory mirror of each patient's newest glucose reading
+"""
+import threading
+
+class LatestReadingCache:
+    """Thread-safe last-value cache keyed by patient_id
+    
+    A cached value of None means the patient is known to have no readings.
+    Writers only replace an entry with a reading that is at least as new, so a
+    slow reader filling the cache from SQLite cannot overwrite a fresher insert.
+    """
+    
+    # Marker for "not cached", distinct from a cached None
+    _MISSING = object()
+    
+    def __init__(self):
+        self._latest = {}
+        self._lock = threading.Lock()
+        
+        # Bumped on every invalidation so fills based on an older read are discarded
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, patient_id):
+        """Return (found, reading); reading is None when the patient has no readings"""
+        with self._lock:
+            reading = self._latest.get(patient_id, self._MISSING)
+            if reading is self._MISSING:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            return True, reading
+    
+    def offer(self, reading):
+        """Cache a just-written reading if it is newer than (or as new as) the cached one
+        
+        Uncached patients are left for fill(): the written reading need not be
+        their newest (e.g. a backfill), only the database knows. Fills that
+        read before this write are discarded instead.
+        """
+        patient_id = reading['patient_id']
+        with self._lock:
+            current = self._latest.get(patient_id, self._MISSING)
+            if current is self._MISSING:
+                self._generation += 1
+            elif current is None or reading['ts'] >= current['ts']:
+                self._latest[patient_id] = dict(reading)
+    
+    def generation(self):
+        """Get the invalidation generation; take it before reading the database on a miss"""
+        with self._lock:
+            return self._generation
+    
+    def fill(self, patient_id, reading, generation):
+        """Populate after a cache miss; ignored if anything was invalidated since `generation`"""
+        with self._lock:
+            if generation != self._generation:
+                return
+            current = self._latest.get(patient_id, self._MISSING)
+            if current is self._MISSING or current is None:
+                self._latest[patient_id] = dict(reading) if reading is not None else None
+            elif reading is not None and reading['ts'] >= current['ts']:
+                self._latest[patient_id] = dict(reading)
+    
+    def set_empty(self, patient_id):
+        """Record that a patient has no readings (after a delete)"""
+        with self._lock:
+            self._latest[patient_id] = None
+            self._generation += 1
+    
+    def invalidate(self, patient_id):
+        """Forget a patient so the next lookup goes to the database"""
+        with self._lock:
+            self._latest.pop(patient_id, None)
+            self._generation += 1
+    
+    def clear(self):
+        """Forget every patient (e.g. when the database is recreated)"""
+        with self._lock:
+            self._latest.clear()
+            self._generation += 1
+    
+    def stats(self):
+        """Get hit/miss counters and size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._latest),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0
+            }
+
+
+# Shared cache, kept up to date by the GlucoseReading write methods
+latest_readings = LatestReadingCache()
@@ -0,0 +1,45 @@
+"""
+Series versions - Per-patient change tracking for conditional glucose requests
+"""
+import os
+import threading
+import time
+
+class SeriesVersions:
+    """Thread-safe write counter and last-modified time per patient_id
+
+    Every write path of GlucoseReading bumps the patient, so (token, modified)
+    changes whenever the patient's readings may have. Tokens start with a
+    random per-process prefix and the clear() epoch, so an ETag handed out
+    before a restart or a database recreate never matches again. Patients not
+    written since startup report the startup time as last modified.
+    """
+
+    def __init__(self):
+        self._boot = os.urandom(4).hex()
+        self._started = int(time.time())
+        self._versions = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def bump(self, patient_id):
+        """Record a change to a patient's readings"""
+        with self._lock:
+            version = self._versions.get(patient_id, (0, 0))[0]
+            self._versions[patient_id] = (version + 1, int(time.time()))
+
+    def get(self, patient_id):
+        """Return (token, last modified epoch seconds) for a patient"""
+        with self._lock:
+            version, modified = self._versions.get(patient_id, (0, self._started))
+            return f"{self._boot}.{self._epoch}.{version}", modified
+
+    def clear(self):
+        """Forget every patient (e.g. when the database is recreated)"""
+        with self._lock:
+            self._versions.clear()
+            self._epoch += 1
+            self._started = int(time.time())
+
+# Shared versions, bumped by the GlucoseReading write methods
+series_versions = SeriesVersions()
@@ -0,0 +1,118 @@
+"""
+Timestamps - Conversion between stored epoch milliseconds and API timestamp strings
+
+Readings are stored as integer milliseconds since 1970-01-01 on the same naive
+local wall clock the API has always used, so "%Y-%m-%d %H:%M:%S" strings map
+to and from integers exactly, with no timezone or DST handling. Strings are
+only produced where responses and socket events are built.
+"""
+from datetime import datetime, timedelta
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_EPOCH = datetime(1970, 1, 1)
+
+MS_PER_MINUTE = 60 * 1000
+MS_PER_HOUR = 60 * MS_PER_MINUTE
+MS_PER_DAY = 24 * MS_PER_HOUR
+
+# "HH:MM:" for every minute of the day and "SS" for every second, for fast formatting
+_HOUR_MINUTE = [f"{hour:02d}:{minute:02d}:" for hour in range(24) for minute in range(60)]
+_SECOND = [f"{second:02d}" for second in range(60)]
+
+
+def to_ms(value):
+    """Convert a timestamp string ("%Y-%m-%d %H:%M:%S" or ISO 8601), datetime or number to epoch ms"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.strip())
+    if value.tzinfo is not None:
+        # Offsets (e.g. a trailing Z) are dropped and the clock digits kept, as stored before
+        value = value.replace(tzinfo=None)
+    return (value - _EPOCH) // timedelta(milliseconds=1)
+
+
+def to_ms_many(values):
+    """Vectorized to_ms for a list of timestamp strings; unparseable entries come back as None
+
+    The common offset-free forms are parsed by numpy in one call. Strings with
+    a UTC offset keep to_ms semantics (offset dropped, digits kept) and are
+    converted one by one, as is every entry of a list numpy rejects.
+    """
+    import numpy as np
+
+    cleaned = list(values)
+    slow = []
+    for i, value in enumerate(cleaned):
+        if not isinstance(value, str):
+            slow.append(i)
+            cleaned[i] = 'NaT'
+        elif len(value) > 19:
+            tail = value[19:]
+            if tail.endswith('Z'):
+                cleaned[i] = value[:-1]
+            elif '+' in tail or '-' in tail:
+                slow.append(i)
+                cleaned[i] = 'NaT'
+
+    try:
+        parsed = np.array(cleaned, dtype='datetime64[ms]')
+    except ValueError:
+        # At least one bad string; fall back to parsing everything individually
+        slow = range(len(cleaned))
+        result = [None] * len(cleaned)
+    else:
+        result = [None if nat else ms for ms, nat in zip(parsed.astype(np.int64).tolist(), np.isnat(parsed).tolist())]
+
+    for i in slow:
+        try:
+            result[i] = to_ms(values[i])
+        except (TypeError, ValueError, AttributeError):
+            result[i] = None
+    return result
+
+
+def now_ms():
+    """Current local wall-clock time in epoch ms, at whole-second precision like the old timestamps"""
+    return to_ms(datetime.now().replace(microsecond=0))
+
+
+def from_ms(ms):
+    """Convert epoch ms back to a naive datetime"""
+    return _EPOCH + timedelta(milliseconds=ms)
+
+
+def format_ms(ms):
+    """Format epoch ms as "%Y-%m-%d %H:%M:%S" """
+    day, ms_of_day = divmod(ms, MS_PER_DAY)
+    minutes, seconds = divmod(ms_of_day // 1000, 60)
+    return (_EPOCH + timedelta(days=day)).strftime("%Y-%m-%d ") + _HOUR_MINUTE[minutes] + _SECOND[seconds]
+
+
+def format_reading(reading):
+    """Shape a stored reading ({'id', 'patient_id', 'glucose', 'ts'}) for API responses"""
+    formatted = {'id': reading['id']} if 'id' in reading else {}
+    formatted['patient_id'] = reading['patient_id']
+    formatted['glucose'] = reading['glucose']
+    formatted['timestamp'] = format_ms(reading['ts'])
+    return formatted
+
+
+def format_readings(readings):
+    """format_reading for a list, building each date string only once"""
+    formatted = []
+    append = formatted.append
+    current_day = date = None
+    for reading in readings:
+        day, ms_of_day = divmod(reading['ts'], MS_PER_DAY)
+        if day != current_day:
+            current_day = day
+            date = (_EPOCH + timedelta(days=day)).strftime("%Y-%m-%d ")
+        minutes, seconds = divmod(ms_of_day // 1000, 60)
+        formatted_reading = {'id': reading['id']} if 'id' in reading else {}
+        formatted_reading['patient_id'] = reading['patient_id']
+        formatted_reading['glucose'] = reading['glucose']
+        formatted_reading['timestamp'] = date + _HOUR_MINUTE[minutes] + _SECOND[seconds]
+        append(formatted_reading)
+    return formatted
@@ -1,7 +1,7 @@
 """
 Data Flow routes - API endpoints for controlling data flow
 """
-from flask import jsonify
+from flask import jsonify, request
 from ..services.data_flow_service import DataFlowService
 
 def register_data_flow_routes(app):
@@ -13,8 +13,12 @@ def register_data_flow_routes(app):
         # Get the socketio instance from the app
         socketio = app.extensions['socketio']
         
+        # Optional per-patient tick interval and jitter in seconds
+        interval = request.args.get('interval', default=app.config.get('DATA_FLOW_INTERVAL'), type=float)
+        jitter = request.args.get('jitter', default=app.config.get('DATA_FLOW_JITTER'), type=float)
+        
         # Start the data flow
-        result = DataFlowService.start_data_flow(patient_id, socketio)
+        result = DataFlowService.start_data_flow(patient_id, socketio, interval, jitter)
         
         # If result is a tuple (response, status_code)
         if isinstance(result, tuple):
@@ -26,4 +30,12 @@ def register_data_flow_routes(app):
     def stop_data_flow(patient_id):
         """Stop data flow for a patient"""
         result = DataFlowService.stop_data_flow(patient_id)
-        return jsonify(result) 
\ No newline at end of file
+        return jsonify(result)
+    
+    @app.route('/live_stats/<patient_id>')
+    def get_live_stats(patient_id):
+        """Get live statistics accumulated from a patient's data flow"""
+        stats = DataFlowService.get_live_stats(patient_id)
+        if stats is None:
+            return jsonify({"error": "No live data for patient"}), 404
+        return jsonify({"patient_id": patient_id, "stats": stats})
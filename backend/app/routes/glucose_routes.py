@@ -1,28 +1,167 @@
 """
 Glucose routes - API endpoints for glucose data
 """
-from flask import jsonify, request
+from urllib.parse import urlencode
+from flask import current_app, jsonify, request
 from ..services.glucose_service import GlucoseService
+from ..services.cohort_service import CohortService
+from ..services.patient_service import PatientService
+from ..services.ingest_queue import ingest_queue, QueueFull
+from ..services.stream_ingest import StreamIngestService, iter_lines
+from ..models.timestamps import to_ms, now_ms
+from .series_encoding import negotiate_format, series_response, batch_response, series_etag, not_modified
+from ..log import get_logger
+
+log = get_logger(__name__)
+
+def _parse_since(value):
+    """Parse ?since= as epoch ms or a timestamp string; raises ValueError"""
+    if value is None or value == '':
+        return None
+    if value.lstrip('-').isdigit():
+        return int(value)
+    return to_ms(value)
+
+def _next_page_url(last_reading):
+    """URL of the request being served with its cursor moved past `last_reading`"""
+    args = request.args.to_dict()
+    args['since'] = last_reading['ts']
+    args['since_id'] = last_reading['id']
+    return f"{request.base_url}?{urlencode(args)}"
 
 def register_glucose_routes(app):
     """Register all glucose-related route handlers with the Flask app"""
     
     @app.route('/glucose/<patient_id>')
     def get_glucose(patient_id):
-        """Get glucose readings for a patient"""
+        """Get glucose readings for a patient
+        
+        With ?since= (epoch ms or a timestamp) and/or ?since_id= only the
+        readings after that cursor are returned, oldest first and at most
+        ?limit= per page; a Link rel="next" header points at the next page.
+        Pages are meant to be appended as they are, so they aren't downsampled.
+        """
         hours = request.args.get('hours', default=3, type=int)
         
+        # Incremental fetch after the cursor (ts, id) of the last reading the client has
+        since_id = request.args.get('since_id', type=int)
+        try:
+            since = _parse_since(request.args.get('since'))
+        except ValueError:
+            return jsonify({"error": "since must be epoch milliseconds or a timestamp"}), 400
+        incremental = since is not None or since_id is not None
+        
+        if incremental:
+            page_size = request.args.get('limit', default=current_app.config.get('GLUCOSE_PAGE_SIZE', 1000), type=int)
+            limit = max(1, min(page_size, current_app.config.get('GLUCOSE_MAX_PAGE_SIZE', 10000)))
         # For 24 hour requests, don't limit the number of points
         # This ensures all 288 points generated during initialization are returned
-        if hours >= 24:
+        elif hours >= 24:
             limit = None
-            print(f"24-hour request detected for {patient_id} - removing data point limit")
         else:
             limit = request.args.get('limit', default=100, type=int)
         
+        # Optional server-side downsampling to bound payload size and render time
+        max_points = request.args.get('max_points', type=int)
+        method = request.args.get('downsample', default='lttb')
+        if max_points is not None and max_points < 3:
+            return jsonify({"error": "max_points must be at least 3"}), 400
+        if method not in ('lttb', 'minmax'):
+            return jsonify({"error": "downsample must be 'lttb' or 'minmax'"}), 400
+        
+        # Rows, columns or binary, from ?format= or the Accept header
+        try:
+            series_format = negotiate_format()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        # Cursor pages and full histories only change when the patient is written to,
+        # so unchanged polls are answered without touching the database
+        token, modified = GlucoseService.get_series_version(patient_id)
+        if incremental or hours >= 24:
+            etag = series_etag(token, series_format)
+            cached = not_modified(etag, modified)
+            if cached is not None:
+                return cached
+        
+        if incremental:
+            readings = GlucoseService.get_readings_after(patient_id, since, since_id, limit)
+            if readings is None:
+                return jsonify({"error": "since_id is not a reading of this patient, fetch without a cursor"}), 410
+            response = series_response(patient_id, readings, series_format, (since, since_id), etag, modified)
+            if len(readings) >= limit:
+                response.headers['Link'] = f'<{_next_page_url(readings[-1])}>; rel="next"'
+            return response
+        
         # Get glucose readings
-        readings = GlucoseService.get_glucose_readings(patient_id, hours, limit)
-        return jsonify(readings)
+        readings = GlucoseService.get_glucose_readings(patient_id, hours, limit, max_points, method)
+        if hours >= 24:
+            return series_response(patient_id, readings, series_format, etag=etag, last_modified=modified)
+        
+        # A time window moves on without writes, so its validator also covers where it starts
+        etag = series_etag(token, series_format, len(readings), readings[0]['id'] if readings else None)
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+        return series_response(patient_id, readings, series_format, etag=etag)
+    
+    @app.route('/glucose/batch', methods=['GET', 'POST'])
+    def get_glucose_batch():
+        """Get several patients' glucose readings over one time range in a single response
+        
+        Patient ids come as repeated ?patient_id= or a JSON body's "patient_ids";
+        hours, max_points, downsample and include_patients come from either.
+        """
+        options = request.get_json(silent=True) or {}
+        patient_ids = options.get('patient_ids', request.args.getlist('patient_id'))
+        if not isinstance(patient_ids, list) or not patient_ids or \
+                not all(isinstance(patient_id, str) for patient_id in patient_ids):
+            return jsonify({"error": "patient_ids must be a non-empty list of patient ids"}), 400
+        max_patients = current_app.config.get('GLUCOSE_BATCH_MAX_PATIENTS', 1000)
+        if len(patient_ids) > max_patients:
+            return jsonify({"error": f"at most {max_patients} patient ids per batch"}), 400
+        
+        try:
+            hours = int(options.get('hours', request.args.get('hours', 24)))
+            max_points = options.get('max_points', request.args.get('max_points'))
+            max_points = int(max_points) if max_points is not None else None
+        except (TypeError, ValueError):
+            return jsonify({"error": "hours and max_points must be integers"}), 400
+        method = options.get('downsample', request.args.get('downsample', 'lttb'))
+        if max_points is not None and max_points < 3:
+            return jsonify({"error": "max_points must be at least 3"}), 400
+        if method not in ('lttb', 'minmax'):
+            return jsonify({"error": "downsample must be 'lttb' or 'minmax'"}), 400
+        
+        # Binary holds a single series, so batches are rows or columns
+        try:
+            series_format = negotiate_format(('rows', 'columns'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        series = GlucoseService.get_glucose_readings_batch(patient_ids, hours, max_points, method)
+        
+        fields = {'hours': hours}
+        include_patients = options.get('include_patients', request.args.get('include_patients'))
+        if include_patients in (True, '1', 'true'):
+            fields['patients'] = {patient_id: PatientService.get_patient(patient_id) for patient_id in series}
+        return batch_response(series, series_format, **fields)
+    
+    @app.route('/glucose/<patient_id>/stats')
+    def get_glucose_stats(patient_id):
+        """Get summary statistics for a patient from the rollup tables"""
+        hours = request.args.get('hours', default=24, type=int)
+        granularity = request.args.get('granularity')
+        
+        try:
+            return jsonify(GlucoseService.get_glucose_stats(patient_id, hours, granularity))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    
+    @app.route('/hot_store/stats')
+    def get_hot_store_stats():
+        """Get memory usage and hit ratio of the in-memory hot tier"""
+        return jsonify(GlucoseService.get_hot_store_stats())
     
     @app.route('/initialize_patient_data/<patient_id>', methods=['POST'])
     def initialize_patient_data(patient_id):
@@ -35,9 +174,59 @@ def register_glucose_routes(app):
         
         return jsonify(result)
     
+    @app.route('/initialize_cohort', methods=['POST'])
+    def initialize_cohort():
+        """Initialize glucose data for every predefined patient, optionally filtered by type
+        
+        Histories are generated on threads of this process, up to
+        COHORT_MAX_DAYS days; larger loads belong to the init-cohort command.
+        """
+        options = request.get_json(silent=True) or {}
+        patient_type = options.get('type', request.args.get('type'))
+        try:
+            days = int(options.get('days', request.args.get('days', 1)))
+            workers = options.get('workers', request.args.get('workers'))
+            workers = int(workers) if workers is not None else None
+            seed = options.get('seed', request.args.get('seed'))
+            seed = int(seed) if seed is not None else None
+        except (TypeError, ValueError):
+            return jsonify({"error": "days, workers and seed must be integers"}), 400
+        if days < 1:
+            return jsonify({"error": "days must be at least 1"}), 400
+        max_days = current_app.config.get('COHORT_MAX_DAYS', 7)
+        if days > max_days:
+            return jsonify({"error": f"days must be at most {max_days}, use `flask init-cohort` for more"}), 400
+        if workers is not None and workers < 1:
+            return jsonify({"error": "workers must be at least 1"}), 400
+        
+        def report(done, total, readings, elapsed):
+            log.info('cohort_progress', done=done, total=total, readings=readings, elapsed=round(elapsed, 1))
+        
+        result = CohortService.initialize_cohort(
+            patient_type=patient_type,
+            days=days,
+            workers=workers,
+            seed=seed,
+            progress=report,
+            processes=False
+        )
+        
+        # If result is a tuple (response, status_code)
+        if isinstance(result, tuple):
+            return jsonify(result[0]), result[1]
+        
+        return jsonify(result)
+    
     @app.route('/mock_update', methods=['POST'])
     def mock_update():
-        """Handle mock data updates"""
+        """Handle mock data updates
+        
+        Points are validated and queued for a group commit by the ingestion
+        writer, which broadcasts them once stored; the response is 202 right
+        away, or 429 while the queue is full. ?wait=1 answers only after the
+        points are committed: 503 if that takes longer than INGEST_WAIT_TIMEOUT
+        seconds, 500 if a batch failed to write in the meantime.
+        """
         try:
             data = request.json
             if not data or 'patient_id' not in data or 'data' not in data or not isinstance(data['data'], list):
@@ -46,42 +235,67 @@ def register_glucose_routes(app):
             patient_id = data['patient_id']
             data_points = data['data']
             
-            # Add each data point
+            # ISO 8601 and "%Y-%m-%d %H:%M:%S" timestamps are both accepted; points
+            # without one are stamped now rather than when the writer gets to them
+            now = now_ms()
+            readings = []
             for point in data_points:
-                # Create a properly formatted reading data object
-                reading_data = {
-                    'patient_id': patient_id,
-                    'glucose': point.get('glucose'),
-                    'timestamp': point.get('timestamp')
-                }
-                
-                # Format timestamp if necessary
-                if 'timestamp' in reading_data and reading_data['timestamp']:
-                    try:
-                        # If ISO format, convert to database format
-                        if 'T' in reading_data['timestamp']:
-                            reading_data['timestamp'] = reading_data['timestamp'].replace('T', ' ')
-                        if '.' in reading_data['timestamp']:
-                            reading_data['timestamp'] = reading_data['timestamp'].split('.')[0]
-                    except:
-                        pass  # If conversion fails, use original timestamp
-                
-                # Add the reading
-                GlucoseService.add_reading(reading_data)
+                glucose = point.get('glucose') if isinstance(point, dict) else None
+                if not isinstance(glucose, (int, float)) or isinstance(glucose, bool):
+                    return jsonify({"error": "Every data point needs a numeric glucose"}), 400
+                timestamp = point.get('timestamp')
+                try:
+                    ts = to_ms(timestamp) if timestamp else now
+                except (TypeError, ValueError):
+                    return jsonify({"error": f"Invalid timestamp: {timestamp}"}), 400
+                readings.append({'patient_id': patient_id, 'glucose': glucose, 'ts': ts})
             
-            # Use socketio directly from the app object to broadcast updates
-            socketio = app.extensions['socketio']
+            wait = request.args.get('wait') in ('1', 'true')
+            # Any batch dropped while this request waits may have held its points
+            dropped = ingest_queue.dropped
+            try:
+                ingest_queue.submit(readings)
+            except QueueFull as e:
+                response = jsonify({"error": str(e)})
+                response.headers['Retry-After'] = '1'
+                return response, 429
             
-            # Broadcast data updates
-            for point in data_points:
-                socketio.emit('glucose_update', {
-                    'patient_id': patient_id,
-                    'glucose': point.get('glucose'),
-                    'timestamp': point.get('timestamp')
-                })
-            
-            return jsonify({"success": True, "message": "Data updated successfully"})
+            if wait:
+                if not ingest_queue.flush(timeout=current_app.config.get('INGEST_WAIT_TIMEOUT', 10)):
+                    response = jsonify({"error": "Data accepted but not yet committed"})
+                    response.headers['Retry-After'] = '1'
+                    return response, 503
+                if ingest_queue.dropped != dropped:
+                    return jsonify({"error": "Data could not be stored"}), 500
+                return jsonify({"success": True, "message": "Data updated successfully"})
+            return jsonify({"success": True, "message": "Data accepted", "queued": len(readings)}), 202
         
         except Exception as e:
-            print(f"Error in mock_update: {str(e)}")
-            return jsonify({"error": str(e)}), 500 
\ No newline at end of file
+            log.exception('mock_update_failed')
+            return jsonify({"error": str(e)}), 500
+    
+    @app.route('/ingest', methods=['POST'])
+    def ingest_stream():
+        """Bulk-load readings for any number of patients from an NDJSON or CSV body
+        
+        The body is read as a stream (chunked uploads work) and inserted every
+        ?batch_size= lines; the response has per-batch accept/reject counts.
+        The format comes from ?format= or the Content-Type (text/csv for CSV).
+        """
+        fmt = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'ndjson')
+        default_batch = current_app.config.get('INGEST_STREAM_BATCH_SIZE', 5000)
+        batch_size = max(1, min(request.args.get('batch_size', default=default_batch, type=int), 50000))
+        
+        try:
+            summary = StreamIngestService.ingest(iter_lines(request.stream), fmt, batch_size)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        if 'error' in summary:
+            return jsonify(summary), 500
+        return jsonify(summary)
+    
+    @app.route('/ingest/stats')
+    def get_ingest_stats():
+        """Get depth and throughput of the write-behind ingestion queue"""
+        return jsonify(ingest_queue.stats())
@@ -0,0 +1,124 @@
+"""
+Metrics routes - Prometheus scrape endpoint and per-request timing
+"""
+import os
+import sys
+import threading
+import time
+from flask import Response, g, request
+from ..metrics import metrics, CONTENT_TYPE
+from ..util.db import get_pool_stats
+from ..models.hot_store import hot_readings
+from ..models.reading_cache import latest_readings
+from ..services.data_flow_service import DataFlowService
+from ..services.ingest_queue import ingest_queue
+from ..services.live_stats import live_stats
+from ..socket.broadcaster import broadcaster
+from ..socket.subscriptions import subscriptions
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+REQUEST_SECONDS = metrics.histogram(
+    'glucose_http_request_duration_seconds', 'HTTP request latency by route', ('method', 'route'))
+REQUESTS = metrics.counter('glucose_http_requests_total', 'HTTP responses by route and status', ('method', 'route', 'status'))
+
+DB_CONNECTIONS = metrics.gauge('glucose_db_connections', 'Pooled SQLite connections by state', ('state',))
+DB_POOL_SIZE = metrics.gauge('glucose_db_pool_max_size', 'Maximum pooled SQLite connections')
+FLOWS_ACTIVE = metrics.gauge('glucose_data_flows_active', 'Active patient data flows')
+SUBSCRIBED_CLIENTS = metrics.gauge('glucose_socket_subscribed_clients', 'WebSocket clients with a subscription')
+BROADCAST_PENDING = metrics.gauge('glucose_broadcast_pending_points', 'Readings waiting for the next broadcast')
+HOT_TIER = metrics.gauge('glucose_hot_tier', 'In-memory hot tier size', ('measure',))
+HOT_TIER_LOOKUPS = metrics.counter('glucose_hot_tier_lookups_total', 'Hot tier lookups by result', ('result',))
+LATEST_CACHE_ENTRIES = metrics.gauge('glucose_latest_cache_entries', 'Patients in the latest-reading cache')
+LATEST_CACHE_LOOKUPS = metrics.counter('glucose_latest_cache_lookups_total', 'Latest-reading cache lookups by result',
+                                       ('result',))
+LIVE_STATS = metrics.gauge('glucose_live_stats', 'Live statistics windows kept for data flows', ('measure',))
+INGEST_DEPTH = metrics.gauge('glucose_ingest_queue_depth', 'Readings accepted by /mock_update but not yet committed')
+INGEST_MAX_DEPTH = metrics.gauge('glucose_ingest_queue_max_depth', 'Ingest queue capacity in readings')
+INGEST_READINGS = metrics.counter('glucose_ingest_readings_total', 'Ingest queue readings by outcome', ('outcome',))
+INGEST_BATCHES = metrics.counter('glucose_ingest_batches_total', 'Batches committed by the ingest writer')
+THREADS = metrics.gauge('process_threads', 'Live Python threads')
+RSS_BYTES = metrics.gauge('process_resident_memory_bytes', 'Resident set size in bytes')
+CPU_SECONDS = metrics.counter('process_cpu_seconds_total', 'User and system CPU time in seconds')
+
+
+def _rss_bytes():
+    """Current resident set size, or the peak where /proc is unavailable; None if neither is"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def collect_app_metrics():
+    """Copy the stats kept by the pool, flows, broadcaster, caches and ingest queue into metrics"""
+    pool = get_pool_stats()
+    DB_CONNECTIONS.labels('open').set(pool['open_connections'])
+    DB_CONNECTIONS.labels('in_use').set(pool['in_use'])
+    DB_CONNECTIONS.labels('idle').set(pool['idle'])
+    DB_POOL_SIZE.set(pool['max_size'])
+
+    FLOWS_ACTIVE.set(DataFlowService.get_active_flow_count())
+    SUBSCRIBED_CLIENTS.set(subscriptions.client_count())
+    BROADCAST_PENDING.set(broadcaster.stats()['pending_points'])
+
+    hot = hot_readings.stats()
+    for measure in ('patients', 'readings', 'bytes'):
+        HOT_TIER.labels(measure).set(hot[measure])
+    HOT_TIER_LOOKUPS.labels('hit').set_total(hot['hits'])
+    HOT_TIER_LOOKUPS.labels('miss').set_total(hot['misses'])
+
+    latest = latest_readings.stats()
+    LATEST_CACHE_ENTRIES.set(latest['entries'])
+    LATEST_CACHE_LOOKUPS.labels('hit').set_total(latest['hits'])
+    LATEST_CACHE_LOOKUPS.labels('miss').set_total(latest['misses'])
+
+    live = live_stats.memory_usage()
+    LIVE_STATS.labels('patients').set(live['patients'])
+    LIVE_STATS.labels('bytes').set(live['bytes'])
+
+    ingest = ingest_queue.stats()
+    INGEST_DEPTH.set(ingest['depth'])
+    INGEST_MAX_DEPTH.set(ingest['max_depth'])
+    for outcome in ('accepted', 'rejected', 'committed', 'dropped'):
+        INGEST_READINGS.labels(outcome).set_total(ingest[outcome])
+    INGEST_BATCHES.set_total(ingest['batches'])
+
+    THREADS.set(threading.active_count())
+    rss = _rss_bytes()
+    if rss is not None:
+        RSS_BYTES.set(rss)
+    CPU_SECONDS.set_total(time.process_time())
+
+
+def register_metrics_routes(app):
+    """Register /metrics and time every request by its route"""
+    metrics.add_collector('app', collect_app_metrics)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        start = g.pop('request_start', None)
+        if start is not None:
+            # The rule, not the path, so patient ids don't multiply the series
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            REQUEST_SECONDS.labels(request.method, route).observe(time.perf_counter() - start)
+            REQUESTS.labels(request.method, route, response.status_code).inc()
+        return response
+
+    @app.route('/metrics')
+    def get_metrics():
+        """Get every metric in the Prometheus text format"""
+        return Response(metrics.render(), content_type=CONTENT_TYPE)
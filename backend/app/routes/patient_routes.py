@@ -3,6 +3,9 @@ Patient routes - API endpoints for patient data
 """
 from flask import jsonify, request
 from ..services.patient_service import PatientService
+from ..log import get_logger
+
+log = get_logger(__name__)
 
 def register_patient_routes(app):
     """Register all patient-related route handlers with the Flask app"""
@@ -47,5 +50,5 @@ def register_patient_routes(app):
             return jsonify(result)
         
         except Exception as e:
-            print(f"Error adding patient: {str(e)}")
+            log.exception('patient_add_failed')
             return jsonify({"success": False, "error": str(e)}), 500 
\ No newline at end of file
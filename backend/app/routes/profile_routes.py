@@ -0,0 +1,39 @@
+"""
+Profile routes - API endpoints for browsing saved request profiles
+"""
+import os
+from flask import Response, jsonify, request, send_from_directory
+from ..util.profiling import list_profiles, profile_summary
+
+def register_profile_routes(app):
+    """Register the request profile listing and download routes"""
+
+    def profile_dir():
+        return os.path.abspath(app.config.get('PROFILE_DIR', 'instance/profiles'))
+
+    @app.route('/profiles')
+    def get_profiles():
+        """List the most recent request profiles, newest first (optional `limit`, default 20)"""
+        limit = request.args.get('limit', default=20, type=int)
+        return jsonify({
+            "enabled": bool(app.config.get('PROFILING_ENABLED')),
+            "profiles": list_profiles(profile_dir(), max(limit, 1))
+        })
+
+    @app.route('/profiles/<profile_id>')
+    def get_profile(profile_id):
+        """Download a profile; cProfile ones as a pstats report with ?format=text (optional `sort`, `limit`)"""
+        profile = next((p for p in list_profiles(profile_dir()) if p['id'] == profile_id), None)
+        if profile is None:
+            return jsonify({"error": "Profile not found"}), 404
+
+        if request.args.get('format') == 'text' and profile['mode'] == 'cprofile':
+            sort = request.args.get('sort', 'cumulative')
+            limit = request.args.get('limit', default=40, type=int)
+            try:
+                report = profile_summary(os.path.join(profile_dir(), profile['file']), sort, limit)
+            except KeyError:
+                return jsonify({"error": f"Unknown sort key: {sort}"}), 400
+            return Response(report, mimetype='text/plain')
+
+        return send_from_directory(profile_dir(), profile['file'], as_attachment=True)
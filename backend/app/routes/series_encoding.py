@@ -0,0 +1,206 @@
+"""
+Series encoding - Response formats and compression for glucose series
+
+Clients choose a format with ?format= or the Accept header:
+- rows (application/json, default): [{"id", "patient_id", "glucose", "timestamp"}, ...]
+- columns (application/vnd.glucose.columns+json):
+  {"patient_id", "count", "id": [...], "t": [...], "g": [...]}
+- binary (application/vnd.glucose.series or application/octet-stream):
+  little-endian header b"GLS1" + uint32 count, then int64 ids, int64 t and
+  float32 glucose arrays of `count` items each
+
+Batch responses hold several patients' series in the rows or columns shape.
+
+`t` is epoch milliseconds on the server's local wall clock (see
+models.timestamps), i.e. read it with UTC accessors to get the same digits
+as the rows format's "timestamp". Bodies are gzip or brotli compressed when
+the client accepts it.
+
+Series responses carry X-Next-Since and X-Next-Since-Id, the cursor of their
+last reading, to pass back as ?since=&since_id= for only the newer readings.
+They are revalidated with a weak ETag (and Last-Modified where the result only
+depends on the stored readings), so an unchanged poll gets a bodiless 304.
+"""
+import gzip
+import hashlib
+import struct
+import sys
+from array import array
+from datetime import datetime, timezone
+from flask import current_app, request
+from werkzeug.http import is_resource_modified
+from ..models.timestamps import format_readings
+
+try:
+    import brotli
+except ImportError:  # Optional, gzip is used when it's missing
+    brotli = None
+
+ROWS_MIMETYPE = 'application/json'
+COLUMNS_MIMETYPE = 'application/vnd.glucose.columns+json'
+BINARY_MIMETYPE = 'application/vnd.glucose.series'
+
+FORMATS = ('rows', 'columns', 'binary')
+
+_ACCEPTED = [
+    (ROWS_MIMETYPE, 'rows'),
+    (COLUMNS_MIMETYPE, 'columns'),
+    (BINARY_MIMETYPE, 'binary'),
+    ('application/octet-stream', 'binary')
+]
+
+BINARY_MAGIC = b'GLS1'
+_BINARY_HEADER = struct.Struct('<4sI')
+
+# Bodies smaller than this are sent uncompressed
+DEFAULT_COMPRESS_MIN_BYTES = 1024
+
+
+def negotiate_format(formats=FORMATS):
+    """Get the requested series format out of `formats`; raises ValueError for an unknown ?format="""
+    requested = request.args.get('format')
+    if requested is not None:
+        if requested not in formats:
+            raise ValueError(f"format must be one of: {', '.join(formats)}")
+        return requested
+    accepted = [mimetype for mimetype, series_format in _ACCEPTED if series_format in formats]
+    best = request.accept_mimetypes.best_match(accepted, default=ROWS_MIMETYPE)
+    return dict(_ACCEPTED)[best]
+
+
+def _json_response(payload, mimetype=ROWS_MIMETYPE):
+    # Always compact: jsonify indents in debug mode, which also rules out the C encoder
+    body = current_app.json.dumps(payload, indent=None, separators=(',', ':'))
+    return current_app.response_class(body + '\n', mimetype=mimetype)
+
+
+def encode_columns(readings):
+    """Split (unformatted) readings into id, t and g columns"""
+    return {
+        'id': [reading.get('id') for reading in readings],
+        't': [reading['ts'] for reading in readings],
+        'g': [reading['glucose'] for reading in readings]
+    }
+
+
+def encode_binary(readings):
+    """Pack readings as header plus little-endian int64 id, int64 t and float32 glucose arrays"""
+    ids = array('q', [reading.get('id') or 0 for reading in readings])
+    times = array('q', [reading['ts'] for reading in readings])
+    glucose = array('f', [reading['glucose'] for reading in readings])
+    if sys.byteorder != 'little':
+        for column in (ids, times, glucose):
+            column.byteswap()
+    return b''.join((
+        _BINARY_HEADER.pack(BINARY_MAGIC, len(readings)),
+        ids.tobytes(), times.tobytes(), glucose.tobytes()
+    ))
+
+
+def series_etag(token, series_format, *parts):
+    """ETag value for a series representation
+
+    Combines the patient's series version token, the query string, the format
+    and any extra parts describing the result (e.g. its first id and count).
+    """
+    key = '|'.join([token, series_format, request.query_string.decode('latin-1')] + [str(part) for part in parts])
+    return hashlib.blake2b(key.encode(), digest_size=12).hexdigest()
+
+
+def _set_validators(response, etag, last_modified):
+    # Weak because gzip, brotli and identity bodies share the ETag
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = datetime.fromtimestamp(last_modified, timezone.utc)
+    # Cacheable, but revalidated on every use
+    response.cache_control.no_cache = True
+    response.vary.add('Accept')
+    response.vary.add('Accept-Encoding')
+
+
+def not_modified(etag, last_modified=None):
+    """Return a 304 response if the request's If-None-Match / If-Modified-Since match, else None
+
+    `last_modified` is epoch seconds.
+    """
+    modified_at = datetime.fromtimestamp(last_modified, timezone.utc) if last_modified is not None else None
+    if is_resource_modified(request.environ, etag=etag, last_modified=modified_at):
+        return None
+    response = current_app.response_class(status=304)
+    _set_validators(response, etag, last_modified)
+    return response
+
+
+def series_response(patient_id, readings, series_format, cursor=None, etag=None, last_modified=None):
+    """Build the (compressed) response for one patient's readings in the negotiated format
+
+    The next-cursor headers point after the last reading, or at `cursor`
+    (ts, id) when there are none. Check not_modified(etag) before building it.
+    """
+    if readings:
+        cursor = (readings[-1]['ts'], readings[-1].get('id'))
+
+    if series_format == 'columns':
+        payload = {'patient_id': patient_id, 'count': len(readings)}
+        payload.update(encode_columns(readings))
+        response = _json_response(payload, COLUMNS_MIMETYPE)
+    elif series_format == 'binary':
+        response = current_app.response_class(encode_binary(readings), mimetype=BINARY_MIMETYPE)
+    else:
+        response = _json_response(format_readings(readings))
+    response.vary.add('Accept')
+
+    if cursor is not None:
+        for header, value in zip(('X-Next-Since', 'X-Next-Since-Id'), cursor):
+            if value is not None:
+                response.headers[header] = str(value)
+
+    if etag is not None:
+        _set_validators(response, etag, last_modified)
+    return compress_response(response)
+
+
+def batch_response(series, series_format, **fields):
+    """Build the (compressed) response for several patients' readings, rows or columns
+
+    The body is `fields` plus "count" (readings in total) and "series", a
+    {patient_id: readings} object in the single-patient rows or columns shape.
+    """
+    if series_format == 'columns':
+        encoded = {}
+        for patient_id, readings in series.items():
+            encoded[patient_id] = {'count': len(readings)}
+            encoded[patient_id].update(encode_columns(readings))
+    else:
+        encoded = {patient_id: format_readings(readings) for patient_id, readings in series.items()}
+
+    payload = dict(fields)
+    payload['count'] = sum(len(readings) for readings in series.values())
+    payload['series'] = encoded
+    response = _json_response(payload, COLUMNS_MIMETYPE if series_format == 'columns' else ROWS_MIMETYPE)
+    response.vary.add('Accept')
+    return compress_response(response)
+
+
+def compress_response(response):
+    """Compress a response body with brotli or gzip if the client accepts it and it's worth it"""
+    if response.direct_passthrough or response.status_code != 200 or 'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+
+    data = response.get_data()
+    if len(data) < current_app.config.get('COMPRESS_MIN_BYTES', DEFAULT_COMPRESS_MIN_BYTES):
+        return response
+
+    encodings = request.accept_encodings
+    if brotli is not None and encodings['br']:
+        # Quality 5 keeps most of brotli's size win at a fraction of the maximum's CPU
+        body, encoding = brotli.compress(data, quality=5), 'br'
+    elif encodings['gzip']:
+        body, encoding = gzip.compress(data, compresslevel=6), 'gzip'
+    else:
+        return response
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -1,4 +1,5 @@
 # Service modules
 from .patient_service import PatientService
 from .glucose_service import GlucoseService
-from .data_flow_service import DataFlowService 
\ No newline at end of file
+from .data_flow_service import DataFlowService
+from .cohort_service import CohortService
\ No newline at end of file
@@ -0,0 +1,119 @@
+"""
+Cohort service - Fleet-scale initialization of glucose histories
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime
+from ..models.glucose_reading import GlucoseReading
+from ..models.glucose_rollup import GlucoseRollup
+from ..util.db import db_connection
+from ..log import get_logger
+from .live_stats import live_stats
+
+log = get_logger(__name__)
+
+class CohortService:
+    """Service to initialize glucose data for many patients in one pass"""
+
+    # Patients generated per pool task
+    CHUNK_SIZE = 250
+
+    @classmethod
+    def initialize_cohort(cls, patient_type=None, days=1, workers=None, seed=None, progress=None, processes=True):
+        """Generate and bulk-load glucose histories for every predefined patient
+
+        Generation runs in a pool of `workers`; the calling thread is the single
+        writer and inserts each chunk in its own transaction as it completes.
+        The pool is made of spawned processes, or of threads with
+        processes=False, which is what request handlers use: forking a
+        process that runs server threads can deadlock the children.
+        """
+        # numpy is only needed here, keep it out of application startup
+        import numpy as np
+        from .history_generator import generate_chunk, to_readings
+        from .patient_service import PatientService
+        patients = PatientService.get_predefined_patients(patient_type)
+
+        if not patients:
+            return {"error": f"No patients found for type {patient_type}" if patient_type else "No patients loaded"}, 404
+
+        patient_ids = [p['id'] for p in patients]
+        has_diabetes = [bool(p.get('has_diabetes')) for p in patients]
+
+        # Split the cohort into chunks with independent random streams
+        chunks = [
+            (patient_ids[i:i + cls.CHUNK_SIZE], has_diabetes[i:i + cls.CHUNK_SIZE])
+            for i in range(0, len(patient_ids), cls.CHUNK_SIZE)
+        ]
+        seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+        end_time = datetime.now()
+
+        if workers is None:
+            workers = min(len(chunks), os.cpu_count() or 1)
+
+        log.info('cohort_initializing', patients=len(patient_ids), days=days, chunks=len(chunks), workers=workers)
+
+        start = time.perf_counter()
+        insert_seconds = 0.0
+        total_readings = 0
+        done_patients = 0
+
+        with db_connection() as conn:
+            # Clear existing glucose data for the whole cohort
+            GlucoseReading.delete_for_patients(conn, patient_ids)
+
+            def write(result):
+                nonlocal insert_seconds, total_readings, done_patients
+                ids, timestamps, glucose = result
+                insert_start = time.perf_counter()
+                total_readings += GlucoseReading.bulk_create(
+                    conn, to_readings(ids, timestamps, glucose), update_rollups=False
+                )
+                GlucoseRollup.rebuild(conn, ids)
+                insert_seconds += time.perf_counter() - insert_start
+                done_patients += len(ids)
+
+                elapsed = time.perf_counter() - start
+                if progress:
+                    progress(done_patients, len(patient_ids), total_readings, elapsed)
+
+            tasks = [
+                (ids, flags, days, 5, end_time, chunk_seed)
+                for (ids, flags), chunk_seed in zip(chunks, seeds)
+            ]
+
+            if workers <= 1:
+                # Inline generation, useful for small cohorts and debugging
+                for task in tasks:
+                    write(generate_chunk(*task))
+            else:
+                if processes:
+                    # Spawned, not forked, so no lock held by another thread is copied into the workers
+                    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+                else:
+                    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='cohort-generate')
+                with executor:
+                    futures = [executor.submit(generate_chunk, *task) for task in tasks]
+                    for future in as_completed(futures):
+                        write(future.result())
+
+        # Live flow statistics described the histories that were just replaced
+        for patient_id in patient_ids:
+            live_stats.discard(patient_id)
+
+        elapsed = time.perf_counter() - start
+        log.info('cohort_initialized', patients=len(patient_ids), readings=total_readings, elapsed=round(elapsed, 2))
+
+        return {
+            "success": True,
+            "message": "Cohort data initialized successfully",
+            "patients": len(patient_ids),
+            "data_points": total_readings,
+            "workers": workers,
+            "elapsed_seconds": round(elapsed, 3),
+            "insert_seconds": round(insert_seconds, 3),
+            "readings_per_second": round(total_readings / elapsed, 1) if elapsed else None,
+            "patients_per_second": round(len(patient_ids) / elapsed, 1) if elapsed else None
+        }
@@ -1,101 +1,141 @@
 """
 Data Flow Service - Manages continuous data generation for patients
 """
-import threading
+from ..socket.broadcaster import broadcaster
+from ..socket.subscriptions import subscriptions
 from .glucose_service import GlucoseService
+from .flow_scheduler import FlowScheduler
+from .live_stats import live_stats
+from ..log import get_logger
+
+log = get_logger(__name__)
 
 class DataFlowService:
     """Service to manage continuous data flow for patients"""
     
+    # Default seconds between readings and +/- random jitter per tick
+    DEFAULT_INTERVAL = 5.0
+    DEFAULT_JITTER = 0.0
+    
+    # Seconds between readings while nobody is subscribed to the patient (None disables throttling)
+    IDLE_INTERVAL = None
+    
     # Dictionary to store data flow state for each patient
-    # Format: {patient_id: {'active': bool, 'timer': Timer}}
+    # Format: {patient_id: {'active': bool, 'interval': float, 'jitter': float, 'throttled': bool}}
     _patient_data_flows = {}
     
+    # Single scheduler driving every active flow, created on first start
+    _scheduler = None
+    
+    @classmethod
+    def _get_scheduler(cls, socketio):
+        """Get the shared scheduler, creating it on first use"""
+        if cls._scheduler is None:
+            cls._scheduler = FlowScheduler(cls._generate_batch, socketio)
+        return cls._scheduler
+    
+    @classmethod
+    def _generate_batch(cls, patient_ids):
+        """Scheduler callback: generate, insert and emit readings for all due patients"""
+        active_ids = [pid for pid in patient_ids if cls.is_data_flow_active(pid)]
+        if not active_ids:
+            return
+        
+        # One transaction for the whole tick
+        new_readings = GlucoseService.generate_new_readings(active_ids)
+        
+        # Coalesced with other updates into batched WebSocket events for each patient's room,
+        # carrying the patient's live statistics
+        for new_data in new_readings:
+            stats = live_stats.update(new_data)
+            broadcaster.publish(new_data['patient_id'], [new_data], room=new_data['patient_id'], stats=stats)
+        
+        if cls.IDLE_INTERVAL:
+            cls._apply_throttling(active_ids)
+        
+        if len(new_readings) < len(active_ids):
+            # Can repeat every tick, so only a sample is logged
+            log.warning('flow_readings_missing', sample=100, generated=len(new_readings), due=len(active_ids))
+    
     @classmethod
-    def start_data_flow(cls, patient_id, socketio):
+    def start_data_flow(cls, patient_id, socketio, interval=None, jitter=None):
         """Start data flow for a patient"""
-        print(f"Received data flow start request for patient ID: {patient_id}")
+        log.debug('flow_start_requested', patient_id=patient_id)
         
         # Check if patient exists
         from .patient_service import PatientService
         patient_info = PatientService.get_patient(patient_id)
         
         if not patient_info:
-            print(f"Error: Patient {patient_id} not found")
+            log.warning('flow_patient_not_found', patient_id=patient_id)
             return {"error": "Patient not found"}, 404
         
+        interval = cls.DEFAULT_INTERVAL if interval is None else interval
+        jitter = cls.DEFAULT_JITTER if jitter is None else jitter
+        if interval <= 0:
+            return {"error": "Interval must be positive"}, 400
+        
         # If already running, stop it first
-        if patient_id in cls._patient_data_flows and cls._patient_data_flows[patient_id]['active']:
-            print(f"发现患者 {patient_id} 已有活动的数据流，先停止它")
+        if cls.is_data_flow_active(patient_id):
+            log.info('flow_restarting', patient_id=patient_id)
             cls.stop_data_flow(patient_id)
         
-        # Define function to generate data periodically
-        def generate_data_for_patient():
-            if patient_id in cls._patient_data_flows and cls._patient_data_flows[patient_id]['active']:
-                print(f"为患者 {patient_id} 生成新数据点")
-                new_data = GlucoseService.generate_new_reading(patient_id, False)
-                if new_data:
-                    # Send data via WebSocket
-                    print(f"通过WebSocket发送数据: {new_data}")
-                    socketio.emit('glucose_update', {
-                        'patient_id': patient_id,
-                        'data': [new_data]
-                    })
-                else:
-                    print(f"警告: 为患者 {patient_id} 生成数据点失败")
-                
-                # Schedule next run (if flow is still active)
-                if patient_id in cls._patient_data_flows and cls._patient_data_flows[patient_id]['active']:
-                    print(f"安排5秒后的下一次数据生成")
-                    timer = threading.Timer(5.0, generate_data_for_patient)  # Generate a data point every 5 seconds
-                    timer.daemon = True
-                    cls._patient_data_flows[patient_id]['timer'] = timer
-                    timer.start()
-        
-        # Set data flow state and start first timer
-        print(f"设置患者 {patient_id} 的数据流状态为活动")
+        # Set data flow state
         cls._patient_data_flows[patient_id] = {
             'active': True,
-            'timer': None
+            'interval': interval,
+            'jitter': jitter,
+            'throttled': False
         }
         
         # Generate first data point immediately to ensure there's a starting point
-        print(f"立即生成第一个数据点")
         new_data = GlucoseService.generate_new_reading(patient_id, True)
         if new_data:
             # Send data via WebSocket
-            print(f"通过WebSocket发送初始数据: {new_data}")
-            socketio.emit('glucose_update', {
-                'patient_id': patient_id,
-                'data': [new_data]
-            })
+            broadcaster.publish(patient_id, [new_data], room=patient_id, stats=live_stats.update(new_data))
         else:
-            print(f"警告: 为患者 {patient_id} 生成初始数据点失败")
+            log.warning('flow_initial_reading_failed', patient_id=patient_id)
         
-        # Start timer to continue generating data points
-        print(f"启动定时器，5秒后生成下一个数据点")
-        timer = threading.Timer(5.0, generate_data_for_patient)  # Generate next point after 5 seconds
-        timer.daemon = True
-        cls._patient_data_flows[patient_id]['timer'] = timer
-        timer.start()
+        # Hand the flow to the shared scheduler for subsequent readings
+        cls._get_scheduler(socketio).add(patient_id, interval, jitter)
         
-        print(f"患者 {patient_id} 的数据流成功启动")
+        log.info('flow_started', patient_id=patient_id, interval=interval, jitter=jitter)
         return {
             "success": True,
-            "message": f"Data flow started for patient {patient_id}"
+            "message": f"Data flow started for patient {patient_id}",
+            "interval": interval
         }
     
+    @classmethod
+    def _apply_throttling(cls, patient_ids):
+        """Slow down flows nobody is watching, restore the normal interval for watched ones"""
+        for patient_id in patient_ids:
+            flow = cls._patient_data_flows.get(patient_id)
+            if not flow or not flow['active']:
+                continue
+            throttle = subscriptions.count(patient_id) == 0
+            if throttle != flow['throttled']:
+                flow['throttled'] = throttle
+                cls._scheduler.set_interval(patient_id, cls.IDLE_INTERVAL if throttle else flow['interval'])
+    
+    @classmethod
+    def resume_data_flow(cls, patient_id):
+        """Return a throttled flow to its normal interval and produce a reading right away"""
+        flow = cls._patient_data_flows.get(patient_id)
+        if flow and flow['active'] and flow['throttled'] and cls._scheduler is not None:
+            flow['throttled'] = False
+            cls._scheduler.add(patient_id, flow['interval'], flow['jitter'], delay=0)
+    
     @classmethod
     def stop_data_flow(cls, patient_id):
         """Stop data flow for a patient"""
-        if patient_id in cls._patient_data_flows and cls._patient_data_flows[patient_id]['active']:
-            # Cancel timer
-            if cls._patient_data_flows[patient_id]['timer']:
-                cls._patient_data_flows[patient_id]['timer'].cancel()
+        if cls.is_data_flow_active(patient_id):
+            # Remove from scheduler
+            if cls._scheduler is not None:
+                cls._scheduler.remove(patient_id)
             
             # Update state
             cls._patient_data_flows[patient_id]['active'] = False
-            cls._patient_data_flows[patient_id]['timer'] = None
             return {
                 "success": True,
                 "message": f"Data flow stopped for patient {patient_id}"
@@ -108,5 +148,15 @@ class DataFlowService:
     @classmethod
     def is_data_flow_active(cls, patient_id):
         """Check if data flow is active for a patient"""
-        return (patient_id in cls._patient_data_flows and 
-                cls._patient_data_flows[patient_id]['active']) 
\ No newline at end of file
+        return (patient_id in cls._patient_data_flows and
+                cls._patient_data_flows[patient_id]['active'])
+    
+    @classmethod
+    def get_live_stats(cls, patient_id):
+        """Get live statistics (all-time, 1h, 3h, 24h) for a patient's data flow"""
+        return live_stats.get(patient_id)
+    
+    @classmethod
+    def get_active_flow_count(cls):
+        """Get the number of active data flows"""
+        return sum(1 for flow in list(cls._patient_data_flows.values()) if flow['active'])
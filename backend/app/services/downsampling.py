@@ -0,0 +1,123 @@
+"""
+Downsampling - Reduces long glucose series to a bounded number of points for charting
+
+Both methods return sorted indices into the original series, so callers can keep
+their reading dicts unchanged and just select a subset. The first and last points
+are always kept. Hypoglycemic and hyperglycemic excursions survive downsampling:
+min/max buckets keep every bucket's extremes by construction, and LTTB picks a
+bucket's extreme instead of its triangle point whenever the bucket leaves the
+normal range.
+"""
+import numpy as np
+from ..models.glucose_rollup import HYPO_THRESHOLD, HYPER_THRESHOLD
+
+METHODS = ('lttb', 'minmax')
+
+def _endpoints(n, max_points):
+    """The first and last index, or just the first when only one point is allowed"""
+    return np.array([0, n - 1][:max(max_points, 1)], dtype=np.int64)
+
+def _extreme_index(y):
+    """Index of the point furthest outside (or, if none is, closest to leaving) the normal range"""
+    low = y.argmin()
+    high = y.argmax()
+    return low if HYPO_THRESHOLD - y[low] >= y[high] - HYPER_THRESHOLD else high
+
+def minmax_indices(y, max_points):
+    """Keep the minimum and maximum of each of (max_points - 2) // 2 equal-size buckets
+
+    With fewer than 4 points there is no room for a bucket's pair, so only the
+    endpoints and, given 3, the interior point furthest out of range are kept.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if max_points >= n or n < 3:
+        return np.arange(n)
+    if max_points < 3:
+        return _endpoints(n, max_points)
+    if max_points == 3:
+        return np.array([0, 1 + _extreme_index(y[1:-1]), n - 1], dtype=np.int64)
+
+    # Interior points go into a padded (buckets x size) matrix; padding never wins a min/max
+    interior = y[1:-1]
+    buckets = (max_points - 2) // 2
+    size = -(-len(interior) // buckets)
+    rows = -(-len(interior) // size)
+    low = np.full(rows * size, np.inf)
+    high = np.full(rows * size, -np.inf)
+    low[:len(interior)] = interior
+    high[:len(interior)] = interior
+
+    offsets = np.arange(rows) * size + 1
+    mins = offsets + low.reshape(rows, size).argmin(axis=1)
+    maxs = offsets + high.reshape(rows, size).argmax(axis=1)
+    return np.unique(np.concatenate(([0], mins, maxs, [n - 1])))
+
+def lttb_indices(x, y, max_points):
+    """Largest-Triangle-Three-Buckets, with out-of-range buckets keeping their extreme
+
+    Each bucket picks the point forming the largest triangle with the point
+    chosen in the previous bucket and the mean of the next bucket. Areas are
+    computed for a whole bucket at once; only the walk over buckets is a loop.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if max_points >= n:
+        return np.arange(n)
+    if max_points < 3:
+        return _endpoints(n, max_points)
+
+    # Bucket boundaries over the interior points; n > max_points keeps every bucket non-empty
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+
+    # Mean of each bucket, and of the final point for the last bucket
+    sums_x = np.add.reduceat(x[:n - 1], starts)[:len(starts)]
+    sums_y = np.add.reduceat(y[:n - 1], starts)[:len(starts)]
+    counts = ends - starts
+    next_x = np.append(sums_x[1:] / counts[1:], x[-1])
+    next_y = np.append(sums_y[1:] / counts[1:], y[-1])
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for b, (start, end) in enumerate(zip(starts, ends)):
+        bucket_y = y[start:end]
+
+        low = bucket_y.argmin()
+        high = bucket_y.argmax()
+        hypo_depth = HYPO_THRESHOLD - bucket_y[low]
+        hyper_height = bucket_y[high] - HYPER_THRESHOLD
+        if hypo_depth > 0 or hyper_height > 0:
+            # Never let an excursion out of range be smoothed away
+            choice = low if hypo_depth >= hyper_height else high
+        else:
+            px, py = x[previous], y[previous]
+            areas = np.abs(
+                (px - next_x[b]) * (bucket_y - py)
+                - (px - x[start:end]) * (next_y[b] - py)
+            )
+            choice = areas.argmax()
+
+        previous = start + choice
+        selected[b + 1] = previous
+
+    return np.unique(selected)
+
+def downsample(readings, max_points, method='lttb'):
+    """Select at most max_points readings (dicts with 'ts' and 'glucose')"""
+    if method not in METHODS:
+        raise ValueError(f"Unknown downsampling method '{method}', expected one of: {', '.join(METHODS)}")
+    if not max_points or len(readings) <= max_points:
+        return readings
+
+    glucose = np.fromiter((r['glucose'] for r in readings), dtype=np.float64, count=len(readings))
+    if method == 'minmax':
+        indices = minmax_indices(glucose, max_points)
+    else:
+        x = np.fromiter((r['ts'] for r in readings), dtype=np.float64, count=len(readings))
+        indices = lttb_indices(x, glucose, max_points)
+
+    return [readings[i] for i in indices]
@@ -0,0 +1,113 @@
+"""
+Flow scheduler - Single heap-based tick loop for all data flows
+"""
+import heapq
+import itertools
+import random
+import threading
+import time
+from ..log import get_logger
+
+log = get_logger(__name__)
+
+class FlowScheduler:
+    """Wakes once per due time and hands every due key to a batch callback
+    
+    Replaces one timer thread per flow with a single background task. Each
+    key has its own interval and optional jitter. Stale heap entries (from
+    stopped or restarted flows) are skipped by generation number; generations
+    come from one scheduler-wide counter, so a key that is removed and added
+    again never matches an entry from before the remove.
+    """
+    
+    def __init__(self, callback, socketio=None, max_wait=0.5):
+        self._callback = callback
+        self._socketio = socketio
+        self._max_wait = max_wait  # Upper bound on sleep so newly added keys are noticed
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+        self._generations = itertools.count()
+        self._lock = threading.Lock()
+        self._running = False
+    
+    def add(self, key, interval, jitter=0.0, delay=None):
+        """Schedule key every `interval` seconds, first run after `delay` (default: interval)"""
+        with self._lock:
+            generation = next(self._generations)
+            self._entries[key] = {'interval': interval, 'jitter': jitter, 'generation': generation}
+            due = time.monotonic() + (interval if delay is None else delay)
+            heapq.heappush(self._heap, (due, next(self._counter), key, generation))
+        self._ensure_running()
+    
+    def set_interval(self, key, interval):
+        """Change a key's interval, effective from its next run"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry['interval'] = interval
+    
+    def remove(self, key):
+        """Stop scheduling key; returns True if it was scheduled"""
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+    
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+    
+    def _ensure_running(self):
+        """Start the background loop on first use"""
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+        if getattr(self._socketio, 'async_mode', 'threading') != 'threading':
+            # Cooperative task under eventlet/gevent
+            self._socketio.start_background_task(self._run)
+        else:
+            # Daemon thread so the scheduler never blocks interpreter shutdown
+            threading.Thread(target=self._run, name='flow-scheduler', daemon=True).start()
+    
+    def _sleep(self, seconds):
+        if self._socketio is not None:
+            self._socketio.sleep(seconds)
+        else:
+            time.sleep(seconds)
+    
+    def _pop_due(self, now):
+        """Pop every due key and push its next run; returns (due keys, seconds until next run)"""
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due_time, _, key, generation = heapq.heappop(self._heap)
+                entry = self._entries.get(key)
+                if entry is None or entry['generation'] != generation:
+                    continue
+                due.append(key)
+                
+                next_due = due_time + entry['interval']
+                if entry['jitter']:
+                    next_due += random.uniform(-entry['jitter'], entry['jitter'])
+                if next_due <= now:
+                    # Fell behind (slow tick); skip missed runs instead of bursting to catch up
+                    next_due = now + entry['interval']
+                heapq.heappush(self._heap, (next_due, next(self._counter), key, generation))
+            
+            wait = self._heap[0][0] - now if self._heap else self._max_wait
+        return due, wait
+    
+    def _run(self):
+        """Scheduler loop"""
+        while True:
+            due, wait = self._pop_due(time.monotonic())
+            if due:
+                try:
+                    self._callback(due)
+                except Exception:
+                    log.exception('flow_tick_failed', flows=len(due))
+            self._sleep(min(max(wait, 0.0), self._max_wait))
@@ -2,38 +2,205 @@
 Glucose service - Business logic for glucose readings
 """
 import random
-import numpy as np
 from datetime import datetime, timedelta
 from ..models.glucose_reading import GlucoseReading
+from ..models.glucose_rollup import GlucoseRollup, GRANULARITIES, BUCKET_WIDTHS
+from ..models.reading_cache import latest_readings
+from ..models.hot_store import hot_readings
+from ..models.series_version import series_versions
+from ..models.data_version import DataVersion, cache_version
+from ..models.timestamps import now_ms, format_ms, MS_PER_HOUR
 from ..models.patient import Patient
-from ..util.db import get_db_connection
+from ..util.db import db_connection
+from ..metrics import metrics
+from ..log import get_logger
+from .live_stats import live_stats
+
+log = get_logger(__name__)
+
+READINGS_GENERATED = metrics.counter('glucose_readings_generated_total', 'Glucose readings generated by data flows')
 
 class GlucoseService:
     """Glucose service containing business logic for glucose readings"""
     
     @classmethod
-    def get_glucose_readings(cls, patient_id, hours=3, limit=None):
-        """Get glucose readings for a patient within specified time range"""
-        conn = get_db_connection()
-        readings = GlucoseReading.get_for_patient(conn, patient_id, hours, limit)
-        conn.close()
+    def get_glucose_readings(cls, patient_id, hours=3, limit=None, max_points=None, method='lttb'):
+        """Get glucose readings for a patient within specified time range
+        
+        With max_points the series is downsampled ('lttb' or 'minmax') so long
+        ranges stay cheap to send and draw; hypo/hyper excursions are kept.
+        Readings carry epoch ms under 'ts'; format them with format_readings.
+        """
+        readings = None
+        if hours < 24 and hot_readings.enabled:
+            cls.check_caches()
+            readings = cls._get_recent_readings(patient_id, hours, limit)
+        
+        if readings is None:
+            with db_connection() as conn:
+                readings = GlucoseReading.get_for_patient(conn, patient_id, hours, limit)
+        
+        if max_points and len(readings) > max_points:
+            # numpy is only loaded when a long series actually needs reducing
+            from .downsampling import downsample
+            readings = downsample(readings, max_points, method)
         return readings
     
+    @classmethod
+    def get_glucose_readings_batch(cls, patient_ids, hours=24, max_points=None, method='lttb'):
+        """Get many patients' readings over the same range with one query and connection
+        
+        Returns {patient_id: readings} in request order; as for a single patient,
+        24 hours or more returns every reading and max_points downsamples each series.
+        """
+        since = None if hours >= 24 else now_ms() - hours * MS_PER_HOUR
+        with db_connection() as conn:
+            grouped = GlucoseReading.get_for_patients(conn, patient_ids, since)
+        
+        if max_points:
+            long_series = [patient_id for patient_id, readings in grouped.items() if len(readings) > max_points]
+            if long_series:
+                from .downsampling import downsample
+                for patient_id in long_series:
+                    grouped[patient_id] = downsample(grouped[patient_id], max_points, method)
+        return grouped
+    
+    @classmethod
+    def _get_recent_readings(cls, patient_id, hours, limit):
+        """Serve a short-range query from the hot tier, loading the patient on first use
+        
+        Returns None when the range reaches past the hot tier's retention.
+        """
+        now = now_ms()
+        since = now - hours * MS_PER_HOUR
+        readings = hot_readings.query(patient_id, since, limit)
+        if readings is not None or hours > hot_readings.retention_hours or patient_id in hot_readings:
+            # Served, beyond retention, or already loaded but not covering this range
+            return readings
+        
+        # Load the whole retention window so later queries in it are served from memory
+        version = hot_readings.version(patient_id)
+        retention_start = now - int(hot_readings.retention_hours * MS_PER_HOUR)
+        with db_connection() as conn:
+            rows = GlucoseReading.get_rows_since(conn, patient_id, retention_start)
+        hot_readings.load(patient_id, rows, retention_start, version)
+        return hot_readings.query(patient_id, since, limit)
+    
+    @classmethod
+    def get_readings_after(cls, patient_id, since=None, since_id=None, limit=None):
+        """Get one keyset page of readings after a cursor, oldest first
+        
+        The cursor is the ts (epoch ms) and id of the last reading the client
+        has; with only since_id the ts is looked up. Returns None when since_id
+        is not one of the patient's readings (e.g. after re-initialization).
+        """
+        with db_connection() as conn:
+            if since is None:
+                since = GlucoseReading.get_ts(conn, patient_id, since_id)
+                if since is None:
+                    return None
+            return GlucoseReading.get_after(conn, patient_id, since, since_id, limit)
+    
+    @classmethod
+    def get_series_version(cls, patient_id):
+        """Get (token, last modified epoch seconds) for conditional requests on a patient's series"""
+        cls.check_caches()
+        return series_versions.get(patient_id)
+    
+    @classmethod
+    def check_caches(cls):
+        """Clear the in-memory caches if another process wrote readings since they were filled
+        
+        The latest-reading cache, hot tier and series versions only see this
+        process's writes; the database's data version covers everyone's.
+        """
+        with db_connection() as conn:
+            version = DataVersion.get(conn)
+        return cache_version.check(version)
+    
+    @classmethod
+    def get_glucose_stats(cls, patient_id, hours=24, granularity=None):
+        """Get summary statistics for a patient from the pre-aggregated rollups
+        
+        The window is aligned to whole hours (or whole days beyond 72 hours), so
+        the work done is bounded by the window length, not the history length.
+        hours=0 summarizes the patient's whole history from the daily rollups.
+        With granularity ('5min', 'hour' or 'day') the per-bucket rows are included.
+        """
+        if granularity is not None and granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of: {', '.join(GRANULARITIES)}")
+        
+        summary_granularity = 'hour' if hours and hours <= 72 else 'day'
+        since = None
+        if hours:
+            since = now_ms() - hours * MS_PER_HOUR
+            since -= since % BUCKET_WIDTHS[summary_granularity]
+        
+        with db_connection() as conn:
+            buckets = GlucoseRollup.get_buckets(conn, patient_id, summary_granularity, since)
+            series = None
+            if granularity is not None:
+                series = buckets if granularity == summary_granularity else \
+                    GlucoseRollup.get_buckets(conn, patient_id, granularity, since)
+        
+        summary = GlucoseRollup.summarize(buckets)
+        if summary['count']:
+            summary['first_bucket'] = format_ms(summary['first_bucket'])
+            summary['last_bucket'] = format_ms(summary['last_bucket'])
+        
+        result = {
+            'patient_id': patient_id,
+            'hours': hours,
+            'since': format_ms(since) if since is not None else None,
+            'summary': summary
+        }
+        if series is not None:
+            result['granularity'] = granularity
+            result['buckets'] = [
+                {
+                    'bucket': format_ms(b['bucket']),
+                    'count': b['count'],
+                    'min': b['min'],
+                    'max': b['max'],
+                    'mean': round(b['sum'] / b['count'], 1),
+                    'below_range': b['below'],
+                    'in_range': b['in_range'],
+                    'above_range': b['above']
+                }
+                for b in series
+            ]
+        return result
+    
+    @classmethod
+    def get_hot_store_stats(cls):
+        """Get the hot tier's memory gauge and hit/miss counters"""
+        return hot_readings.stats()
+    
     @classmethod
     def get_latest_reading(cls, patient_id):
-        """Get the latest glucose reading for a patient"""
-        conn = get_db_connection()
-        reading = GlucoseReading.get_latest_for_patient(conn, patient_id)
-        conn.close()
+        """Get the latest glucose reading for a patient, served from the cache when possible"""
+        cls.check_caches()
+        found, reading = latest_readings.get(patient_id)
+        if found:
+            return reading
+        
+        generation = latest_readings.generation()
+        with db_connection() as conn:
+            reading = GlucoseReading.get_latest_for_patient(conn, patient_id)
+        latest_readings.fill(patient_id, reading, generation)
         return reading
     
     @classmethod
     def add_reading(cls, reading_data):
         """Add a new glucose reading"""
-        conn = get_db_connection()
-        result = GlucoseReading.create(conn, reading_data)
-        conn.close()
-        return result
+        with db_connection() as conn:
+            return GlucoseReading.create(conn, reading_data)
+    
+    @classmethod
+    def add_readings(cls, readings, return_ids=False):
+        """Add many glucose readings in a single transaction"""
+        with db_connection() as conn:
+            return GlucoseReading.bulk_create(conn, readings, return_ids)
     
     @classmethod
     def initialize_patient_data(cls, patient_id):
@@ -41,29 +208,15 @@ class GlucoseService:
         # Determine if this is a predefined patient
         is_predefined_patient = '#' in patient_id
         
-        # Check if patient exists
-        conn = get_db_connection()
-        patient_info = None
-        
         # Get patient info from service
         from .patient_service import PatientService
         patient_info = PatientService.get_patient(patient_id)
         
         if not patient_info:
-            conn.close()
             return {"error": "Patient not found"}, 404
         
-        # Clear existing glucose data for this patient
-        GlucoseReading.delete_for_patient(conn, patient_id)
-        
-        # Based on patient's diabetes status, determine base glucose value
+        # Based on patient's diabetes status, the generator picks base glucose and variability
         has_diabetes = patient_info.get('has_diabetes', random.choice([True, False]))
-        if has_diabetes:
-            base_glucose = random.randint(120, 180)
-            variability = random.uniform(15, 25)  # Reduced variability for continuity
-        else:
-            base_glucose = random.randint(70, 120)
-            variability = random.uniform(5, 15)   # Reduced variability for continuity
         
         # Generate data points for 24 hours with 5-minute intervals (288 points)
         now = datetime.now()
@@ -75,113 +228,43 @@ class GlucoseService:
         total_points = 288  # 12 readings/hour * 24 hours
         
         # Log the time range we're generating
-        print(f"*** INITIALIZING DATA FOR PATIENT {patient_id} ***")
-        print(f"Generating {total_points} data points from {start_time} to {now}")
-        print(f"Time span: {(now-start_time).total_seconds()/3600:.2f} hours")
-        
-        # Define meal times with smoother impact function
-        meal_times = [
-            {'hour': 7.5, 'intensity': random.uniform(20, 40)},  # Breakfast
-            {'hour': 12.5, 'intensity': random.uniform(25, 45)}, # Lunch
-            {'hour': 18.5, 'intensity': random.uniform(30, 50)}  # Dinner
-        ]
-        
-        # Initialize first point's glucose value
-        prev_glucose = base_glucose
-        all_data_points = []
-        
-        # Generate glucose data chronologically from 24 hours ago to now
-        for i in range(total_points):
-            # Calculate the exact timestamp for this reading
-            timestamp = start_time + timedelta(minutes=interval_minutes*i)
-            hour_in_day = timestamp.hour + timestamp.minute / 60.0
-            
-            # Log timestamps for a few points to verify distribution
-            if i < 5 or i > total_points - 5 or i % 60 == 0:
-                print(f"Point {i+1}/{total_points}: Timestamp = {timestamp}")
-            
-            # Calculate total effect of all meals using Gaussian function
-            meal_effect = 0
-            for meal in meal_times:
-                # Calculate hour difference between current time and meal time
-                hour_diff = min(abs(hour_in_day - meal['hour']), 
-                                abs(hour_in_day - meal['hour'] + 24),
-                                abs(hour_in_day - meal['hour'] - 24))
-                # Use Gaussian function for smooth transition
-                # Effect occurs within 3 hours, peaks at meal time
-                if hour_diff < 3:
-                    # Gaussian function, maximum at meal time, gradually decreasing
-                    gaussian_factor = np.exp(-((hour_diff) ** 2) / (2 * 0.5 ** 2))
-                    meal_effect += meal['intensity'] * gaussian_factor
-            
-            # Add circadian rhythm variation - simulate natural fluctuations throughout the day
-            day_phase = 2 * np.pi * hour_in_day / 24.0
-            circadian_effect = 8 * np.sin(day_phase)  # Circadian effect, reduced amplitude for smoothness
-            
-            # Add continuity randomness - based on previous point's value, not completely random
-            # Use mean regression model: current value tends to regress toward base value
-            regression_factor = 0.85  # Controls regression to previous value, higher = more continuous
-            
-            # Calculate target glucose (base + meal + circadian)
-            target_glucose = base_glucose + meal_effect + circadian_effect
-            
-            # Regression between target and previous value
-            # Ensures each point relates to the previous one, creating continuity
-            glucose = regression_factor * prev_glucose + (1 - regression_factor) * target_glucose
-            
-            # Add small random fluctuations
-            noise = random.normalvariate(0, variability/6)  # Reduced noise for smoothness
-            glucose += noise
-            
-            # For diabetic patients, occasionally add extreme values with continuity
-            if has_diabetes and random.random() < 0.03:  # Reduced rate of extreme values
-                # Smoother extreme value handling
-                direction = 1 if glucose < base_glucose else -1  # Opposite to current direction
-                extreme_factor = random.uniform(15, 30)  # Smaller extremes for realism
-                glucose += direction * extreme_factor
-            
-            # Ensure glucose value is within reasonable range
-            glucose = max(40, min(300, glucose))
-            
-            # Save for next point's base
-            prev_glucose = glucose
-            
-            # Format timestamp as string
-            timestamp_str = timestamp.strftime("%Y-%m-%d %H:%M:%S")
-            
-            # Add data point to list
-            all_data_points.append({
-                'patient_id': patient_id,
-                'glucose': round(glucose, 1),
-                'timestamp': timestamp_str
-            })
-        
-        # Validate the time span before inserting
-        if all_data_points:
-            first_time = datetime.strptime(all_data_points[0]['timestamp'], "%Y-%m-%d %H:%M:%S")
-            last_time = datetime.strptime(all_data_points[-1]['timestamp'], "%Y-%m-%d %H:%M:%S")
-            time_diff = (last_time - first_time).total_seconds() / 3600  # hours
-            print(f"Validation: Generated {len(all_data_points)} data points spanning {time_diff:.2f} hours")
-            print(f"First point: {first_time}, Last point: {last_time}")
-            
-            # Group by hour to ensure complete coverage
-            hour_groups = {}
-            for point in all_data_points:
-                time = datetime.strptime(point['timestamp'], "%Y-%m-%d %H:%M:%S")
-                hour_key = time.strftime("%Y-%m-%d %H")
-                hour_groups[hour_key] = hour_groups.get(hour_key, 0) + 1
-            
-            print(f"Data spans {len(hour_groups)} distinct hours")
-            if len(hour_groups) < 24:
-                print("WARNING: Data covers less than 24 distinct hours!")
+        log.info('patient_data_initializing', patient_id=patient_id, points=total_points,
+                 start=start_time.replace(microsecond=0), end=now.replace(microsecond=0))
+        
+        # Generate the whole series (meals, circadian rhythm, regression, noise, extremes) as arrays;
+        # imported here so numpy is only loaded once a history is actually requested
+        from .history_generator import generate_histories, to_readings
+        timestamps, glucose = generate_histories(
+            [has_diabetes], days=1, interval_minutes=interval_minutes, end_time=now
+        )
+        all_data_points = to_readings([patient_id], timestamps, glucose)
         
-        # Insert all data points (already in chronological order)
-        for point in all_data_points:
-            GlucoseReading.create(conn, point)
+        # Validate the time span before inserting; debugging only, the generator's spacing is fixed
+        if log.debug_enabled and len(timestamps):
+            hours_covered = len(set((timestamps // MS_PER_HOUR).tolist()))
+            log.debug(
+                'patient_data_generated',
+                patient_id=patient_id,
+                points=len(all_data_points),
+                span_hours=round(int(timestamps[-1] - timestamps[0]) / MS_PER_HOUR, 2),
+                first=format_ms(int(timestamps[0])),
+                last=format_ms(int(timestamps[-1])),
+                hours_covered=hours_covered
+            )
+            if hours_covered < 24:
+                log.warning('patient_data_coverage_gap', patient_id=patient_id, hours_covered=hours_covered)
         
-        print(f"Successfully inserted {len(all_data_points)} data points for patient {patient_id}")
+        with db_connection() as conn:
+            # Clear existing glucose data for this patient
+            GlucoseReading.delete_for_patient(conn, patient_id)
+            
+            # Insert all data points (already in chronological order) in one transaction
+            GlucoseReading.bulk_create(conn, all_data_points)
         
-        conn.close()
+        # Live flow statistics described the history that was just replaced
+        live_stats.discard(patient_id)
+        
+        log.info('patient_data_initialized', patient_id=patient_id, points=len(all_data_points))
         
         return {
             "success": True, 
@@ -193,6 +276,32 @@ class GlucoseService:
     @classmethod
     def generate_new_reading(cls, patient_id, force_new_base=False):
         """Generate a new glucose reading for a patient based on realistic patterns"""
+        new_reading = cls._next_reading(patient_id, force_new_base)
+        if not new_reading:
+            return None
+        
+        with db_connection() as conn:
+            reading = GlucoseReading.create(conn, new_reading)
+        READINGS_GENERATED.inc()
+        return reading
+    
+    @classmethod
+    def generate_new_readings(cls, patient_ids):
+        """Generate one new reading for each patient and insert them in a single transaction"""
+        new_readings = []
+        for patient_id in patient_ids:
+            new_reading = cls._next_reading(patient_id)
+            if new_reading:
+                new_readings.append(new_reading)
+        
+        with db_connection() as conn:
+            created = GlucoseReading.bulk_create(conn, new_readings, return_ids=True)
+        READINGS_GENERATED.inc(len(created))
+        return created
+    
+    @classmethod
+    def _next_reading(cls, patient_id, force_new_base=False):
+        """Compute the next reading for a patient without inserting it"""
         # Get patient info
         from .patient_service import PatientService
         patient_info = PatientService.get_patient(patient_id)
@@ -202,17 +311,15 @@ class GlucoseService:
         
         has_diabetes = patient_info.get('has_diabetes', False)
         
-        conn = get_db_connection()
-        
         # If force_new_base or no history, generate initial glucose value
         if force_new_base:
             # For all patients, generate around 100 as initial value
             base_range = 15  # Allowed variation range
             latest_glucose = random.randint(100 - base_range, 100 + base_range)
-            print(f"Generating new initial glucose value for patient {patient_id}: {latest_glucose} mg/dL")
+            log.debug('initial_glucose', patient_id=patient_id, glucose=latest_glucose, forced=True)
         else:
-            # Get latest reading (just for latest value, not timestamp)
-            latest_reading = GlucoseReading.get_latest_for_patient(conn, patient_id)
+            # Get latest reading (just for latest value, not timestamp), normally a cache hit
+            latest_reading = cls.get_latest_reading(patient_id)
             
             # If no history found, generate reasonable initial value
             if not latest_reading:
@@ -222,7 +329,7 @@ class GlucoseService:
                 else:
                     # For non-diabetic patients, generate normal range initial value
                     latest_glucose = random.randint(70, 120)
-                print(f"Generating initial glucose value for patient {patient_id}: {latest_glucose} mg/dL")
+                log.debug('initial_glucose', patient_id=patient_id, glucose=latest_glucose, forced=False)
             else:
                 latest_glucose = latest_reading['glucose']
         
@@ -243,16 +350,8 @@ class GlucoseService:
         new_glucose = max(40, min(300, latest_glucose + change))
         
         # Always use current timestamp to ensure data is real-time
-        new_timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        # Create new reading
-        new_reading = {
+        return {
             'patient_id': patient_id,
             'glucose': round(new_glucose, 1),
-            'timestamp': new_timestamp
-        }
-        
-        result = GlucoseReading.create(conn, new_reading)
-        conn.close()
-        
-        return result 
\ No newline at end of file
+            'ts': now_ms()
+        } 
\ No newline at end of file
@@ -0,0 +1,146 @@
+"""
+History generator - Vectorized synthesis of glucose history
+
+Produces the same kind of curve as the original per-point loop (meal
+Gaussians, circadian rhythm, mean regression, noise and occasional extreme
+events for diabetic patients) but computes every term as a NumPy array, so a
+whole cohort of N patients x M days is generated in one call. The regression
+itself still steps through time, clipping each point to the valid range as
+the loop did, but every step covers all N patients.
+"""
+from datetime import datetime, timedelta
+import numpy as np
+
+# Meal times (hour of day) and intensity ranges (mg/dL) for breakfast, lunch and dinner
+MEAL_HOURS = np.array([7.5, 12.5, 18.5])
+MEAL_INTENSITY_LOW = np.array([20.0, 25.0, 30.0])
+MEAL_INTENSITY_HIGH = np.array([40.0, 45.0, 50.0])
+MEAL_WIDTH_HOURS = 0.5      # Standard deviation of the meal Gaussian
+MEAL_WINDOW_HOURS = 3.0     # Meals have no effect further away than this
+
+CIRCADIAN_AMPLITUDE = 8.0
+REGRESSION_FACTOR = 0.85    # Weight of the previous value, higher = more continuous
+EXTREME_RATE = 0.03         # Chance per point of an extreme event for diabetic patients
+
+GLUCOSE_MIN = 40
+GLUCOSE_MAX = 300
+
+
+def _regress(inputs, initial, factor, base, pushes=None):
+    """Step y[t] = factor * y[t-1] + inputs[t] for every patient at once, like the per-point loop
+
+    Each step is clipped to [GLUCOSE_MIN, GLUCOSE_MAX] before it feeds the
+    next, and an extreme event's push (pushes[t], 0 for none) raises a value
+    below `base` and lowers any other, so excursions and their recovery
+    follow the original loop exactly. Only the walk over time is a Python
+    loop; each step is one array operation across the cohort.
+    """
+    # Time-major copies so every step reads and writes contiguous rows
+    inputs = np.ascontiguousarray(inputs.T)
+    if pushes is not None:
+        pushes = np.ascontiguousarray(pushes.T)
+    output = np.empty_like(inputs)
+    previous = np.asarray(initial, dtype=float)
+
+    for t in range(inputs.shape[0]):
+        value = output[t]
+        np.multiply(previous, factor, out=value)
+        value += inputs[t]
+        if pushes is not None:
+            # Opposite to the current direction: up when below base, down otherwise
+            value += np.where(value < base, pushes[t], -pushes[t])
+        np.clip(value, GLUCOSE_MIN, GLUCOSE_MAX, out=value)
+        previous = value
+
+    return output.T
+
+
+def generate_histories(has_diabetes, days=1, interval_minutes=5, end_time=None, seed=None):
+    """Generate glucose histories for a cohort of patients
+
+    Args:
+        has_diabetes: Sequence of booleans, one per patient
+        days: Number of days of history per patient
+        interval_minutes: Minutes between consecutive readings
+        end_time: Time of the last reading window (defaults to now)
+        seed: Seed for reproducible output
+
+    Returns:
+        (timestamps, glucose) where timestamps is an int64 array of epoch
+        milliseconds (see models.timestamps) shared by every patient and glucose is an
+        (n_patients, n_points) float array rounded to 0.1 mg/dL
+    """
+    rng = np.random.default_rng(seed)
+    diabetic = np.asarray(has_diabetes, dtype=bool)
+    n_patients = diabetic.shape[0]
+    points_per_day = int(24 * 60 // interval_minutes)
+    n_points = points_per_day * days
+
+    # Timestamps start `days` before end_time and step forward
+    end_time = end_time or datetime.now()
+    start_time = (end_time - timedelta(days=days)).replace(microsecond=0)
+    offsets = np.arange(n_points) * interval_minutes
+    times = np.datetime64(start_time, 's') + offsets.astype('timedelta64[m]')
+    timestamps = times.astype('datetime64[ms]').astype(np.int64)
+
+    # Fractional hour of day for every point
+    start_hour = start_time.hour + start_time.minute / 60.0 + start_time.second / 3600.0
+    hour_in_day = (start_hour + offsets / 60.0) % 24.0
+    day_index = ((start_hour + offsets / 60.0) // 24.0).astype(int)
+
+    # Per-patient base level and variability
+    base_glucose = np.where(
+        diabetic,
+        rng.integers(120, 181, n_patients),
+        rng.integers(70, 121, n_patients)
+    ).astype(float)
+    variability = np.where(
+        diabetic,
+        rng.uniform(15, 25, n_patients),
+        rng.uniform(5, 15, n_patients)
+    )
+
+    # Meal effect: circular hour distance to each meal, Gaussian inside the window.
+    # Intensities are drawn per patient per day so multi-day histories vary.
+    n_days = day_index[-1] + 1 if n_points else 0
+    intensities = rng.uniform(MEAL_INTENSITY_LOW, MEAL_INTENSITY_HIGH, (n_patients, n_days, len(MEAL_HOURS)))
+    hour_diff = np.abs((hour_in_day[:, None] - MEAL_HOURS[None, :] + 12.0) % 24.0 - 12.0)
+    gaussian = np.exp(-hour_diff ** 2 / (2 * MEAL_WIDTH_HOURS ** 2)) * (hour_diff < MEAL_WINDOW_HOURS)
+    meal_effect = np.einsum('ptm,tm->pt', intensities[:, day_index, :], gaussian)
+
+    # Circadian rhythm
+    circadian_effect = CIRCADIAN_AMPLITUDE * np.sin(2 * np.pi * hour_in_day / 24.0)
+
+    # Mean regression toward the target, plus noise, as an AR(1) driven by these inputs
+    target = base_glucose[:, None] + meal_effect + circadian_effect[None, :]
+    noise = rng.normal(0.0, 1.0, (n_patients, n_points)) * (variability / 6)[:, None]
+    inputs = (1 - REGRESSION_FACTOR) * target + noise
+
+    # Extreme events push against the current direction and then decay through the regression
+    extreme_mask = diabetic[:, None] & (rng.random((n_patients, n_points)) < EXTREME_RATE)
+    magnitude = rng.uniform(15, 30, (n_patients, n_points))
+    pushes = extreme_mask * magnitude if extreme_mask.any() else None
+
+    glucose = _regress(inputs, base_glucose, REGRESSION_FACTOR, base_glucose, pushes)
+    return timestamps, np.round(glucose, 1)
+
+
+def to_readings(patient_ids, timestamps, glucose):
+    """Flatten generated histories into reading dicts for GlucoseReading.bulk_create"""
+    timestamps = timestamps.tolist()
+    return [
+        {'patient_id': patient_id, 'glucose': value, 'ts': ts}
+        for patient_id, row in zip(patient_ids, glucose.tolist())
+        for ts, value in zip(timestamps, row)
+    ]
+
+
+def generate_chunk(patient_ids, has_diabetes, days, interval_minutes, end_time, seed):
+    """Process pool entry point: generate one chunk of a cohort
+
+    Returns plain arrays, which pickle far more cheaply than reading dicts.
+    """
+    timestamps, glucose = generate_histories(
+        has_diabetes, days=days, interval_minutes=interval_minutes, end_time=end_time, seed=seed
+    )
+    return patient_ids, timestamps, glucose
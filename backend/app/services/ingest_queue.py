@@ -0,0 +1,280 @@
+"""
+Ingest queue - Write-behind buffer that group-commits incoming glucose readings
+"""
+import atexit
+import os
+import signal
+import threading
+import time
+from collections import deque
+from ..socket.broadcaster import broadcaster
+from ..log import get_logger
+from .glucose_service import GlucoseService
+
+log = get_logger(__name__)
+
+class QueueFull(Exception):
+    """Raised by IngestQueue.submit when the readings would exceed the queue's depth"""
+
+class IngestQueue:
+    """Accepts readings immediately and inserts them from one writer thread
+
+    The writer commits whatever has accumulated in a single transaction once
+    `batch_size` readings are waiting or the oldest has waited `max_delay`
+    seconds, so bursts turn into a few large commits instead of one per request.
+    At most `max_depth` readings are held; beyond that submit raises QueueFull
+    and callers shed load (e.g. HTTP 429). `write` inserts a list of readings
+    and returns them with ids; `on_commit` gets each committed batch. A batch
+    whose write keeps failing is logged and dropped after `retries` attempts.
+    Pending readings are flushed at interpreter exit and, once
+    drain_on_signal() is called, on SIGTERM.
+    """
+
+    def __init__(self, write, on_commit=None, max_depth=10000, batch_size=500, max_delay=0.05, retries=3):
+        self._write = write
+        self._on_commit = on_commit
+        self.max_depth = max_depth
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.retries = retries
+
+        self._pending = deque()
+        # [monotonic accept time, readings still pending] per submit, oldest first
+        self._arrivals = deque()
+        self._oldest = None  # monotonic time the oldest pending reading was accepted
+        self._in_flight = 0  # readings taken by the writer but not yet committed
+        self._flushing = 0  # flush() callers waiting, the writer skips max_delay for them
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closing = False
+        self._exit_hook = False
+        self._signal_handlers = {}
+
+        # Metrics
+        self.accepted = 0
+        self.rejected = 0
+        self.committed = 0
+        self.dropped = 0
+        self.batches = 0
+        self.peak_depth = 0
+
+    def configure(self, max_depth=None, batch_size=None, max_delay=None):
+        """Apply settings"""
+        with self._cond:
+            if max_depth is not None:
+                self.max_depth = max_depth
+            if batch_size is not None:
+                self.batch_size = batch_size
+            if max_delay is not None:
+                self.max_delay = max_delay
+            self._cond.notify()
+
+    def submit(self, readings):
+        """Queue readings for insertion; returns the queue depth, raises QueueFull when over max_depth"""
+        if not readings:
+            return self.depth()
+        with self._cond:
+            depth = len(self._pending) + self._in_flight
+            if depth + len(readings) > self.max_depth:
+                self.rejected += len(readings)
+                raise QueueFull(f"ingest queue full ({depth} of {self.max_depth} readings pending)")
+            accepted_at = time.monotonic()
+            if not self._pending:
+                self._oldest = accepted_at
+            self._arrivals.append([accepted_at, len(readings)])
+            self._pending.extend(readings)
+            depth += len(readings)
+            self.accepted += len(readings)
+            self.peak_depth = max(self.peak_depth, depth)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+        self._ensure_running()
+        return depth
+
+    def depth(self):
+        """Readings accepted but not yet committed"""
+        with self._cond:
+            return len(self._pending) + self._in_flight
+
+    def flush(self, timeout=None):
+        """Block until everything accepted so far is committed (or dropped); returns True if drained"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                return self._wait_drained(deadline)
+            finally:
+                self._flushing -= 1
+
+    def _wait_drained(self, deadline):
+        # Caller holds the lock
+        while self._pending or self._in_flight:
+            if self._thread is None or not self._thread.is_alive():
+                # No writer (never started, or shutting down), drain from this thread
+                self._cond.release()
+                try:
+                    self._write_batch()
+                finally:
+                    self._cond.acquire()
+                continue
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            self._cond.wait(remaining if remaining is not None else 0.1)
+        return True
+
+    def close(self, timeout=10.0):
+        """Stop the writer after it has committed everything pending"""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self.flush(timeout)
+        with self._cond:
+            self._closing = False
+            self._thread = None
+
+    def drain_on_signal(self, signum=signal.SIGTERM):
+        """Commit pending readings before the process dies of `signum`
+
+        SIGTERM ends Python without running atexit hooks, so without this a
+        stop or redeploy loses whatever was queued. The previous handler runs
+        after the drain; the default action is re-raised. Only the main thread
+        can install handlers, elsewhere this returns False.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return False
+        previous = signal.getsignal(signum)
+        if previous is self._signal_handlers.get(signum):
+            return True
+
+        def handler(received, frame):
+            log.info('ingest_draining', signal=signal.Signals(received).name, depth=self.depth())
+            self.close()
+            if callable(previous):
+                previous(received, frame)
+            elif previous != signal.SIG_IGN:
+                signal.signal(received, signal.SIG_DFL)
+                os.kill(os.getpid(), received)
+
+        signal.signal(signum, handler)
+        self._signal_handlers[signum] = handler
+        return True
+
+    def stats(self):
+        """Get queue depth and throughput counters"""
+        with self._cond:
+            return {
+                'depth': len(self._pending) + self._in_flight,
+                'max_depth': self.max_depth,
+                'peak_depth': self.peak_depth,
+                'accepted': self.accepted,
+                'rejected': self.rejected,
+                'committed': self.committed,
+                'dropped': self.dropped,
+                'batches': self.batches,
+                'mean_batch': round(self.committed / self.batches, 1) if self.batches else 0
+            }
+
+    def _ensure_running(self):
+        """Start the writer thread on first use"""
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            # Daemon so a stuck write can't hang exit; the atexit hook drains it first
+            self._thread = threading.Thread(target=self._run, name='glucose-ingest', daemon=True)
+            self._thread.start()
+            register_exit_hook = not self._exit_hook
+            self._exit_hook = True
+        if register_exit_hook:
+            atexit.register(self.close)
+
+    def _take(self):
+        """Take up to batch_size pending readings (caller holds the lock)"""
+        count = min(len(self._pending), self.batch_size)
+        batch = [self._pending.popleft() for _ in range(count)]
+        self._in_flight += count
+        # Leftovers keep their original accept time, so they are due max_delay after arriving
+        remaining = count
+        while remaining:
+            arrival = self._arrivals[0]
+            if arrival[1] > remaining:
+                arrival[1] -= remaining
+                break
+            remaining -= arrival[1]
+            self._arrivals.popleft()
+        self._oldest = self._arrivals[0][0] if self._pending else None
+        return batch
+
+    def _write_batch(self):
+        """Take and commit one batch; returns False if nothing was pending"""
+        with self._cond:
+            batch = self._take()
+        if not batch:
+            return False
+
+        created = None
+        for attempt in range(1, self.retries + 1):
+            try:
+                created = self._write(batch)
+                break
+            except Exception:
+                log.exception('ingest_write_failed', readings=len(batch), attempt=attempt)
+                time.sleep(0.05 * attempt)
+
+        with self._cond:
+            self._in_flight -= len(batch)
+            if created is None:
+                self.dropped += len(batch)
+            else:
+                self.committed += len(batch)
+                self.batches += 1
+            self._cond.notify_all()
+
+        if created is None:
+            log.error('ingest_batch_dropped', readings=len(batch))
+        elif self._on_commit is not None:
+            try:
+                self._on_commit(created)
+            except Exception:
+                log.exception('ingest_on_commit_failed', readings=len(created))
+        return True
+
+    def _run(self):
+        """Writer loop: sleep until a batch is full, the oldest reading is due or the queue closes"""
+        while True:
+            with self._cond:
+                while True:
+                    if self._pending:
+                        if self._closing or self._flushing or len(self._pending) >= self.batch_size:
+                            break
+                        wait = self._oldest + self.max_delay - time.monotonic()
+                        if wait <= 0:
+                            break
+                    elif self._closing:
+                        return
+                    else:
+                        wait = None
+                    self._cond.wait(wait)
+            self._write_batch()
+
+
+def _write_readings(readings):
+    """Insert one batch in a single transaction, with ids so the caches stay warm"""
+    return GlucoseService.add_readings(readings, return_ids=True)
+
+
+def _publish_readings(readings):
+    """Broadcast a committed batch to each patient's room"""
+    by_patient = {}
+    for reading in readings:
+        by_patient.setdefault(reading['patient_id'], []).append(reading)
+    for patient_id, patient_readings in by_patient.items():
+        broadcaster.publish(patient_id, patient_readings, room=patient_id)
+
+
+# Shared queue behind /mock_update, sized in create_app
+ingest_queue = IngestQueue(_write_readings, _publish_readings)
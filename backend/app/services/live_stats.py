@@ -0,0 +1,297 @@
+"""
+Live stats - Incremental glucose statistics for active data flows
+
+Every generated reading is folded into a per-patient accumulator in O(1), so
+mean, SD, coefficient of variation, time in range and hypo/hyper event counts
+are always current without rescanning history. Besides the all-time figures
+(Welford's algorithm) each patient has sliding windows over the last 1h, 3h
+and 24h backed by fixed-size ring buffers of time buckets, so memory per
+patient is constant no matter how fast readings arrive.
+"""
+import math
+import threading
+from array import array
+from ..models.glucose_rollup import HYPO_THRESHOLD, HYPER_THRESHOLD
+
+# Sliding windows kept for every patient, in seconds
+WINDOWS = {'1h': 3600, '3h': 3 * 3600, '24h': 24 * 3600}
+
+# Time buckets per window ring buffer (1 minute resolution for the 1h window)
+WINDOW_BUCKETS = 60
+
+# Range codes, also used as indices into the per-range counters
+_IN_RANGE, _BELOW, _ABOVE = 0, 1, 2
+
+
+def _range_code(glucose):
+    if glucose < HYPO_THRESHOLD:
+        return _BELOW
+    if glucose > HYPER_THRESHOLD:
+        return _ABOVE
+    return _IN_RANGE
+
+
+def _summary(count, mean, variance, minimum, maximum, ranges, events):
+    """Shape shared by the all-time and windowed figures"""
+    if not count:
+        return {'count': 0}
+    std = math.sqrt(max(variance, 0.0))
+    return {
+        'count': count,
+        'mean': round(mean, 1),
+        'std': round(std, 1),
+        'cv': round(100 * std / mean, 1) if mean else None,
+        'min': minimum,
+        'max': maximum,
+        'time_below_range_pct': round(100 * ranges[_BELOW] / count, 1),
+        'time_in_range_pct': round(100 * ranges[_IN_RANGE] / count, 1),
+        'time_above_range_pct': round(100 * ranges[_ABOVE] / count, 1),
+        'hypo_events': events[_BELOW],
+        'hyper_events': events[_ABOVE]
+    }
+
+
+class RunningStats:
+    """All-time accumulator using Welford's online mean/variance"""
+
+    __slots__ = ('count', 'mean', 'm2', 'min', 'max', 'ranges', 'events')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.ranges = [0, 0, 0]
+        self.events = [0, 0, 0]
+
+    def add(self, glucose, code, event_start):
+        self.count += 1
+        delta = glucose - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (glucose - self.mean)
+        self.min = glucose if self.min is None else min(self.min, glucose)
+        self.max = glucose if self.max is None else max(self.max, glucose)
+        self.ranges[code] += 1
+        if event_start:
+            self.events[code] += 1
+
+    def summary(self):
+        variance = self.m2 / self.count if self.count else 0.0
+        return _summary(self.count, self.mean, variance, self.min, self.max, self.ranges, self.events)
+
+
+class WindowStats:
+    """Statistics over roughly the last `seconds`, held in a ring of time buckets
+
+    The window is split into `buckets` slots of equal width; each slot keeps
+    count, sum, sum of squares, min, max and range/event counts for the
+    readings that fell into it. A slot is recycled when its time comes round
+    again, so updates are O(1), summaries touch a fixed number of slots and
+    memory does not depend on how often readings arrive. The oldest slot may
+    be partially outside the window, so the covered span is reported too.
+    """
+
+    def __init__(self, seconds, buckets=WINDOW_BUCKETS):
+        self.seconds = seconds
+        self.buckets = buckets
+        self.width = seconds / buckets
+        self._ids = array('q', [-1]) * buckets
+        self._counts = array('q', [0]) * buckets
+        self._sums = array('d', [0.0]) * buckets
+        self._sums_sq = array('d', [0.0]) * buckets
+        self._mins = array('d', [0.0]) * buckets
+        self._maxs = array('d', [0.0]) * buckets
+        # Range and event counts, indexed by slot * 3 + range code
+        self._ranges = array('q', [0]) * (buckets * 3)
+        self._events = array('q', [0]) * (buckets * 3)
+
+        # Running totals over the live slots, adjusted as slots fill and expire
+        self._count = 0
+        self._sum = 0.0
+        self._sum_sq = 0.0
+        self._range_totals = [0, 0, 0]
+        self._event_totals = [0, 0, 0]
+        self._newest = None
+        self._expired = -1  # Every bucket id up to this one has left the window
+
+        # Window min/max and oldest live bucket, rescanned only after a slot expires
+        self._min = self._max = None
+        self._first = None
+        self._stale = False
+
+    def _advance(self, newest):
+        """Move the window forward to end at bucket `newest`, expiring older slots"""
+        if self._newest is not None and newest <= self._newest:
+            return
+        self._newest = newest
+        oldest = newest - self.buckets + 1
+        if oldest - 1 <= self._expired:
+            return
+
+        if oldest - self._expired > self.buckets:
+            # Long gap, any slot may hold an expired bucket
+            candidates = range(self.buckets)
+        else:
+            candidates = [bucket_id % self.buckets for bucket_id in range(self._expired + 1, oldest)]
+        for slot in candidates:
+            if self._counts[slot] and self._ids[slot] < oldest:
+                self._clear(slot)
+        self._expired = oldest - 1
+
+    def _clear(self, slot):
+        self._count -= self._counts[slot]
+        self._sum -= self._sums[slot]
+        self._sum_sq -= self._sums_sq[slot]
+        for code in (_IN_RANGE, _BELOW, _ABOVE):
+            self._range_totals[code] -= self._ranges[slot * 3 + code]
+            self._event_totals[code] -= self._events[slot * 3 + code]
+            self._ranges[slot * 3 + code] = self._events[slot * 3 + code] = 0
+        self._ids[slot] = -1
+        self._counts[slot] = 0
+        self._sums[slot] = self._sums_sq[slot] = 0.0
+        self._stale = True
+
+    def add(self, when, glucose, code, event_start):
+        bucket_id = int(when // self.width)
+        self._advance(bucket_id)
+        if bucket_id <= self._expired:
+            # Arrived too late, already outside the window
+            return
+
+        slot = bucket_id % self.buckets
+        if self._ids[slot] != bucket_id:
+            self._ids[slot] = bucket_id
+            self._mins[slot] = self._maxs[slot] = glucose
+
+        self._counts[slot] += 1
+        self._sums[slot] += glucose
+        self._sums_sq[slot] += glucose * glucose
+        if glucose < self._mins[slot]:
+            self._mins[slot] = glucose
+        elif glucose > self._maxs[slot]:
+            self._maxs[slot] = glucose
+        self._ranges[slot * 3 + code] += 1
+
+        self._count += 1
+        self._sum += glucose
+        self._sum_sq += glucose * glucose
+        self._range_totals[code] += 1
+        if event_start:
+            self._events[slot * 3 + code] += 1
+            self._event_totals[code] += 1
+
+        if not self._stale:
+            if self._min is None:
+                self._min = self._max = glucose
+                self._first = bucket_id
+            else:
+                self._min = min(self._min, glucose)
+                self._max = max(self._max, glucose)
+                self._first = min(self._first, bucket_id)
+
+    def summary(self, now):
+        self._advance(int(now // self.width))
+        count = self._count
+        if not count:
+            self._min = self._max = self._first = None
+            self._stale = False
+            return {'count': 0}
+
+        if self._stale:
+            live = [slot for slot in range(self.buckets) if self._counts[slot]]
+            self._min = min(self._mins[slot] for slot in live)
+            self._max = max(self._maxs[slot] for slot in live)
+            self._first = min(self._ids[slot] for slot in live)
+            self._stale = False
+
+        mean = self._sum / count
+        result = _summary(
+            count, mean, self._sum_sq / count - mean * mean,
+            self._min, self._max, self._range_totals, self._event_totals
+        )
+        result['covered_seconds'] = round(now - self._first * self.width, 1)
+        return result
+
+    def nbytes(self):
+        """Memory held by this window's buffers"""
+        return sum(
+            buffer.itemsize * len(buffer)
+            for buffer in (self._ids, self._counts, self._sums, self._sums_sq,
+                           self._mins, self._maxs, self._ranges, self._events)
+        )
+
+
+class PatientLiveStats:
+    """All-time and windowed accumulators for one patient"""
+
+    def __init__(self, window_buckets=WINDOW_BUCKETS):
+        self.total = RunningStats()
+        self.windows = {name: WindowStats(seconds, window_buckets) for name, seconds in WINDOWS.items()}
+        self.last_code = _IN_RANGE
+        self.last_time = None
+
+    def add(self, when, glucose):
+        code = _range_code(glucose)
+        # An event starts when a reading leaves the target range in a new direction
+        event_start = code != _IN_RANGE and code != self.last_code
+        self.last_code = code
+        self.last_time = when if self.last_time is None else max(self.last_time, when)
+
+        self.total.add(glucose, code, event_start)
+        for window in self.windows.values():
+            window.add(when, glucose, code, event_start)
+
+    def summary(self):
+        now = self.last_time
+        result = {'all': self.total.summary()}
+        for name, window in self.windows.items():
+            result[name] = window.summary(now)
+        return result
+
+
+class LiveStatsRegistry:
+    """Thread-safe map of patient_id to live statistics"""
+
+    def __init__(self, window_buckets=WINDOW_BUCKETS):
+        self.window_buckets = window_buckets
+        self._patients = {}
+        self._lock = threading.Lock()
+
+    def update(self, reading):
+        """Fold a reading (dict with patient_id, glucose, ts) in and return the new summary"""
+        when = reading['ts'] / 1000.0
+        glucose = float(reading['glucose'])
+        with self._lock:
+            stats = self._patients.get(reading['patient_id'])
+            if stats is None:
+                stats = self._patients[reading['patient_id']] = PatientLiveStats(self.window_buckets)
+            stats.add(when, glucose)
+            return stats.summary()
+
+    def get(self, patient_id):
+        """Get the current summary for a patient, or None if no live readings were seen"""
+        with self._lock:
+            stats = self._patients.get(patient_id)
+            return stats.summary() if stats is not None else None
+
+    def discard(self, patient_id):
+        """Forget a patient, e.g. when its history is regenerated"""
+        with self._lock:
+            self._patients.pop(patient_id, None)
+
+    def memory_usage(self):
+        """Get the number of tracked patients and the bytes held by their windows"""
+        with self._lock:
+            return {
+                'patients': len(self._patients),
+                'bytes': sum(
+                    window.nbytes()
+                    for stats in self._patients.values()
+                    for window in stats.windows.values()
+                )
+            }
+
+
+# Shared registry, updated by DataFlowService for every generated reading
+live_stats = LiveStatsRegistry()
@@ -1,79 +1,167 @@
 """
 Patient service - Business logic for patient data
 """
+import csv
 import os
-import pandas as pd
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
 from ..models.patient import Patient
-from ..util.db import get_db_connection
+from ..util.db import db_connection
 from ...config import get_config
+from ..log import get_logger
+
+log = get_logger(__name__)
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+def _peak_rss_mb():
+    """Peak resident set size of this process in MB, or None if unavailable"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes elsewhere
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(peak / divisor, 1)
+
+def _rss_growth(before):
+    """How much the peak RSS grew since `before` (MB), or None if unavailable"""
+    after = _peak_rss_mb()
+    if before is None or after is None:
+        return None
+    return round(after - before, 1)
 
 class PatientService:
     """Patient service containing business logic for patients"""
 
+    # Columns the patient roster CSV must provide
+    REQUIRED_COLUMNS = ['Name', 'type', 'age', 'weight', 'height', 'has_diabetes']
+    
     # Dictionary to store predefined patient data
     _patient_data = {}
     
+    # id -> patient record for predefined patients, built at CSV load time
+    _patient_index = {}
+    
+    # Figures from the last load_patient_csv call
+    _load_stats = {}
+    
+    # LRU of database-backed patients (None marks a known-missing id)
+    DB_CACHE_SIZE = 1024
+    _db_patient_cache = OrderedDict()
+    _db_cache_lock = threading.Lock()
+    
     @classmethod
-    def load_patient_csv(cls):
-        """Load predefined patient data from CSV file"""
+    def load_patient_csv(cls, csv_path=None, persist=False, chunk_size=5000):
+        """Load predefined patient data from CSV file
+        
+        Rows are streamed with the csv module so large rosters never sit in
+        memory twice. With persist=True the patients are also written to the
+        patient table, chunk_size rows per transaction.
+        """
+        start = time.perf_counter()
+        rss_before = _peak_rss_mb()
         try:
             # Get CSV file path
-            config = get_config()
-            csv_path = config.get_patient_csv_path()
+            if csv_path is None:
+                config = get_config()
+                csv_path = config.get_patient_csv_path()
             
             if not os.path.exists(csv_path):
                 raise FileNotFoundError(f"Patient CSV file not found: {csv_path}")
             
-            # Load CSV file
-            print(f"Loading patient data from: {csv_path}")
-            df = pd.read_csv(csv_path)
+            log.debug('patient_csv_loading', csv_path=csv_path)
             
-            # Validate CSV file format
-            required_columns = ['Name', 'type', 'age', 'weight', 'height', 'has_diabetes']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            if missing_columns:
-                raise ValueError(f"Patient CSV file missing required columns: {', '.join(missing_columns)}. Columns: {', '.join(df.columns)}")
-            
-            # Output debug information
-            print(f"Patient CSV file contains columns: {', '.join(df.columns)}")
-            
-            # Initialize patient data dictionary
+            # Initialize patient data dictionary and lookup index
             cls._patient_data = {}
+            cls._patient_index = {}
+            skipped = 0
+            persisted = 0
             
-            # Group data by patient type
-            for index, row in df.iterrows():
-                patient_type = row['type']
+            with open(csv_path, newline='', encoding='utf-8') as f, \
+                    (db_connection() if persist else nullcontext()) as conn:
+                reader = csv.DictReader(f)
                 
-                # Create patient data object
-                patient_info = {
-                    'id': row['Name'],  # Use Name column as ID
-                    'type': patient_type,
-                    'age': int(row['age']),
-                    'weight': float(row['weight']),
-                    'height': float(row['height']),
-                    'has_diabetes': bool(int(row['has_diabetes'])),  # Convert to boolean
-                    'diabetes_type': int(row['has_diabetes']) and (1 if index % 2 == 0 else 2)  # Randomly assign diabetes type
-                }
+                # Validate CSV file format
+                columns = reader.fieldnames or []
+                missing_columns = [col for col in cls.REQUIRED_COLUMNS if col not in columns]
+                if missing_columns:
+                    raise ValueError(f"Patient CSV file missing required columns: {', '.join(missing_columns)}. Columns: {', '.join(columns)}")
                 
-                # Group by type
-                if patient_type not in cls._patient_data:
-                    cls._patient_data[patient_type] = []
+                chunk = []
+                for index, row in enumerate(reader):
+                    try:
+                        has_diabetes = int(row['has_diabetes'])
+                        patient_info = {
+                            'id': row['Name'],  # Use Name column as ID
+                            'type': row['type'],
+                            'age': int(row['age']),
+                            'weight': float(row['weight']),
+                            'height': float(row['height']),
+                            'has_diabetes': bool(has_diabetes),
+                            'diabetes_type': has_diabetes and (1 if index % 2 == 0 else 2)  # Alternate diabetes type
+                        }
+                    except (TypeError, ValueError):
+                        # Malformed or truncated row, skip it rather than dropping the whole roster
+                        skipped += 1
+                        continue
+                    
+                    cls._add_predefined_patient(patient_info)
+                    
+                    if persist:
+                        chunk.append(patient_info)
+                        if len(chunk) >= chunk_size:
+                            persisted += Patient.bulk_create(conn, chunk)
+                            chunk = []
                 
-                cls._patient_data[patient_type].append(patient_info)
-            
-            # Output loaded patient data types and counts
-            for patient_type, patients in cls._patient_data.items():
-                print(f"Loaded {len(patients)} {patient_type} type patients")
+                if persist and chunk:
+                    persisted += Patient.bulk_create(conn, chunk)
             
-            print(f"Loaded {sum(len(patients) for patients in cls._patient_data.values())} patients from CSV {csv_path}")
+            cls._load_stats = {
+                'csv_path': csv_path,
+                'patients': len(cls._patient_index),
+                'skipped_rows': skipped,
+                'persisted': persisted,
+                'elapsed_seconds': round(time.perf_counter() - start, 3),
+                'peak_rss_mb': _peak_rss_mb(),
+                'peak_rss_growth_mb': _rss_growth(rss_before)
+            }
+            log.info(
+                'patient_csv_loaded',
+                types={patient_type: len(patients) for patient_type, patients in cls._patient_data.items()},
+                **cls._load_stats
+            )
             return True
-        except Exception as e:
-            print(f"Error loading patient CSV data: {str(e)}")
-            print("Current working directory:", os.getcwd())
+        except Exception:
+            log.exception('patient_csv_load_failed', cwd=os.getcwd())
             # If file doesn't exist or reading fails, create an empty dictionary
             cls._patient_data = {}
+            cls._patient_index = {}
+            cls._load_stats = {}
             return False
     
+    @classmethod
+    def get_load_stats(cls):
+        """Get timing and memory figures from the last CSV load"""
+        return dict(cls._load_stats)
+    
+    @classmethod
+    def _add_predefined_patient(cls, patient_info):
+        """Group a predefined patient by type and add it to the id index
+        
+        The same record object backs both structures; get_patient hands out copies.
+        """
+        patient_type = patient_info['type']
+        if patient_type not in cls._patient_data:
+            cls._patient_data[patient_type] = []
+        cls._patient_data[patient_type].append(patient_info)
+        cls._patient_index[patient_info['id']] = patient_info
+    
     @classmethod
     def get_patient_types(cls):
         """Get all patient types"""
@@ -86,48 +174,62 @@ class PatientService:
             return [{'id': p['id'], 'type': p['type']} for p in cls._patient_data[patient_type]]
         return []
     
+    @classmethod
+    def get_predefined_patients(cls, patient_type=None):
+        """Get full records of predefined patients, optionally filtered by type"""
+        if patient_type is not None:
+            return list(cls._patient_data.get(patient_type, []))
+        return [patient for patients in cls._patient_data.values() for patient in patients]
+    
     @classmethod
     def get_all_patients(cls):
         """Get all patients (both predefined and from database)"""
         # First get patients from database
-        conn = get_db_connection()
-        db_patients = Patient.get_all(conn)
+        with db_connection() as conn:
+            db_patients = Patient.get_all(conn)
         
         # Add predefined patient IDs
-        predefined_patient_ids = []
-        for patients in cls._patient_data.values():
-            predefined_patient_ids.extend([p['id'] for p in patients])
+        predefined_patient_ids = list(cls._patient_index)
         
         # Merge and deduplicate
-        conn.close()
         return list(set(db_patients + predefined_patient_ids))
     
     @classmethod
     def get_patient(cls, patient_id):
         """Get a specific patient by ID"""
-        # First check predefined patient data
-        for patient_type, patients in cls._patient_data.items():
-            for patient in patients:
-                if patient['id'] == patient_id:
-                    return {
-                        'id': patient['id'],
-                        'type': patient['type'],
-                        'age': patient['age'],
-                        'weight': float(patient['weight']),
-                        'height': float(patient['height']),
-                        'has_diabetes': bool(patient['has_diabetes']),
-                        'diabetes_type': patient.get('diabetes_type')
-                    }
+        # First check predefined patient index
+        patient = cls._patient_index.get(patient_id)
+        if patient is not None:
+            return dict(patient)
         
-        # If not found in predefined data, check database
-        conn = get_db_connection()
-        patient = Patient.get_by_id(conn, patient_id)
-        conn.close()
+        # Then the LRU of database-backed patients
+        with cls._db_cache_lock:
+            if patient_id in cls._db_patient_cache:
+                cls._db_patient_cache.move_to_end(patient_id)
+                patient = cls._db_patient_cache[patient_id]
+                return dict(patient) if patient is not None else None
         
-        if patient:
-            return patient
+        # If not found in memory, check database
+        with db_connection() as conn:
+            patient = Patient.get_by_id(conn, patient_id)
         
-        return None
+        cls._cache_db_patient(patient_id, patient)
+        return dict(patient) if patient is not None else None
+    
+    @classmethod
+    def _cache_db_patient(cls, patient_id, patient):
+        """Remember a database lookup result, evicting the least recently used entry"""
+        with cls._db_cache_lock:
+            cls._db_patient_cache[patient_id] = patient
+            cls._db_patient_cache.move_to_end(patient_id)
+            while len(cls._db_patient_cache) > cls.DB_CACHE_SIZE:
+                cls._db_patient_cache.popitem(last=False)
+    
+    @classmethod
+    def invalidate_patient(cls, patient_id):
+        """Drop a database-backed patient from the LRU"""
+        with cls._db_cache_lock:
+            cls._db_patient_cache.pop(patient_id, None)
     
     @classmethod
     def create_patient(cls, patient_data):
@@ -136,20 +238,19 @@ class PatientService:
         patient_id = patient_data['id']
         
         # Check if ID already exists in predefined patients
-        for patient_type, patients in cls._patient_data.items():
-            for patient in patients:
-                if patient.get('id') == patient_id:
-                    return {"success": False, "error": "Patient ID already exists in predefined data"}
+        if patient_id in cls._patient_index:
+            return {"success": False, "error": "Patient ID already exists in predefined data"}
         
         # Check if ID already exists in database
-        conn = get_db_connection()
-        if Patient.exists(conn, patient_id):
-            conn.close()
-            return {"success": False, "error": "Patient ID already exists in database"}
+        with db_connection() as conn:
+            if Patient.exists(conn, patient_id):
+                return {"success": False, "error": "Patient ID already exists in database"}
+            
+            # Insert new patient into database
+            result = Patient.create(conn, patient_data)
         
-        # Insert new patient into database
-        result = Patient.create(conn, patient_data)
-        conn.close()
+        # Any cached "not found" for this id is now stale
+        cls.invalidate_patient(patient_id)
         
         if result:
             return {"success": True, "message": "Patient added successfully"}
@@ -0,0 +1,200 @@
+"""
+Stream ingest - Batched parsing and insertion of NDJSON or CSV reading uploads
+
+Bodies are consumed in chunks, line by line, so uploads of any size are handled in
+constant memory: every `batch_size` lines are parsed, validated and inserted
+in one transaction, and only per-batch counts and the first errors are kept.
+
+NDJSON lines are objects, CSV files start with a header row; both need
+patient_id, glucose and either timestamp (ISO 8601 or "%Y-%m-%d %H:%M:%S")
+or ts (epoch ms).
+"""
+import csv
+import json
+import math
+import time
+from ..models.timestamps import to_ms_many
+from ..log import get_logger
+from .glucose_service import GlucoseService
+
+log = get_logger(__name__)
+
+FORMATS = ('ndjson', 'csv')
+
+# Plausible glucose values in mg/dL; anything outside is rejected as a bad record
+GLUCOSE_MIN = 0.0
+GLUCOSE_MAX = 1000.0
+
+# Rejections reported individually, later ones are only counted
+MAX_REPORTED_ERRORS = 100
+
+
+def iter_lines(stream, chunk_size=65536):
+    """Yield the lines of a binary stream, reading it in large chunks
+
+    Much faster than readline() on chunked request bodies, which are
+    decoded a few bytes at a time.
+    """
+    remainder = b''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        lines = (remainder + chunk).split(b'\n')
+        remainder = lines.pop()
+        yield from lines
+    if remainder:
+        yield remainder
+
+
+def _ndjson_records(lines):
+    """Yield (line number, record dict or error string) for non-blank NDJSON lines"""
+    for line_no, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_no, 'invalid JSON'
+            continue
+        yield line_no, record if isinstance(record, dict) else 'not a JSON object'
+
+
+def _csv_records(lines):
+    """Yield (line number, record dict or error string) for CSV data rows after the header"""
+    decoded = (line.decode('utf-8', errors='replace') if isinstance(line, bytes) else line for line in lines)
+    reader = csv.reader(decoded)
+    header = None
+    for row in reader:
+        if not row or not any(field.strip() for field in row):
+            continue
+        if header is None:
+            header = [field.strip() for field in row]
+            continue
+        if len(row) != len(header):
+            yield reader.line_num, f"expected {len(header)} fields, got {len(row)}"
+            continue
+        yield reader.line_num, dict(zip(header, row))
+
+
+class StreamIngestService:
+    """Parses, validates and inserts streamed readings in large batches"""
+
+    @classmethod
+    def ingest(cls, lines, fmt='ndjson', batch_size=5000):
+        """Ingest an iterable of lines (str or bytes); returns the accept/reject summary
+
+        Batches that were inserted stay committed if a later one fails; the
+        summary then carries an 'error' and stops there.
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(FORMATS)}")
+        records = _csv_records(lines) if fmt == 'csv' else _ndjson_records(lines)
+
+        start = time.perf_counter()
+        summary = {'format': fmt, 'accepted': 0, 'rejected': 0, 'batches': [], 'errors': []}
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                if not cls._ingest_batch(batch, summary):
+                    break
+                batch = []
+        else:
+            if batch:
+                cls._ingest_batch(batch, summary)
+
+        summary['errors_truncated'] = summary['rejected'] > len(summary['errors'])
+        summary['seconds'] = round(time.perf_counter() - start, 3)
+        log.info('stream_ingested', format=fmt, accepted=summary['accepted'], rejected=summary['rejected'],
+                 batches=len(summary['batches']), seconds=summary['seconds'])
+        return summary
+
+    @classmethod
+    def _ingest_batch(cls, batch, summary):
+        """Validate and insert one batch, updating the summary; returns False if the insert failed"""
+        readings, errors = cls.parse_batch(batch)
+
+        if readings:
+            try:
+                GlucoseService.add_readings(readings)
+            except Exception as e:
+                log.exception('stream_ingest_batch_failed', batch=len(summary['batches']) + 1, readings=len(readings))
+                summary['error'] = f"batch {len(summary['batches']) + 1} (lines {batch[0][0]}-{batch[-1][0]}) failed: {e}"
+                return False
+
+        summary['accepted'] += len(readings)
+        summary['rejected'] += len(errors)
+        summary['batches'].append({
+            'batch': len(summary['batches']) + 1,
+            'first_line': batch[0][0],
+            'last_line': batch[-1][0],
+            'accepted': len(readings),
+            'rejected': len(errors)
+        })
+        room = MAX_REPORTED_ERRORS - len(summary['errors'])
+        if room > 0:
+            summary['errors'].extend(errors[:room])
+        return True
+
+    @classmethod
+    def parse_batch(cls, batch):
+        """Turn (line number, record or error) pairs into (readings, errors)
+
+        Timestamp strings of the whole batch are parsed in one vectorized call.
+        Each error is {'line', 'error'}.
+        """
+        errors = []
+        candidates = []
+        timestamps = []
+        for line_no, record in batch:
+            if isinstance(record, str):
+                errors.append({'line': line_no, 'error': record})
+                continue
+
+            patient_id = record.get('patient_id')
+            if not isinstance(patient_id, str) or not patient_id.strip():
+                errors.append({'line': line_no, 'error': 'missing patient_id'})
+                continue
+
+            glucose = record.get('glucose')
+            if isinstance(glucose, str):
+                try:
+                    glucose = float(glucose)
+                except ValueError:
+                    glucose = None
+            if isinstance(glucose, bool) or not isinstance(glucose, (int, float)) or \
+                    not math.isfinite(glucose) or not GLUCOSE_MIN < glucose < GLUCOSE_MAX:
+                errors.append({'line': line_no, 'error': 'glucose must be a number between 0 and 1000'})
+                continue
+
+            ts = record.get('ts')
+            if ts not in (None, ''):
+                try:
+                    ts = int(ts)
+                except (TypeError, ValueError):
+                    errors.append({'line': line_no, 'error': 'ts must be epoch milliseconds'})
+                    continue
+            elif record.get('timestamp'):
+                # Parsed below, all at once
+                timestamps.append((len(candidates), record['timestamp']))
+                ts = None
+            else:
+                errors.append({'line': line_no, 'error': 'missing timestamp or ts'})
+                continue
+            candidates.append([line_no, {'patient_id': patient_id.strip(), 'glucose': glucose, 'ts': ts}])
+
+        if timestamps:
+            parsed = to_ms_many([value for _, value in timestamps])
+            for (index, value), ms in zip(timestamps, parsed):
+                if ms is None:
+                    errors.append({'line': candidates[index][0], 'error': f"invalid timestamp: {value}"})
+                    candidates[index] = None
+                else:
+                    candidates[index][1]['ts'] = ms
+
+        readings = [candidate[1] for candidate in candidates if candidate is not None]
+        errors.sort(key=lambda error: error['line'])
+        return readings, errors
@@ -1,2 +1,3 @@
 # Socket handlers
-from .handlers import register_socket_handlers 
\ No newline at end of file
+from .handlers import register_socket_handlers
+from .broadcaster import broadcaster 
\ No newline at end of file
@@ -0,0 +1,180 @@
+"""
+Broadcaster - Coalesces glucose updates into batched WebSocket events
+"""
+import json
+import threading
+import time
+from ..models.timestamps import format_readings
+from ..metrics import metrics
+from ..log import get_logger
+
+log = get_logger(__name__)
+
+EVENTS_EMITTED = metrics.counter('glucose_socket_events_total', 'Glucose WebSocket events emitted', ('event',))
+POINTS_EMITTED = metrics.counter('glucose_socket_points_total', 'Readings sent in glucose WebSocket events', ('event',))
+# Encoding a payload again just to measure it would double serialization, so only one
+# event in PAYLOAD_SAMPLE_EVERY is measured
+PAYLOAD_SAMPLE_EVERY = 32
+PAYLOAD_BYTES = metrics.histogram(
+    'glucose_socket_payload_bytes', f"Encoded size of glucose WebSocket event payloads, 1 in {PAYLOAD_SAMPLE_EVERY} events",
+    ('event',),
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576)
+)
+
+class GlucoseBroadcaster:
+    """Collects glucose readings and emits them as one 'glucose_batch' event per room
+    
+    Readings published within `window` seconds of each other are sent together.
+    A room's pending batch is flushed early once it holds `max_batch` points.
+    With window set to 0 every publish is emitted immediately as a classic
+    'glucose_update' event.
+    
+    Every update carries 'published_at', the epoch time in ms (fractional) at
+    which its earliest reading was published, so clients can measure delivery
+    latency.
+    """
+    
+    def __init__(self, socketio=None, window=0.15, max_batch=500):
+        self._socketio = socketio
+        self.window = window
+        self.max_batch = max_batch
+        
+        # Format: {room: {patient_id: [reading, ...]}}, room None means broadcast to all
+        self._pending = {}
+        # Latest live statistics per room and patient, sent along with the readings
+        self._pending_stats = {}
+        self._pending_points = {}
+        # Earliest publish time per room and patient, as epoch ms
+        self._pending_published = {}
+        self._lock = threading.Lock()
+        self._running = False
+        
+        # Metrics
+        self.events_emitted = 0
+        self.points_emitted = 0
+        self.publish_count = 0
+    
+    def init_app(self, socketio, window=None, max_batch=None):
+        """Bind to a SocketIO instance and apply settings"""
+        self._socketio = socketio
+        if window is not None:
+            self.window = window
+        if max_batch is not None:
+            self.max_batch = max_batch
+    
+    def publish(self, patient_id, readings, room=None, stats=None):
+        """Queue readings for a patient; they are emitted within `window` seconds
+        
+        `stats` (live statistics for the patient) is attached to the update;
+        when several publishes are coalesced the most recent stats win.
+        Readings carry epoch ms under 'ts' and are formatted for clients here.
+        """
+        if not readings:
+            return
+        published_at = time.time() * 1000
+        readings = format_readings(readings)
+        
+        if not self.window:
+            payload = {'patient_id': patient_id, 'data': readings, 'published_at': published_at}
+            if stats is not None:
+                payload['stats'] = stats
+            self._emit('glucose_update', payload, room, len(readings))
+            with self._lock:
+                self.publish_count += 1
+            return
+        
+        flush_now = None
+        with self._lock:
+            self.publish_count += 1
+            room_pending = self._pending.setdefault(room, {})
+            room_pending.setdefault(patient_id, []).extend(readings)
+            self._pending_published.setdefault(room, {}).setdefault(patient_id, published_at)
+            if stats is not None:
+                self._pending_stats.setdefault(room, {})[patient_id] = stats
+            self._pending_points[room] = self._pending_points.get(room, 0) + len(readings)
+            
+            # Size cap reached, send this room's batch from the publishing thread
+            if self._pending_points[room] >= self.max_batch:
+                flush_now = self._take(room)
+        
+        if flush_now:
+            self._emit_batch(room, *flush_now)
+        self._ensure_running()
+    
+    def flush(self):
+        """Emit every pending batch immediately"""
+        with self._lock:
+            batches = [(room, self._take(room)) for room in list(self._pending)]
+        for room, (updates, points) in batches:
+            self._emit_batch(room, updates, points)
+    
+    def stats(self):
+        """Get emit counters"""
+        with self._lock:
+            return {
+                'events_emitted': self.events_emitted,
+                'points_emitted': self.points_emitted,
+                'publish_count': self.publish_count,
+                'pending_points': sum(self._pending_points.values())
+            }
+    
+    def _take(self, room):
+        """Remove and return a room's pending batch (caller holds the lock)"""
+        room_pending = self._pending.pop(room, {})
+        room_stats = self._pending_stats.pop(room, {})
+        room_published = self._pending_published.pop(room, {})
+        points = self._pending_points.pop(room, 0)
+        updates = []
+        for pid, data in room_pending.items():
+            update = {'patient_id': pid, 'data': data, 'published_at': room_published.get(pid)}
+            if pid in room_stats:
+                update['stats'] = room_stats[pid]
+            updates.append(update)
+        return updates, points
+    
+    def _emit_batch(self, room, updates, points):
+        if updates:
+            self._emit('glucose_batch', {'updates': updates, 'count': points}, room, points)
+    
+    def _emit(self, event, payload, room, points):
+        if room is None:
+            self._socketio.emit(event, payload)
+        else:
+            self._socketio.emit(event, payload, to=room)
+        with self._lock:
+            self.events_emitted += 1
+            self.points_emitted += points
+            sampled = self.events_emitted % PAYLOAD_SAMPLE_EVERY == 0
+        EVENTS_EMITTED.labels(event).inc()
+        POINTS_EMITTED.labels(event).inc(points)
+        if sampled:
+            # Encoded like the Socket.IO packet itself
+            PAYLOAD_BYTES.labels(event).observe(len(json.dumps(payload, separators=(',', ':'))))
+    
+    def _ensure_running(self):
+        """Start the background flush loop on first use"""
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+        if getattr(self._socketio, 'async_mode', 'threading') != 'threading':
+            # Cooperative task under eventlet/gevent
+            self._socketio.start_background_task(self._run)
+        else:
+            # Daemon thread so the flusher never blocks interpreter shutdown
+            threading.Thread(target=self._run, name='glucose-broadcaster', daemon=True).start()
+    
+    def _run(self):
+        """Flush loop, wakes once per window"""
+        while True:
+            start = time.monotonic()
+            try:
+                self.flush()
+            except Exception:
+                log.exception('broadcast_flush_failed')
+            remaining = self.window - (time.monotonic() - start)
+            self._socketio.sleep(max(remaining, 0.01))
+
+
+# Shared instance, bound to the app's SocketIO in create_app
+broadcaster = GlucoseBroadcaster()
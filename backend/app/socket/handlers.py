@@ -1,8 +1,22 @@
 """
 Socket handlers - WebSocket event handlers
 """
+from flask import request
+from flask_socketio import emit, join_room, leave_room
 from ..services.glucose_service import GlucoseService
-from ..util.db import get_db_connection
+from ..models.timestamps import format_reading
+from .subscriptions import subscriptions
+from ..log import get_logger
+
+log = get_logger(__name__)
+
+def _patient_ids(message):
+    """Accept a single patient id, a list of ids, or {'patient_ids': [...]} / {'patient_id': ...}"""
+    if isinstance(message, dict):
+        message = message.get('patient_ids', message.get('patient_id'))
+    if isinstance(message, (list, tuple)):
+        return [str(pid) for pid in message if pid]
+    return [str(message)] if message else []
 
 def register_socket_handlers(socketio):
     """Register all socket event handlers"""
@@ -10,23 +24,51 @@ def register_socket_handlers(socketio):
     @socketio.on('connect')
     def handle_connect():
         """Handle client connection"""
-        print('Client connected')
-
+        log.info('client_connected', sid=request.sid)
+    
     @socketio.on('disconnect')
     def handle_disconnect():
         """Handle client disconnection"""
-        print('Client disconnected')
-
+        # Rooms are left automatically; only the subscriber counts need updating
+        subscriptions.remove_client(request.sid)
+        log.info('client_disconnected', sid=request.sid)
+    
     @socketio.on('subscribe')
-    def handle_subscribe(patient_id):
-        """Handle subscription to patient data"""
-        print(f'Client subscribed to patient {patient_id}')
+    def handle_subscribe(message):
+        """Handle subscription to one or more patients' data"""
+        patient_ids = _patient_ids(message)
+        log.debug('client_subscribed', sid=request.sid, patient_ids=patient_ids)
         
-        # Send initial data
-        latest_reading = GlucoseService.get_latest_reading(patient_id)
+        latest_readings = []
+        for patient_id in patient_ids:
+            join_room(patient_id)
+            if subscriptions.add(request.sid, patient_id):
+                # First viewer: lift any idle throttling on this patient's flow
+                from ..services.data_flow_service import DataFlowService
+                DataFlowService.resume_data_flow(patient_id)
+            
+            latest_reading = GlucoseService.get_latest_reading(patient_id)
+            if latest_reading:
+                latest_readings.append(format_reading(latest_reading))
+        
+        # Send initial data to the subscribing client only
+        if len(patient_ids) == 1 and latest_readings:
+            emit('glucose_update', {
+                'patient_id': patient_ids[0],
+                'data': latest_readings
+            })
+        elif latest_readings:
+            emit('glucose_batch', {
+                'updates': [{'patient_id': r['patient_id'], 'data': [r]} for r in latest_readings],
+                'count': len(latest_readings)
+            })
+    
+    @socketio.on('unsubscribe')
+    def handle_unsubscribe(message):
+        """Handle unsubscription from one or more patients' data"""
+        patient_ids = _patient_ids(message)
+        log.debug('client_unsubscribed', sid=request.sid, patient_ids=patient_ids)
         
-        if latest_reading:
-            socketio.emit('glucose_update', {
-                'patient_id': patient_id,
-                'data': [latest_reading]
-            }) 
\ No newline at end of file
+        for patient_id in patient_ids:
+            leave_room(patient_id)
+            subscriptions.remove(request.sid, patient_id)
@@ -0,0 +1,70 @@
+"""
+Subscriptions - Tracks which WebSocket clients follow which patients
+"""
+import threading
+
+class SubscriptionRegistry:
+    """Thread-safe map of patient rooms to subscribed client session ids"""
+    
+    def __init__(self):
+        # Format: {patient_id: {sid, ...}} and the reverse {sid: {patient_id, ...}}
+        self._subscribers = {}
+        self._patients_by_sid = {}
+        self._lock = threading.Lock()
+    
+    def add(self, sid, patient_id):
+        """Subscribe a client; returns True if it is the patient's first subscriber"""
+        with self._lock:
+            subscribers = self._subscribers.setdefault(patient_id, set())
+            first = not subscribers
+            subscribers.add(sid)
+            self._patients_by_sid.setdefault(sid, set()).add(patient_id)
+            return first
+    
+    def remove(self, sid, patient_id):
+        """Unsubscribe a client; returns True if the patient has no subscribers left"""
+        with self._lock:
+            subscribers = self._subscribers.get(patient_id)
+            if not subscribers or sid not in subscribers:
+                return False
+            subscribers.discard(sid)
+            followed = self._patients_by_sid.get(sid)
+            if followed is not None:
+                followed.discard(patient_id)
+                if not followed:
+                    del self._patients_by_sid[sid]
+            if not subscribers:
+                del self._subscribers[patient_id]
+                return True
+            return False
+    
+    def remove_client(self, sid):
+        """Drop every subscription of a disconnected client; returns the patients it followed"""
+        with self._lock:
+            patient_ids = self._patients_by_sid.pop(sid, set())
+            for patient_id in patient_ids:
+                subscribers = self._subscribers.get(patient_id)
+                if subscribers:
+                    subscribers.discard(sid)
+                    if not subscribers:
+                        del self._subscribers[patient_id]
+            return list(patient_ids)
+    
+    def count(self, patient_id):
+        """Get the number of clients subscribed to a patient"""
+        with self._lock:
+            return len(self._subscribers.get(patient_id, ()))
+    
+    def counts(self):
+        """Get subscriber counts for every patient with at least one subscriber"""
+        with self._lock:
+            return {patient_id: len(sids) for patient_id, sids in self._subscribers.items()}
+    
+    def client_count(self):
+        """Get the number of clients with at least one subscription"""
+        with self._lock:
+            return len(self._patients_by_sid)
+
+
+# Shared registry used by the socket handlers and the data flow service
+subscriptions = SubscriptionRegistry()
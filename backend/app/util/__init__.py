@@ -1,2 +1,2 @@
 # Utility modules
-from .db import get_db_connection, init_db 
\ No newline at end of file
+from .db import get_db_connection, db_connection, get_pool_stats, configure_pool, init_db
\ No newline at end of file
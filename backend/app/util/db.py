@@ -2,19 +2,251 @@
 Database utility functions
 """
 import os
+import queue
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from ..models.patient import Patient
 from ..models.glucose_reading import GlucoseReading
+from ..models.glucose_rollup import GlucoseRollup
+from ..models.reading_cache import latest_readings
+from ..models.series_version import series_versions
+from ..models.hot_store import hot_readings
+from ..models.data_version import DataVersion, cache_version
+from .migrations import run_migrations
+from ..metrics import metrics
+from ..log import get_logger
+
+log = get_logger(__name__)
+
+DB_WAIT_SECONDS = metrics.histogram(
+    'glucose_db_connection_wait_seconds', 'Time spent waiting for a pooled SQLite connection')
+DB_HOLD_SECONDS = metrics.histogram(
+    'glucose_db_connection_hold_seconds', 'Time a pooled SQLite connection was held for its queries')
 
 # Database file path
 DB_FILE = 'instance/glucose.db'
 
+# Pragmas applied to every pooled connection
+# WAL lets readers run while the data flow writes, NORMAL sync is safe under WAL
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,      # Negative value is in KiB (16 MB page cache)
+    'mmap_size': 67108864,     # 64 MB memory-mapped I/O
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,      # Milliseconds to wait on a locked database
+}
+
+
+class ConnectionPool:
+    """Bounded pool of long-lived SQLite connections shared across threads"""
+
+    def __init__(self, db_file, max_size=8, timeout=10.0, pragmas=None, cached_statements=256):
+        self.db_file = db_file
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.cached_statements = cached_statements
+
+        # Idle connections, most recently used first so hot connections keep a warm cache
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # Metrics
+        self._created = 0
+        self._in_use = 0
+        self._acquire_count = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._hold_time_total = 0.0
+        self._hold_time_max = 0.0
+
+    def _connect(self):
+        """Open and tune a new connection"""
+        directory = os.path.dirname(self.db_file)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        # The pool hands each connection to one thread at a time, so cross-thread use is safe.
+        # cached_statements controls sqlite3's prepared statement cache per connection.
+        conn = sqlite3.connect(
+            self.db_file,
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def acquire(self):
+        """Take a connection from the pool, opening one if the pool is not full"""
+        start = time.perf_counter()
+        conn = None
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Connection pool is closed")
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                if self._created < self.max_size:
+                    self._created += 1
+                    create = True
+                else:
+                    create = False
+
+        if conn is None:
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                # Pool exhausted, wait for another thread to release a connection
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise TimeoutError(
+                        f"Timed out after {self.timeout}s waiting for a database connection "
+                        f"(pool size {self.max_size})"
+                    )
+
+        waited = time.perf_counter() - start
+        with self._lock:
+            self._in_use += 1
+            self._acquire_count += 1
+            self._wait_time_total += waited
+            self._wait_time_max = max(self._wait_time_max, waited)
+        DB_WAIT_SECONDS.observe(waited)
+
+        return conn
+
+    def release(self, conn, held=0.0):
+        """Return a connection to the pool"""
+        # Never hand out a connection with an open transaction
+        if conn.in_transaction:
+            conn.rollback()
+
+        with self._lock:
+            self._in_use -= 1
+            self._hold_time_total += held
+            self._hold_time_max = max(self._hold_time_max, held)
+            closed = self._closed
+            if closed:
+                self._created -= 1
+        DB_HOLD_SECONDS.observe(held)
+
+        if closed:
+            conn.close()
+        else:
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Context manager yielding a pooled connection"""
+        conn = self.acquire()
+        start = time.perf_counter()
+        try:
+            yield conn
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self.release(conn, time.perf_counter() - start)
+
+    def close(self):
+        """Close all idle connections; in-use connections are closed when released"""
+        with self._lock:
+            self._closed = True
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                conn.close()
+                self._created -= 1
+
+    def stats(self):
+        """Get pool size and latency metrics"""
+        with self._lock:
+            acquires = self._acquire_count
+            return {
+                'db_file': self.db_file,
+                'max_size': self.max_size,
+                'open_connections': self._created,
+                'in_use': self._in_use,
+                'idle': self._created - self._in_use,
+                'acquire_count': acquires,
+                'wait_time_avg_ms': (self._wait_time_total / acquires * 1000) if acquires else 0.0,
+                'wait_time_max_ms': self._wait_time_max * 1000,
+                'hold_time_avg_ms': (self._hold_time_total / acquires * 1000) if acquires else 0.0,
+                'hold_time_max_ms': self._hold_time_max * 1000,
+            }
+
+
+# Process-wide pool, created lazily on first use
+_pool = None
+_pool_lock = threading.Lock()
+_pool_settings = {'max_size': 8, 'timeout': 10.0}
+
+
+def configure_pool(db_file=None, max_size=None, timeout=None):
+    """Configure the connection pool; any existing pool is closed and recreated on next use"""
+    global DB_FILE
+    if db_file:
+        DB_FILE = db_file
+    if max_size:
+        _pool_settings['max_size'] = max_size
+    if timeout:
+        _pool_settings['timeout'] = timeout
+    close_pool()
+
+
+def get_pool():
+    """Get the process-wide connection pool"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_FILE, **_pool_settings)
+    return _pool
+
+
+def close_pool():
+    """Close the process-wide connection pool"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def get_pool_stats():
+    """Get metrics for the process-wide connection pool"""
+    return get_pool().stats()
+
+
+@contextmanager
+def db_connection():
+    """Borrow a pooled connection for the duration of a with-block"""
+    with get_pool().connection() as conn:
+        yield conn
+
+
 def get_db_connection():
-    """Get a connection to the SQLite database"""
+    """Get a standalone connection to the SQLite database (caller must close it)"""
     # Make sure the directory exists
-    if not os.path.exists('instance'):
-        os.makedirs('instance')
-    
+    directory = os.path.dirname(DB_FILE)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
     # Connect to the database and set row factory to get dict-like results
     conn = sqlite3.connect(DB_FILE)
     conn.row_factory = sqlite3.Row
@@ -23,26 +255,37 @@ def get_db_connection():
 def init_db(recreate=False):
     """Initialize the database and create tables"""
     try:
+        # Pooled connections and cached rows must not outlive a deleted database file
+        close_pool()
+        latest_readings.clear()
+        hot_readings.clear()
+        series_versions.clear()
+
         # Make sure the instance directory exists
-        if not os.path.exists('instance'):
-            os.makedirs('instance')
-        
+        directory = os.path.dirname(DB_FILE)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
         # If recreate is True, delete the existing database file
         if recreate and os.path.exists(DB_FILE):
-            os.remove(DB_FILE)
-            print(f"Deleted old database file {DB_FILE}")
-        
-        # Get a connection to the database
-        conn = get_db_connection()
-        
-        # Create tables using model methods
-        Patient.create_table(conn)
-        GlucoseReading.create_table(conn)
-        
-        conn.close()
-        
-        print("Database tables initialized successfully")
+            # WAL mode keeps side files next to the database
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(DB_FILE + suffix):
+                    os.remove(DB_FILE + suffix)
+            log.info('database_deleted', db_file=DB_FILE)
+
+        # Create tables using model methods, bringing older database files up to date first
+        with db_connection() as conn:
+            Patient.create_table(conn)
+            for name, result in run_migrations(conn).items():
+                log.info('database_migrated', migration=name, **result)
+            GlucoseReading.create_table(conn)
+            GlucoseRollup.create_table(conn)
+            DataVersion.create_table(conn)
+            cache_version.reset(DataVersion.get(conn))
+
+        log.info('database_initialized', db_file=DB_FILE)
         return True
-    except Exception as e:
-        print(f"Error initializing database: {e}")
-        return False 
\ No newline at end of file
+    except Exception:
+        log.exception('database_init_failed', db_file=DB_FILE)
+        return False
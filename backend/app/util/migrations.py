@@ -0,0 +1,87 @@
+"""
+Schema migrations for existing database files
+
+init_db applies these automatically on startup. They can also be run against
+any database file with the `migrate-db` CLI command.
+"""
+import time
+from ..models.glucose_reading import GlucoseReading
+from ..models.glucose_rollup import GlucoseRollup
+from ..models.data_version import DataVersion
+
+# SQLite expression turning a stored timestamp string into epoch ms on the same
+# naive wall clock as models.timestamps; NULL when the string can't be parsed
+_TIMESTAMP_TO_MS = "CAST(ROUND((julianday(timestamp) - 2440587.5) * 86400000.0) AS INTEGER)"
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+
+
+def needs_timestamp_migration(conn):
+    """Check whether glucose_reading still has the old text timestamp column"""
+    columns = _columns(conn, 'glucose_reading')
+    return 'timestamp' in columns and 'ts' not in columns
+
+
+def migrate_timestamps(conn):
+    """Convert glucose_reading from text timestamps to integer epoch ms
+
+    The table is rebuilt in one transaction (ids are kept), the covering index
+    is created on the new table and the rollups, whose buckets change type,
+    are dropped and rebuilt. Rows whose timestamp can't be parsed are skipped.
+    Returns None if the database is already migrated, otherwise counts.
+    """
+    if not needs_timestamp_migration(conn):
+        return None
+
+    start = time.perf_counter()
+    DataVersion.create_table(conn)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Checked again under the write lock in case another process got here first
+        if not needs_timestamp_migration(conn):
+            conn.rollback()
+            return None
+
+        conn.execute("ALTER TABLE glucose_reading RENAME TO glucose_reading_old")
+        conn.execute(GlucoseReading._CREATE_TABLE)
+        cursor = conn.execute(f'''
+            INSERT INTO glucose_reading (id, patient_id, glucose, ts)
+            SELECT id, patient_id, glucose, {_TIMESTAMP_TO_MS}
+            FROM glucose_reading_old
+            WHERE glucose IS NOT NULL AND julianday(timestamp) IS NOT NULL
+            ORDER BY id
+        ''')
+        migrated = cursor.rowcount
+        total = conn.execute("SELECT COUNT(*) FROM glucose_reading_old").fetchone()[0]
+
+        # The old index goes with the old table
+        conn.execute("DROP TABLE glucose_reading_old")
+        conn.execute(GlucoseReading._CREATE_INDEX)
+        conn.execute("DROP TABLE IF EXISTS glucose_rollup")
+        # Running servers drop what they cached from the old table
+        DataVersion.bump(conn.cursor())
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    # Recreated empty, so it is backfilled from the migrated readings
+    GlucoseRollup.create_table(conn)
+
+    return {
+        'migrated': migrated,
+        'skipped': total - migrated,
+        'seconds': round(time.perf_counter() - start, 3)
+    }
+
+
+def run_migrations(conn):
+    """Apply every pending migration; returns {name: result} for the ones that ran"""
+    results = {}
+    result = migrate_timestamps(conn)
+    if result is not None:
+        results['timestamps'] = result
+    return results
+
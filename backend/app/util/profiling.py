@@ -0,0 +1,216 @@
+"""
+Request profiling - Opt-in per-request profiles saved for later inspection
+
+When PROFILING_ENABLED is set, create_app wraps the WSGI app in
+RequestProfiler. A request carrying an `X-Profile` header or a `profile`
+query argument is then run under a profiler:
+
+- `cprofile` (or `1`): deterministic cProfile, saved as `<id>.prof` for
+  pstats / snakeviz
+- `sample`: the request thread's stack is sampled every
+  PROFILE_SAMPLE_INTERVAL seconds, saved as `<id>.folded` collapsed stacks
+  for flamegraph.pl / speedscope; it adds little overhead but samples are
+  only taken when the GIL switches threads (every 5 ms by default), so it
+  suits requests slower than that
+
+Each profile gets a `<id>.json` sidecar (method, path, status, duration) and
+the response carries its id in `X-Profile-Id`. Only the newest PROFILE_KEEP
+profiles are kept. Without PROFILING_ENABLED the middleware is not installed
+at all, so requests pay nothing.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from urllib.parse import parse_qs
+from ..log import get_logger
+
+log = get_logger(__name__)
+
+MODES = ('cprofile', 'sample')
+
+_UNSAFE = re.compile(r'[^A-Za-z0-9_.-]+')
+
+
+def _requested_mode(environ):
+    """Profiling mode asked for by the request, or None"""
+    value = environ.get('HTTP_X_PROFILE')
+    if value is None:
+        query = environ.get('QUERY_STRING', '')
+        if 'profile' not in query:
+            return None
+        values = parse_qs(query, keep_blank_values=True).get('profile')
+        if not values:
+            return None
+        value = values[0]
+    value = value.strip().lower()
+    if value in ('0', 'false', 'no', 'off'):
+        return None
+    return value if value in MODES else 'cprofile'
+
+
+class StackSampler:
+    """Samples one thread's Python stack on a background thread and counts collapsed stacks"""
+
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def write(self, path):
+        """Write the counted stacks as `frame;frame;... count` lines"""
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class RequestProfiler:
+    """WSGI middleware profiling the requests that ask for it"""
+
+    def __init__(self, wsgi_app, directory, keep=50, sample_interval=0.001):
+        self.wsgi_app = wsgi_app
+        self.directory = directory
+        self.keep = keep
+        self.sample_interval = sample_interval
+        self._lock = threading.Lock()
+        self._sequence = 0
+
+    def __call__(self, environ, start_response):
+        mode = _requested_mode(environ)
+        if mode is None:
+            return self.wsgi_app(environ, start_response)
+        return self._profile(mode, environ, start_response)
+
+    def _new_id(self, environ):
+        with self._lock:
+            self._sequence = (self._sequence + 1) % 1000
+            sequence = self._sequence
+        path = _UNSAFE.sub('_', environ.get('PATH_INFO', '').strip('/'))[:60] or 'root'
+        return f"{datetime.now():%Y%m%d-%H%M%S}-{sequence:03d}-{environ.get('REQUEST_METHOD', 'GET')}-{path}"
+
+    def _profile(self, mode, environ, start_response):
+        profile_id = self._new_id(environ)
+        status = []
+
+        def profiled_start_response(response_status, headers, exc_info=None):
+            status.append(response_status)
+            return start_response(response_status, headers + [('X-Profile-Id', profile_id)], exc_info)
+
+        if mode == 'sample':
+            profiler = StackSampler(threading.get_ident(), self.sample_interval)
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            # The body is produced inside the profile too, then replayed
+            result = self.wsgi_app(environ, profiled_start_response)
+            try:
+                body = list(result)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+        finally:
+            duration = time.perf_counter() - start
+            if mode == 'sample':
+                profiler.stop()
+            else:
+                profiler.disable()
+            try:
+                self._save(profile_id, mode, profiler, environ, status[0] if status else None, duration)
+            except Exception:
+                log.exception('profile_save_failed', profile_id=profile_id)
+        return body
+
+    def _save(self, profile_id, mode, profiler, environ, status, duration):
+        os.makedirs(self.directory, exist_ok=True)
+        if mode == 'sample':
+            filename = f"{profile_id}.folded"
+            profiler.write(os.path.join(self.directory, filename))
+        else:
+            filename = f"{profile_id}.prof"
+            profiler.dump_stats(os.path.join(self.directory, filename))
+
+        meta = {
+            'id': profile_id,
+            'file': filename,
+            'mode': mode,
+            'method': environ.get('REQUEST_METHOD'),
+            'path': environ.get('PATH_INFO'),
+            'query': environ.get('QUERY_STRING', ''),
+            'status': int(status.split()[0]) if status else None,
+            'duration_ms': round(duration * 1000, 2),
+            'created': datetime.now().isoformat(timespec='milliseconds')
+        }
+        if mode == 'sample':
+            meta['samples'] = profiler.samples
+        with open(os.path.join(self.directory, f"{profile_id}.json"), 'w') as f:
+            json.dump(meta, f)
+        log.info('request_profiled', profile_id=profile_id, mode=mode, path=meta['path'],
+                 duration_ms=meta['duration_ms'])
+        self._prune()
+
+    def _prune(self):
+        """Delete all but the newest `keep` profiles"""
+        for meta in list_profiles(self.directory)[self.keep:]:
+            for filename in (meta['file'], f"{meta['id']}.json"):
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except OSError:
+                    pass
+
+
+def list_profiles(directory, limit=None):
+    """Metadata of the saved profiles, newest first"""
+    try:
+        names = [name for name in os.listdir(directory) if name.endswith('.json')]
+    except FileNotFoundError:
+        return []
+    profiles = []
+    # Ids start with the creation time, so names sort oldest to newest
+    for name in sorted(names, reverse=True)[:limit]:
+        try:
+            with open(os.path.join(directory, name)) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def profile_summary(path, sort='cumulative', limit=40):
+    """Text report of a saved cProfile file, top `limit` functions by `sort`"""
+    out = io.StringIO()
+    stats = pstats.Stats(path, stream=out)
+    stats.sort_stats(sort).print_stats(limit)
+    return out.getvalue()
@@ -0,0 +1,50 @@
+"""
+Startup timing - Measures how long each phase of application start takes
+"""
+import time
+from contextlib import contextmanager
+from ..log import get_logger
+
+log = get_logger(__name__)
+
+class StartupTimer:
+    """Records named startup phases (imports, DB init, CSV load, ...) in order"""
+
+    def __init__(self, budget=None):
+        self.budget = budget
+        self.phases = []
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        """Time the enclosed block as one phase"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def total(self):
+        """Seconds since the timer was created"""
+        return time.perf_counter() - self._start
+
+    def report(self):
+        """Get phase durations in milliseconds plus the total and budget check"""
+        total = self.total()
+        return {
+            'phases_ms': {name: round(seconds * 1000, 1) for name, seconds in self.phases},
+            'total_ms': round(total * 1000, 1),
+            'budget_ms': round(self.budget * 1000, 1) if self.budget else None,
+            'within_budget': total <= self.budget if self.budget else None
+        }
+
+    def log_report(self):
+        """Log the total with the phases slowest first, as a warning if over budget"""
+        report = self.report()
+        phases = dict(sorted(report['phases_ms'].items(), key=lambda item: -item[1]))
+        if report['within_budget'] is False:
+            log.warning('startup_over_budget', total_ms=report['total_ms'],
+                        budget_ms=report['budget_ms'], phases_ms=phases)
+        else:
+            log.info('startup_finished', total_ms=report['total_ms'], phases_ms=phases)
+        return report
@@ -0,0 +1,87 @@
+"""
+Benchmark - Per-row vs bulk insertion of glucose readings
+
+Run from the project root:
+    python -m backend.benchmarks.bench_bulk_insert --patients 1 100 10000
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from ..app.models.glucose_reading import GlucoseReading
+from ..app.models.timestamps import now_ms, MS_PER_HOUR, MS_PER_MINUTE
+from ..app.util import db
+
+POINTS_PER_PATIENT = 288  # 24 hours at 5-minute intervals
+
+
+def make_readings(patient_count, points=POINTS_PER_PATIENT):
+    """Build a day of synthetic readings for each patient"""
+    start = now_ms() - 24 * MS_PER_HOUR
+    timestamps = [start + 5 * MS_PER_MINUTE * i for i in range(points)]
+    readings = []
+    for p in range(patient_count):
+        patient_id = f"bench#{p:06d}"
+        for ts in timestamps:
+            readings.append({
+                'patient_id': patient_id,
+                'glucose': round(random.uniform(70, 180), 1),
+                'ts': ts
+            })
+    return readings
+
+
+def insert_per_row(readings):
+    """Baseline: GlucoseReading.create, one commit per row"""
+    with db.db_connection() as conn:
+        for reading in readings:
+            GlucoseReading.create(conn, reading)
+
+
+def insert_bulk(readings):
+    """GlucoseReading.bulk_create, one transaction"""
+    with db.db_connection() as conn:
+        GlucoseReading.bulk_create(conn, readings)
+
+
+def timed(func, readings):
+    """Run func against a fresh database and return rows/sec"""
+    db.init_db(recreate=True)
+    start = time.perf_counter()
+    func(readings)
+    elapsed = time.perf_counter() - start
+    return len(readings) / elapsed if elapsed else float('inf'), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--patients', type=int, nargs='+', default=[1, 100, 10000],
+                        help='Cohort sizes to benchmark')
+    parser.add_argument('--per-row-max-rows', type=int, default=20000,
+                        help='Cap on rows for the per-row baseline (its rate is flat, so it is sampled)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='glucose_bench_')
+    db.configure_pool(db_file=os.path.join(workdir, 'bench.db'))
+
+    try:
+        print(f"{'patients':>9} {'rows':>10} {'per-row rows/s':>16} {'bulk rows/s':>14} {'speedup':>8}")
+        for patient_count in args.patients:
+            readings = make_readings(patient_count)
+            sample = readings[:args.per_row_max_rows]
+
+            per_row_rate, _ = timed(insert_per_row, sample)
+            bulk_rate, _ = timed(insert_bulk, readings)
+
+            print(f"{patient_count:>9} {len(readings):>10} {per_row_rate:>16,.0f} "
+                  f"{bulk_rate:>14,.0f} {bulk_rate / per_row_rate:>7.1f}x")
+    finally:
+        db.close_pool()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark - One POST /glucose/batch against N single GET /glucose requests
+
+Both fetch the same patients and range through the Flask test client. Run
+from the project root, e.g.:
+    python -m backend.benchmarks.bench_glucose_batch --patients 10 50 200
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from ..app import create_app
+from ..app.models.glucose_reading import GlucoseReading
+from ..app.models.timestamps import now_ms, MS_PER_MINUTE
+from ..app.util import db
+
+
+def make_histories(patient_ids, days):
+    """Readings every 5 minutes for `days` days for every patient, ending now"""
+    end = now_ms()
+    points = days * 288
+    return [
+        {
+            'patient_id': patient_id,
+            'glucose': round(random.uniform(70, 180), 1),
+            'ts': end - 5 * MS_PER_MINUTE * (points - 1 - i)
+        }
+        for patient_id in patient_ids
+        for i in range(points)
+    ]
+
+
+def timed(fn, rounds):
+    """Run fn `rounds` times and return the latencies in ms"""
+    latencies = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--patients', type=int, nargs='+', default=[10, 50, 200], help='Patients per batch')
+    parser.add_argument('--days', type=int, default=1, help='Days of 5-minute readings per patient')
+    parser.add_argument('--hours', type=int, default=24, help='Range requested (24+ returns every reading)')
+    parser.add_argument('--rounds', type=int, default=20, help='Timed rounds per batch size')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='glucose_bench_')
+    # The app logs to stdout; keep it off the terminal while measuring
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    results = []
+    try:
+        app = create_app({
+            'TESTING': True,
+            'DB_FILE': os.path.join(workdir, 'bench.db'),
+            'LOG_LEVEL': 'WARNING',
+            'HOT_TIER_HOURS': 0
+        })
+        all_ids = [f"bench#{i:06d}" for i in range(max(args.patients))]
+        with db.db_connection() as conn:
+            GlucoseReading.bulk_create(conn, make_histories(all_ids, args.days))
+
+        client = app.test_client()
+
+        def fetch_single(patient_ids):
+            for patient_id in patient_ids:
+                response = client.get(f"/glucose/{patient_id.replace('#', '%23')}?hours={args.hours}")
+                if response.status_code != 200:
+                    raise RuntimeError(f"/glucose/{patient_id} returned {response.status_code}")
+
+        def fetch_batch(patient_ids):
+            response = client.post('/glucose/batch', json={'patient_ids': patient_ids, 'hours': args.hours})
+            if response.status_code != 200:
+                raise RuntimeError(f"/glucose/batch returned {response.status_code}")
+
+        for count in args.patients:
+            patient_ids = all_ids[:count]
+            fetch_single(patient_ids)
+            fetch_batch(patient_ids)
+            single = timed(lambda: fetch_single(patient_ids), args.rounds)
+            batch = timed(lambda: fetch_batch(patient_ids), args.rounds)
+            results.append((count, single, batch))
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+        db.close_pool()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{args.days} day(s) of readings per patient, hours={args.hours}, {args.rounds} rounds")
+    print(f"{'patients':>8} {'single ms':>10} {'batch ms':>9} {'speedup':>8}")
+    for count, single, batch in results:
+        single_ms, batch_ms = statistics.median(single), statistics.median(batch)
+        print(f"{count:>8} {single_ms:>10.1f} {batch_ms:>9.1f} {single_ms / batch_ms:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark - Latency of GET /glucose through the Flask test client
+
+Run from the project root, e.g. to compare diagnostics off and on:
+    python -m backend.benchmarks.bench_glucose_query --log-level INFO
+    python -m backend.benchmarks.bench_glucose_query --log-level DEBUG
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from ..app import create_app
+from ..app.models.glucose_reading import GlucoseReading
+from ..app.models.timestamps import now_ms, MS_PER_MINUTE
+from ..app.util import db
+
+PATIENT_ID = 'bench#000000'
+
+
+def make_history(days):
+    """Readings every 5 minutes for `days` days, ending now"""
+    end = now_ms()
+    points = days * 288
+    return [
+        {
+            'patient_id': PATIENT_ID,
+            'glucose': round(random.uniform(70, 180), 1),
+            'ts': end - 5 * MS_PER_MINUTE * (points - 1 - i)
+        }
+        for i in range(points)
+    ]
+
+
+def measure(client, url, requests):
+    """Issue `requests` GETs and return the latencies in ms"""
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get(url)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f"{url} returned {response.status_code}")
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--log-level', default='INFO', help='LOG_LEVEL for the app (DEBUG enables diagnostics)')
+    parser.add_argument('--days', type=int, default=7, help='Days of 5-minute readings for the queried patient')
+    parser.add_argument('--hours', type=int, nargs='+', default=[1, 3, 24], help='Query ranges to benchmark')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per range')
+    parser.add_argument('--hot-tier-hours', type=float, default=3, help='HOT_TIER_HOURS (0 to always query SQLite)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='glucose_bench_')
+    # The app logs to stdout; keep it (and any leftover prints) off the terminal while measuring
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        app = create_app({
+            'TESTING': True,
+            'DB_FILE': os.path.join(workdir, 'bench.db'),
+            'LOG_LEVEL': args.log_level,
+            'HOT_TIER_HOURS': args.hot_tier_hours
+        })
+        with db.db_connection() as conn:
+            GlucoseReading.bulk_create(conn, make_history(args.days))
+
+        client = app.test_client()
+        url_id = PATIENT_ID.replace('#', '%23')
+        results = []
+        for hours in args.hours:
+            url = f"/glucose/{url_id}?hours={hours}"
+            measure(client, url, 10)  # warm up caches and the hot tier
+            latencies = sorted(measure(client, url, args.requests))
+            points = len(client.get(url).get_json())
+            results.append((hours, points, latencies))
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+        db.close_pool()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"LOG_LEVEL={args.log_level}, {args.requests} requests per range")
+    print(f"{'hours':>6} {'points':>7} {'mean ms':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for hours, points, latencies in results:
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        print(f"{hours:>6} {points:>7} {statistics.fmean(latencies):>9.2f} "
+              f"{statistics.median(latencies):>8.2f} {p95:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,489 @@
+"""
+Load harness - End-to-end throughput and latency of data flows, REST routes and WebSocket fan-out
+
+Creates `--flows` patients and starts a data flow for each, connects
+`--clients` Socket.IO clients that each subscribe to one of them, and keeps
+`--http-workers` threads requesting /glucose and /patient routes for
+`--duration` seconds. Reports throughput and p50/p95/p99 latency of the HTTP
+requests and of reading delivery (from the 'published_at' of each update to
+its arrival at a client).
+
+The app either runs in this process behind the Flask and Socket.IO test
+clients (`--mode inprocess`, the default) or as a real server on a local port
+(`--mode subprocess`, whose clients need `pip install "python-socketio[client]"`).
+Results can be saved and compared against an earlier run; --compare exits
+with status 1 when a metric regressed by more than --tolerance. Run from the
+project root, e.g.:
+    python -m backend.benchmarks.load_harness --flows 20 --clients 100 --output base.json
+    python -m backend.benchmarks.load_harness --flows 20 --clients 100 --compare base.json
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from urllib.parse import quote
+
+# Requested by the HTTP workers, '{pid}' is a flowing patient
+ROUTES = [
+    ('glucose_3h', '/glucose/{pid}?hours=3'),
+    ('glucose_24h', '/glucose/{pid}?hours=24&max_points=500'),
+    ('patient', '/patient/{pid}')
+]
+
+# Metrics compared by --compare, with whether a higher value is better
+COMPARED = [
+    ('http.throughput', True),
+    ('http.latency_ms.p50', False),
+    ('http.latency_ms.p95', False),
+    ('http.latency_ms.p99', False),
+    ('delivery.throughput', True),
+    ('delivery.latency_ms.p50', False),
+    ('delivery.latency_ms.p95', False),
+    ('delivery.latency_ms.p99', False)
+]
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    rank = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(latencies):
+    """Count, mean, p50/p95/p99 and max of latencies in ms"""
+    ordered = sorted(latencies)
+    if not ordered:
+        return {'count': 0}
+    return {
+        'count': len(ordered),
+        'mean': round(sum(ordered) / len(ordered), 2),
+        'p50': round(percentile(ordered, 50), 2),
+        'p95': round(percentile(ordered, 95), 2),
+        'p99': round(percentile(ordered, 99), 2),
+        'max': round(ordered[-1], 2)
+    }
+
+
+class DeliveryRecorder:
+    """Collects delivery latencies of the glucose updates clients receive while recording"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.recording = False
+        self.events = 0
+        self.updates = 0
+        self.readings = 0
+        self.latencies = []
+
+    def record(self, event, payload, received_at):
+        """Note one received event; received_at is epoch ms"""
+        if not self.recording or not isinstance(payload, dict):
+            return
+        if event == 'glucose_batch':
+            updates = payload.get('updates', [])
+        elif event == 'glucose_update':
+            updates = [payload]
+        else:
+            return
+        # The latest reading sent on subscribe has no publish time and is skipped
+        timed = [update for update in updates if update.get('published_at') is not None]
+        if not timed:
+            return
+        with self._lock:
+            self.events += 1
+            for update in timed:
+                self.updates += 1
+                self.readings += len(update.get('data', []))
+                self.latencies.append(received_at - update['published_at'])
+
+
+class _RecordingQueue(list):
+    """Stand-in for a Socket.IO test client's queue that records events as they are sent"""
+
+    def __init__(self, recorder):
+        super().__init__()
+        self._recorder = recorder
+
+    def append(self, packet):
+        args = packet.get('args') or [None]
+        self._recorder.record(packet.get('name'), args[0], time.time() * 1000)
+
+
+class _TestClientSession:
+    """HTTP requests through a Flask test client"""
+
+    def __init__(self, app):
+        self._client = app.test_client()
+
+    def request(self, method, path, body=None):
+        response = self._client.open(path, method=method, json=body)
+        return response.status_code, response.get_data()
+
+    def close(self):
+        pass
+
+
+class _HTTPSession:
+    """HTTP requests over one keep-alive connection to a local server"""
+
+    def __init__(self, port):
+        self._conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+
+    def request(self, method, path, body=None):
+        headers = {}
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        try:
+            self._conn.request(method, path, body, headers)
+            response = self._conn.getresponse()
+            return response.status, response.read()
+        except (http.client.HTTPException, OSError):
+            # Reconnects on the next request
+            self._conn.close()
+            raise
+
+    def close(self):
+        self._conn.close()
+
+
+class InProcessTarget:
+    """The app in this process; clients are Socket.IO test clients"""
+
+    def __init__(self, workdir, config):
+        from ..app import create_app, socketio
+
+        self._socketio = socketio
+        self.app = create_app(dict(config, DB_FILE=os.path.join(workdir, 'load.db')))
+
+    def session(self):
+        return _TestClientSession(self.app)
+
+    def connect(self, patient_id, recorder):
+        client = self._socketio.test_client(self.app)
+        # Events are recorded when the server sends them rather than collected
+        # with get_received(), which is not safe against concurrent emits
+        client.queue = _RecordingQueue(recorder)
+        client.emit('subscribe', patient_id)
+        return client.disconnect
+
+    def close(self):
+        from ..app.util import db
+
+        db.close_pool()
+
+
+def _socketio_client_class():
+    """socketio.Client, exiting with a hint when its transports are not installed"""
+    try:
+        import socketio
+        import requests, websocket  # noqa: F401 (the client's polling and WebSocket transports)
+    except ImportError:
+        raise SystemExit('Socket.IO clients in --mode subprocess need: pip install "python-socketio[client]"')
+    return socketio.Client
+
+
+class SubprocessTarget:
+    """The app served by socketio.run in a child process on a free local port"""
+
+    def __init__(self, workdir, config, startup_timeout=60):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            self.port = probe.getsockname()[1]
+        config = dict(config, DB_FILE=os.path.join(workdir, 'load.db'))
+        project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self._process = subprocess.Popen(
+            [sys.executable, '-m', 'backend.benchmarks.load_harness', '--serve', str(self.port), json.dumps(config)],
+            cwd=project_root,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+
+        deadline = time.monotonic() + startup_timeout
+        while True:
+            if self._process.poll() is not None:
+                raise RuntimeError(f"server exited during startup with status {self._process.returncode}")
+            try:
+                status, _ = _HTTPSession(self.port).request('GET', '/patient_types')
+                if status == 200:
+                    break
+            except OSError:
+                pass
+            if time.monotonic() > deadline:
+                self.close()
+                raise RuntimeError(f"server did not start within {startup_timeout} s")
+            time.sleep(0.2)
+
+    def session(self):
+        return _HTTPSession(self.port)
+
+    def connect(self, patient_id, recorder):
+        client = _socketio_client_class()(reconnection=False)
+        for event in ('glucose_update', 'glucose_batch'):
+            client.on(event, lambda payload, event=event: recorder.record(event, payload, time.time() * 1000))
+        client.connect(f"http://127.0.0.1:{self.port}", wait_timeout=10)
+        client.emit('subscribe', patient_id)
+        return client.disconnect
+
+    def close(self):
+        self._process.terminate()
+        try:
+            self._process.wait(10)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            self._process.wait()
+
+
+def serve(port, config):
+    """Entry point of the --mode subprocess server"""
+    from ..app import create_app, socketio
+
+    app = create_app(config)
+    socketio.run(app, host='127.0.0.1', port=port, debug=False, use_reloader=False,
+                 log_output=False, allow_unsafe_werkzeug=True)
+
+
+def create_patients(session, patient_ids):
+    """Add the load patients and give each a day of history"""
+    for patient_id in patient_ids:
+        status, body = session.request('POST', '/patient/add', {
+            'id': patient_id,
+            'type': 'adult',
+            'age': 40,
+            'weight': 75,
+            'height': 175,
+            'has_diabetes': True
+        })
+        if status != 200 or not json.loads(body).get('success'):
+            raise RuntimeError(f"could not add patient {patient_id}: {status} {body[:200]!r}")
+        status, body = session.request('POST', f"/initialize_patient_data/{quote(patient_id, safe='')}")
+        if status != 200:
+            raise RuntimeError(f"could not initialize {patient_id}: {status} {body[:200]!r}")
+
+
+def http_worker(session, patient_ids, stop_at, results, seed):
+    """Request random routes for random patients until stop_at; appends (route, ms, ok) to results"""
+    rng = random.Random(seed)
+    quoted = [quote(patient_id, safe='') for patient_id in patient_ids]
+    samples = []
+    while time.perf_counter() < stop_at:
+        label, template = rng.choice(ROUTES)
+        path = template.format(pid=rng.choice(quoted))
+        start = time.perf_counter()
+        try:
+            status, _ = session.request('GET', path)
+            ok = status < 400
+        except (http.client.HTTPException, OSError):
+            ok = False
+        samples.append((label, (time.perf_counter() - start) * 1000, ok))
+    session.close()
+    results.extend(samples)
+
+
+def run(args):
+    """Run one load test and return its results"""
+    config = {
+        'LOG_LEVEL': args.log_level,
+        'DB_RECREATE_ON_START': True,
+        'BROADCAST_WINDOW': args.broadcast_window
+    }
+    patient_ids = [f"load#{i:05d}" for i in range(args.flows)]
+    recorder = DeliveryRecorder()
+    samples = []
+    disconnects = []
+
+    workdir = tempfile.mkdtemp(prefix='glucose_load_')
+    # The app logs to stdout; keep it off the terminal while measuring
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    target = None
+    try:
+        target = InProcessTarget(workdir, config) if args.mode == 'inprocess' else SubprocessTarget(workdir, config)
+        control = target.session()
+        create_patients(control, patient_ids)
+
+        for i in range(args.clients):
+            disconnects.append(target.connect(patient_ids[i % len(patient_ids)], recorder))
+
+        for patient_id in patient_ids:
+            path = f"/start_data_flow/{quote(patient_id, safe='')}?interval={args.interval}&jitter={args.jitter}"
+            status, body = control.request('POST', path)
+            if status != 200:
+                raise RuntimeError(f"could not start flow for {patient_id}: {status} {body[:200]!r}")
+
+        time.sleep(args.warmup)
+        recorder.recording = True
+        started = time.perf_counter()
+        stop_at = started + args.duration
+        workers = [
+            threading.Thread(target=http_worker, args=(target.session(), patient_ids, stop_at, samples, seed),
+                             name=f"load-http-{seed}")
+            for seed in range(args.http_workers)
+        ]
+        for worker in workers:
+            worker.start()
+        time.sleep(max(stop_at - time.perf_counter(), 0))
+        recorder.recording = False
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        for patient_id in patient_ids:
+            control.request('POST', f"/stop_data_flow/{quote(patient_id, safe='')}")
+        control.close()
+    finally:
+        for disconnect in disconnects:
+            try:
+                disconnect()
+            except Exception:
+                pass
+        if target is not None:
+            target.close()
+        sys.stdout.close()
+        sys.stdout = stdout
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    routes = {}
+    for label, _ in ROUTES:
+        route_samples = [sample for sample in samples if sample[0] == label]
+        routes[label] = {
+            'requests': len(route_samples),
+            'errors': sum(1 for sample in route_samples if not sample[2]),
+            'latency_ms': summarize([sample[1] for sample in route_samples])
+        }
+    return {
+        'meta': {
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'mode': args.mode,
+            'flows': args.flows,
+            'clients': args.clients,
+            'http_workers': args.http_workers,
+            'duration': round(elapsed, 2),
+            'interval': args.interval,
+            'broadcast_window': args.broadcast_window,
+            'python': platform.python_version(),
+            'platform': platform.platform()
+        },
+        'http': {
+            'requests': len(samples),
+            'errors': sum(1 for sample in samples if not sample[2]),
+            'throughput': round(len(samples) / elapsed, 1),
+            'latency_ms': summarize([sample[1] for sample in samples]),
+            'routes': routes
+        },
+        'delivery': {
+            'events': recorder.events,
+            'updates': recorder.updates,
+            'readings': recorder.readings,
+            'throughput': round(recorder.readings / elapsed, 1),
+            'latency_ms': summarize(recorder.latencies)
+        }
+    }
+
+
+def lookup(results, dotted):
+    """Get a nested value by 'a.b.c', None if missing"""
+    value = results
+    for key in dotted.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def compare(baseline, current, tolerance):
+    """Print the compared metrics side by side; returns the names that regressed beyond tolerance"""
+    regressions = []
+    differing = [key for key in ('mode', 'flows', 'clients', 'http_workers', 'interval', 'broadcast_window')
+                 if baseline.get('meta', {}).get(key) != current['meta'][key]]
+    if differing:
+        print(f"\nNote: the baseline was run with different {', '.join(differing)}")
+    print(f"\n{'metric':<26} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, higher_is_better in COMPARED:
+        before, after = lookup(baseline, name), lookup(current, name)
+        if before is None or after is None:
+            continue
+        change = (after - before) / before if before else 0.0
+        regressed = (-change if higher_is_better else change) > tolerance
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<26} {before:>10.2f} {after:>10.2f} {change:>+7.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def report(results):
+    """Print a run's results"""
+    meta, http_results, delivery = results['meta'], results['http'], results['delivery']
+    print(f"{meta['mode']}: {meta['flows']} flows every {meta['interval']} s, {meta['clients']} clients, "
+          f"{meta['http_workers']} HTTP workers, {meta['duration']} s")
+
+    def latency(summary):
+        if not summary.get('count'):
+            return f"{'-':>8} {'-':>8} {'-':>8}"
+        return f"{summary['p50']:>8.2f} {summary['p95']:>8.2f} {summary['p99']:>8.2f}"
+
+    print(f"{'':<14} {'count':>8} {'errors':>7} {'per s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for label, route in http_results['routes'].items():
+        print(f"{label:<14} {route['requests']:>8} {route['errors']:>7} {'':>9} {latency(route['latency_ms'])}")
+    print(f"{'http':<14} {http_results['requests']:>8} {http_results['errors']:>7} "
+          f"{http_results['throughput']:>9.1f} {latency(http_results['latency_ms'])}")
+    print(f"{'delivery':<14} {delivery['readings']:>8} {'':>7} "
+          f"{delivery['throughput']:>9.1f} {latency(delivery['latency_ms'])}")
+    print(f"delivery counts readings received by clients, latency is per update ({delivery['updates']} in "
+          f"{delivery['events']} events)")
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == '--serve':
+        serve(int(sys.argv[2]), json.loads(sys.argv[3]))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['inprocess', 'subprocess'], default='inprocess', help='Where the app runs')
+    parser.add_argument('--flows', type=int, default=20, help='Patients with a running data flow')
+    parser.add_argument('--clients', type=int, default=50, help='Socket.IO clients, spread over the flowing patients')
+    parser.add_argument('--http-workers', type=int, default=4, help='Threads issuing HTTP requests')
+    parser.add_argument('--duration', type=float, default=20, help='Measured seconds')
+    parser.add_argument('--warmup', type=float, default=2, help='Seconds the flows run before measuring')
+    parser.add_argument('--interval', type=float, default=1.0, help='Data flow interval in seconds')
+    parser.add_argument('--jitter', type=float, default=0.1, help='Data flow jitter in seconds')
+    parser.add_argument('--broadcast-window', type=float, default=0.15, help='BROADCAST_WINDOW (0 emits every reading)')
+    parser.add_argument('--log-level', default='WARNING', help='LOG_LEVEL for the app')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--compare', help='Baseline results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='Relative change counted as a regression')
+    args = parser.parse_args()
+    if args.flows < 1:
+        parser.error('--flows must be at least 1')
+
+    results = run(args)
+    report(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -12,9 +12,61 @@ class Config:
     
     # Database settings
     DB_FILE = 'instance/glucose.db'
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 8))  # Max pooled SQLite connections
+    DB_POOL_TIMEOUT = 10.0  # Seconds to wait for a free connection
+    DB_RECREATE_ON_START = os.getenv('DB_RECREATE_ON_START', '0') == '1'  # Wipe the database on startup
+    
+    # Logging: level (DEBUG enables per-query diagnostics), 'text' or 'json' lines,
+    # and whether high-volume events are sampled
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+    LOG_SAMPLING = os.getenv('LOG_SAMPLING', '1') == '1'
+    
+    # Cold start budget in seconds; create_app warns when startup takes longer
+    STARTUP_BUDGET_SECONDS = float(os.getenv('STARTUP_BUDGET_SECONDS', 2.0))
+    
+    # Hot tier: hours of recent readings kept in memory per patient (0 disables),
+    # readings per patient ring buffer and number of patients held
+    HOT_TIER_HOURS = float(os.getenv('HOT_TIER_HOURS', 3))
+    HOT_TIER_CAPACITY = 4096
+    HOT_TIER_MAX_PATIENTS = 10000
+    
+    # Glucose series responses smaller than this many bytes are not compressed
+    COMPRESS_MIN_BYTES = 1024
+    
+    # Incremental glucose fetches (?since= / ?since_id=): default and maximum readings per page
+    GLUCOSE_PAGE_SIZE = 1000
+    GLUCOSE_MAX_PAGE_SIZE = 10000
+    GLUCOSE_BATCH_MAX_PATIENTS = 1000  # Patient ids accepted by one /glucose/batch request
+    
+    # Write-behind ingestion for /mock_update: readings held before answering 429,
+    # rows per group commit and seconds the oldest queued reading may wait
+    INGEST_MAX_DEPTH = int(os.getenv('INGEST_MAX_DEPTH', 10000))
+    INGEST_BATCH_SIZE = 500
+    INGEST_MAX_DELAY = 0.05
+    INGEST_WAIT_TIMEOUT = 10  # Seconds /mock_update?wait=1 waits for its commit before answering 503
+    INGEST_STREAM_BATCH_SIZE = 5000  # Lines per transaction for streamed /ingest uploads
+    COHORT_MAX_DAYS = 7  # History days /initialize_cohort generates in-process; init-cohort has no limit
+    
+    # Data flow settings: seconds between readings and +/- random jitter per tick
+    DATA_FLOW_INTERVAL = 5.0
+    DATA_FLOW_JITTER = 0.0
+    DATA_FLOW_IDLE_INTERVAL = None  # Interval for flows without subscribers, None disables throttling
+    
+    # WebSocket batching: seconds to coalesce glucose updates (0 disables) and max points per batch
+    BROADCAST_WINDOW = 0.15
+    BROADCAST_MAX_BATCH = 500
+    
+    # Opt-in request profiling: requests with an X-Profile header or ?profile= run under
+    # cProfile (or a stack sampler for 'sample'); profiles go to PROFILE_DIR, newest PROFILE_KEEP kept
+    PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', '0') == '1'
+    PROFILE_DIR = 'instance/profiles'
+    PROFILE_KEEP = 50
+    PROFILE_SAMPLE_INTERVAL = 0.001  # Seconds between stack samples
     
     # Patient data CSV file base path
     PATIENT_CSV_BASE = 'patient.csv'
+    PATIENT_CSV_PERSIST = False  # Also write predefined patients to the patient table
     
     @staticmethod
     def get_patient_csv_path():
@@ -31,7 +83,6 @@ class Config:
         
         for path in possible_paths:
             if os.path.exists(path):
-                print(f"Using patient CSV at: {path}")
                 return path
         
         # Default to the data directory if none found
@@ -0,0 +1,23 @@
+"""
+Shared fixtures: one app on a throwaway database for the whole session
+"""
+import pytest
+
+from backend.app import create_app
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    # The pool, caches and queues are process-wide, so the app is built once
+    db_file = tmp_path_factory.mktemp('db') / 'glucose.db'
+    return create_app({
+        'TESTING': True,
+        'DB_FILE': str(db_file),
+        'DB_RECREATE_ON_START': True,
+        'LOG_LEVEL': 'WARNING'
+    })
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
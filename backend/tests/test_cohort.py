@@ -0,0 +1,33 @@
+"""
+Tests for /initialize_cohort
+"""
+from backend.app.services import cohort_service
+from backend.app.services.cohort_service import CohortService
+
+
+def test_endpoint_generates_on_threads(client, monkeypatch):
+    """Request handlers must not fork; the cohort is generated on a thread pool instead"""
+    def no_processes(*args, **kwargs):
+        raise AssertionError('process pool started from a request')
+
+    monkeypatch.setattr(cohort_service, 'ProcessPoolExecutor', no_processes)
+    monkeypatch.setattr(CohortService, 'CHUNK_SIZE', 4)
+
+    response = client.post('/initialize_cohort', json={'days': 1, 'workers': 3, 'seed': 1})
+
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result['workers'] == 3
+    assert result['data_points'] == result['patients'] * 288
+
+
+def test_endpoint_caps_days(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'COHORT_MAX_DAYS', 2)
+
+    assert client.post('/initialize_cohort', json={'days': 3}).status_code == 400
+
+
+def test_endpoint_rejects_bad_arguments(client):
+    assert client.post('/initialize_cohort', json={'days': 'many'}).status_code == 400
+    assert client.post('/initialize_cohort', json={'days': 0}).status_code == 400
+    assert client.post('/initialize_cohort', json={'workers': 0}).status_code == 400
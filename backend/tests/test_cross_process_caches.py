@@ -0,0 +1,60 @@
+"""
+Tests that writes from other processes sharing the database aren't hidden by process-local caches
+"""
+import json
+import subprocess
+import sys
+import textwrap
+from urllib.parse import quote
+
+from backend.app.models.timestamps import now_ms
+from backend.app.services.glucose_service import GlucoseService
+
+
+def _write_from_another_process(db_file, readings):
+    """Insert readings the way the CLI or another server worker would"""
+    script = textwrap.dedent(f"""
+        import json
+        from backend.app.services.glucose_service import GlucoseService
+        from backend.app.util import configure_pool
+        configure_pool({db_file!r})
+        GlucoseService.add_readings(json.loads({json.dumps(readings)!r}), return_ids=True)
+    """)
+    subprocess.run([sys.executable, '-c', script], check=True, timeout=60)
+
+
+def test_hot_tier_sees_other_processes_writes(app, client):
+    patient_id = 'xproc#hot'
+    url = f'/glucose/{quote(patient_id)}'
+    now = now_ms()
+    GlucoseService.add_readings([{'patient_id': patient_id, 'glucose': 100.0, 'ts': now - 60_000}], return_ids=True)
+    assert [r['glucose'] for r in client.get(url, query_string={'hours': 1}).get_json()] == [100.0]
+
+    _write_from_another_process(app.config['DB_FILE'], [{'patient_id': patient_id, 'glucose': 140.0, 'ts': now}])
+
+    assert [r['glucose'] for r in client.get(url, query_string={'hours': 1}).get_json()] == [100.0, 140.0]
+
+
+def test_etag_changes_after_other_processes_writes(app, client):
+    patient_id = 'xproc#etag'
+    url = f'/glucose/{quote(patient_id)}'
+    GlucoseService.add_readings([{'patient_id': patient_id, 'glucose': 100.0, 'ts': now_ms()}], return_ids=True)
+    etag = client.get(url, query_string={'hours': 24}).headers['ETag']
+    assert client.get(url, query_string={'hours': 24}, headers={'If-None-Match': etag}).status_code == 304
+
+    _write_from_another_process(app.config['DB_FILE'], [{'patient_id': patient_id, 'glucose': 140.0}])
+
+    response = client.get(url, query_string={'hours': 24}, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert len(response.get_json()) == 2
+
+
+def test_latest_reading_sees_other_processes_writes(app):
+    patient_id = 'xproc#latest'
+    now = now_ms()
+    GlucoseService.add_readings([{'patient_id': patient_id, 'glucose': 100.0, 'ts': now - 60_000}], return_ids=True)
+    assert GlucoseService.get_latest_reading(patient_id)['glucose'] == 100.0
+
+    _write_from_another_process(app.config['DB_FILE'], [{'patient_id': patient_id, 'glucose': 140.0, 'ts': now}])
+
+    assert GlucoseService.get_latest_reading(patient_id)['glucose'] == 140.0
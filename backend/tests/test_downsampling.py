@@ -0,0 +1,44 @@
+"""
+Tests for server-side downsampling of glucose series
+"""
+import numpy as np
+import pytest
+
+from backend.app.services.downsampling import downsample, lttb_indices, minmax_indices
+
+
+def _series(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.arange(n, dtype=np.float64) * 300_000, rng.uniform(40, 300, n)
+
+
+@pytest.mark.parametrize('n', [3, 4, 5, 10, 288, 1001])
+def test_never_more_than_max_points(n):
+    x, y = _series(n)
+    for max_points in sorted({1, 2, 3, 4, 5, 6, 7, n // 2, n - 1, n, n + 1} - {0}):
+        for indices in (minmax_indices(y, max_points), lttb_indices(x, y, max_points)):
+            assert len(indices) <= max_points
+            assert (np.diff(indices) > 0).all()
+            if 2 <= max_points:
+                assert indices[0] == 0 and indices[-1] == n - 1
+
+
+def test_minmax_with_three_points_keeps_the_worst_excursion():
+    y = np.array([120, 110, 25, 150, 200, 130], dtype=np.float64)
+
+    assert minmax_indices(y, 3).tolist() == [0, 2, 5]
+    assert minmax_indices(y + 100, 3).tolist() == [0, 4, 5]
+
+
+def test_minmax_keeps_every_bucket_extreme():
+    _, y = _series(1000, seed=3)
+    kept = set(minmax_indices(y, 102).tolist())
+    assert int(y[1:-1].argmin()) + 1 in kept
+    assert int(y[1:-1].argmax()) + 1 in kept
+
+
+def test_downsample_returns_three_readings_for_max_points_three():
+    readings = [{'id': i, 'patient_id': 'p', 'glucose': float(g), 'ts': i * 300_000}
+                for i, g in enumerate(_series(50)[1])]
+    for method in ('minmax', 'lttb'):
+        assert len(downsample(readings, 3, method)) == 3
@@ -0,0 +1,41 @@
+"""
+Tests for the heap-based flow scheduler
+"""
+import threading
+import time
+
+from backend.app.services.flow_scheduler import FlowScheduler
+
+
+def test_restarted_key_ticks_once_per_interval():
+    """stop/start cycles must not leave stale heap entries that fire alongside the new one"""
+    ticks = []
+    lock = threading.Lock()
+
+    def callback(keys):
+        with lock:
+            ticks.extend(keys)
+
+    scheduler = FlowScheduler(callback, max_wait=0.01)
+    scheduler.add('flow', 0.1)
+    scheduler.remove('flow')
+    scheduler.add('flow', 0.1)
+    scheduler.remove('flow')
+    scheduler.add('flow', 0.1)
+
+    time.sleep(1.05)
+    scheduler.remove('flow')
+
+    # About 10 ticks at one per interval; each stale entry would add another 10
+    assert 8 <= len(ticks) <= 12
+
+
+def test_removed_key_stops_ticking():
+    ticks = []
+    scheduler = FlowScheduler(ticks.extend, max_wait=0.01)
+    scheduler.add('flow', 0.05)
+    time.sleep(0.2)
+    scheduler.remove('flow')
+    count = len(ticks)
+    time.sleep(0.2)
+    assert len(ticks) == count
@@ -0,0 +1,58 @@
+"""
+Tests for cursor-based incremental fetch of glucose series
+"""
+import random
+from urllib.parse import quote
+
+from backend.app.models.glucose_reading import GlucoseReading
+from backend.app.util import db_connection
+
+
+def _insert(patient_id, timestamps):
+    """Insert one reading per ts; returns (ts, id) of each"""
+    readings = [{'patient_id': patient_id, 'glucose': 100 + i, 'ts': ts} for i, ts in enumerate(timestamps)]
+    with db_connection() as conn:
+        created = GlucoseReading.bulk_create(conn, readings, return_ids=True)
+    return [(reading['ts'], reading['id']) for reading in created]
+
+
+def _fetch_all_pages(client, patient_id, limit):
+    """Follow X-Next-Since/X-Next-Since-Id from the start until a short page"""
+    readings = []
+    since, since_id = 0, None
+    while True:
+        query = {'since': since, 'limit': limit}
+        if since_id is not None:
+            query['since_id'] = since_id
+        response = client.get(f'/glucose/{quote(patient_id)}', query_string=query)
+        assert response.status_code == 200
+        page = response.get_json()
+        readings.extend(page)
+        if len(page) < limit:
+            return readings
+        since = int(response.headers['X-Next-Since'])
+        since_id = int(response.headers['X-Next-Since-Id'])
+
+
+def test_pages_split_inside_tied_timestamps(client):
+    """Readings sharing a ts across page boundaries are returned exactly once, in (ts, id) order"""
+    patient_id = 'paging#tied'
+    base = 1_700_000_000_000
+    # Runs of 7 readings per ts so every page of 5 ends part-way through a run,
+    # inserted out of order so ids don't follow ts
+    timestamps = [base + (i // 7) * 1000 for i in range(70)]
+    random.Random(7).shuffle(timestamps)
+    keys = _insert(patient_id, timestamps)
+
+    readings = _fetch_all_pages(client, patient_id, limit=5)
+
+    assert [r['id'] for r in readings] == [reading_id for _, reading_id in sorted(keys)]
+
+
+def test_cursor_of_another_patient_is_rejected(client):
+    _insert('paging#a', [1_700_000_000_000])
+    (_, other_id), = _insert('paging#b', [1_700_000_000_000])
+
+    response = client.get(f"/glucose/{quote('paging#a')}", query_string={'since_id': other_id})
+
+    assert response.status_code == 410
@@ -0,0 +1,82 @@
+"""
+Tests for the incrementally maintained glucose rollups
+"""
+import random
+import sqlite3
+
+import pytest
+
+from backend.app.models.glucose_reading import GlucoseReading
+from backend.app.models.glucose_rollup import GlucoseRollup, GRANULARITIES
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    GlucoseReading.create_table(conn)
+    GlucoseRollup.create_table(conn)
+    yield conn
+    conn.close()
+
+
+def _insert_and_apply(conn, rows):
+    cursor = conn.cursor()
+    cursor.executemany("INSERT INTO glucose_reading (patient_id, glucose, ts) VALUES (?, ?, ?)", rows)
+    GlucoseRollup.apply(cursor, rows)
+    conn.commit()
+
+
+def _rollups(conn):
+    return {
+        granularity: {
+            (patient_id, bucket['bucket']): bucket
+            for patient_id in ('rollup#a', 'rollup#b')
+            for bucket in GlucoseRollup.get_buckets(conn, patient_id, granularity)
+        }
+        for granularity in GRANULARITIES
+    }
+
+
+def _assert_same(actual, expected):
+    assert actual.keys() == expected.keys()
+    for granularity in GRANULARITIES:
+        assert actual[granularity].keys() == expected[granularity].keys()
+        for key, bucket in expected[granularity].items():
+            got = actual[granularity][key]
+            for field in ('count', 'min', 'max', 'below', 'in_range', 'above'):
+                assert got[field] == bucket[field], (granularity, key, field)
+            assert got['sum'] == pytest.approx(bucket['sum'])
+            assert got['sum_sq'] == pytest.approx(bucket['sum_sq'])
+
+
+def test_incremental_upserts_match_a_rebuild(conn):
+    """Batches landing in buckets that already have rows add to them instead of replacing them"""
+    rng = random.Random(3)
+    base = 1_700_000_000_000
+    rows = [
+        (rng.choice(('rollup#a', 'rollup#b')), round(rng.uniform(40, 300), 1), base + rng.randrange(2 * 86_400_000))
+        for _ in range(3000)
+    ]
+    # Threshold values count as in range
+    rows += [('rollup#a', 70.0, base), ('rollup#a', 180.0, base), ('rollup#a', 69.9, base), ('rollup#a', 180.1, base)]
+    rng.shuffle(rows)
+
+    for start in range(0, len(rows), 137):
+        _insert_and_apply(conn, rows[start:start + 137])
+    incremental = _rollups(conn)
+
+    GlucoseRollup.rebuild(conn)
+
+    _assert_same(incremental, _rollups(conn))
+
+
+def test_single_readings_update_min_max_and_ranges(conn):
+    ts = 1_700_000_000_000
+    for glucose in (120.0, 65.0, 200.0, 150.0):
+        _insert_and_apply(conn, [('rollup#a', glucose, ts)])
+
+    for granularity in GRANULARITIES:
+        bucket, = GlucoseRollup.get_buckets(conn, 'rollup#a', granularity)
+        assert (bucket['count'], bucket['min'], bucket['max']) == (4, 65.0, 200.0)
+        assert (bucket['below'], bucket['in_range'], bucket['above']) == (1, 2, 1)
+        assert bucket['sum'] == pytest.approx(535.0)
@@ -0,0 +1,81 @@
+"""
+Tests for the vectorized glucose history generator
+"""
+import random
+from datetime import datetime
+
+import numpy as np
+
+from backend.app.services import history_generator
+from backend.app.services.history_generator import GLUCOSE_MAX, GLUCOSE_MIN, REGRESSION_FACTOR, generate_histories
+
+
+def _loop_history(base, variability, diabetic, meal_intensities, hours, rng):
+    """The original per-point generator for one patient and day"""
+    values = []
+    previous = base
+    for hour in hours:
+        meal_effect = 0.0
+        for meal_hour, intensity in zip(history_generator.MEAL_HOURS, meal_intensities):
+            diff = min(abs(hour - meal_hour), 24 - abs(hour - meal_hour))
+            if diff < history_generator.MEAL_WINDOW_HOURS:
+                meal_effect += intensity * np.exp(-diff ** 2 / (2 * history_generator.MEAL_WIDTH_HOURS ** 2))
+        target = base + meal_effect + history_generator.CIRCADIAN_AMPLITUDE * np.sin(2 * np.pi * hour / 24.0)
+        glucose = REGRESSION_FACTOR * previous + (1 - REGRESSION_FACTOR) * target
+        glucose += rng.normalvariate(0, variability / 6)
+        if diabetic and rng.random() < history_generator.EXTREME_RATE:
+            glucose += (1 if glucose < base else -1) * rng.uniform(15, 30)
+        glucose = max(GLUCOSE_MIN, min(GLUCOSE_MAX, glucose))
+        previous = glucose
+        values.append(round(glucose, 1))
+    return values
+
+
+def test_regress_matches_a_clipped_step_loop():
+    rng = np.random.default_rng(5)
+    inputs = rng.normal(30, 25, (4, 500))
+    base = np.array([60.0, 120.0, 180.0, 280.0])
+    pushes = (rng.random((4, 500)) < 0.2) * rng.uniform(15, 80, (4, 500))
+
+    result = history_generator._regress(inputs, base, REGRESSION_FACTOR, base, pushes)
+
+    for patient in range(4):
+        previous = base[patient]
+        for t in range(500):
+            value = REGRESSION_FACTOR * previous + inputs[patient, t]
+            value += pushes[patient, t] if value < base[patient] else -pushes[patient, t]
+            previous = min(GLUCOSE_MAX, max(GLUCOSE_MIN, value))
+            assert result[patient, t] == previous
+
+
+def test_histories_stay_in_range():
+    _, glucose = generate_histories([True, False] * 50, days=3, seed=11)
+
+    assert glucose.shape == (100, 3 * 288)
+    assert glucose.min() >= GLUCOSE_MIN
+    assert glucose.max() <= GLUCOSE_MAX
+
+
+def test_distribution_matches_the_original_loop():
+    """Cohort mean, spread and time out of range agree with the per-point loop"""
+    diabetic = [True, False] * 100
+    end_time = datetime(2024, 1, 2)
+    _, vectorized = generate_histories(diabetic, days=1, end_time=end_time, seed=2)
+
+    rng = random.Random(2)
+    hours = [(i * 5 / 60.0) % 24.0 for i in range(288)]
+    looped = []
+    for has_diabetes in diabetic:
+        base = rng.randint(120, 180) if has_diabetes else rng.randint(70, 120)
+        variability = rng.uniform(15, 25) if has_diabetes else rng.uniform(5, 15)
+        intensities = [rng.uniform(low, high) for low, high in
+                       zip(history_generator.MEAL_INTENSITY_LOW, history_generator.MEAL_INTENSITY_HIGH)]
+        looped.append(_loop_history(base, variability, has_diabetes, intensities, hours, rng))
+    looped = np.array(looped)
+
+    for group in (slice(0, None, 2), slice(1, None, 2)):
+        a, b = vectorized[group], looped[group]
+        assert abs(a.mean() - b.mean()) < 6
+        assert abs(a.std() - b.std()) < 5
+        assert abs((a < 70).mean() - (b < 70).mean()) < 0.05
+        assert abs((a > 180).mean() - (b > 180).mean()) < 0.05
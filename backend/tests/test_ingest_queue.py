@@ -0,0 +1,132 @@
+"""
+Tests for the write-behind ingest queue and /mock_update
+"""
+import json
+import subprocess
+import sys
+import textwrap
+import time
+from urllib.parse import quote
+
+import pytest
+
+from backend.app.services.ingest_queue import IngestQueue, QueueFull, ingest_queue
+
+
+def _points(count, glucose=120):
+    return [{'glucose': glucose + i} for i in range(count)]
+
+
+def _post(client, patient_id, points, **query):
+    return client.post('/mock_update', json={'patient_id': patient_id, 'data': points}, query_string=query)
+
+
+def test_flush_commits_everything_accepted():
+    written = []
+    queue = IngestQueue(lambda batch: written.extend(batch) or batch, batch_size=3, max_delay=60)
+    for i in range(10):
+        queue.submit([i])
+
+    assert queue.flush(timeout=5)
+    assert written == list(range(10))
+    assert queue.stats()['committed'] == 10
+    queue.close()
+
+
+def test_submit_over_max_depth_raises():
+    queue = IngestQueue(lambda batch: batch, max_depth=5, max_delay=60)
+    queue.submit([1, 2, 3])
+    with pytest.raises(QueueFull):
+        queue.submit([4, 5, 6])
+    assert queue.stats()['rejected'] == 3
+    queue.close()
+
+
+def test_failing_batch_is_counted_as_dropped():
+    def fail(batch):
+        raise RuntimeError('disk full')
+
+    queue = IngestQueue(fail, retries=2, max_delay=0)
+    queue.submit([1, 2])
+
+    assert queue.flush(timeout=5)
+    assert queue.stats()['dropped'] == 2
+    queue.close()
+
+
+def test_wait_returns_after_the_points_are_stored(client):
+    patient_id = 'ingest#wait'
+
+    response = _post(client, patient_id, _points(3), wait=1)
+
+    assert response.status_code == 200
+    # Served straight from SQLite: the cursor path skips the caches
+    stored = client.get(f'/glucose/{quote(patient_id)}', query_string={'since': 0}).get_json()
+    assert [r['glucose'] for r in stored] == [120, 121, 122]
+
+
+def test_full_queue_answers_429(client):
+    previous = ingest_queue.max_depth
+    ingest_queue.configure(max_depth=2)
+    try:
+        response = _post(client, 'ingest#full', _points(3))
+    finally:
+        ingest_queue.configure(max_depth=previous)
+
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '1'
+
+
+def test_wait_answers_500_when_the_write_fails(client, monkeypatch):
+    def fail(batch):
+        raise RuntimeError('disk full')
+
+    monkeypatch.setattr(ingest_queue, '_write', fail)
+
+    response = _post(client, 'ingest#dropped', _points(1), wait=1)
+
+    assert response.status_code == 500
+
+
+def test_wait_answers_503_when_the_commit_is_slow(app, client, monkeypatch):
+    write = ingest_queue._write
+
+    def slow(batch):
+        time.sleep(0.5)
+        return write(batch)
+
+    monkeypatch.setattr(ingest_queue, '_write', slow)
+    monkeypatch.setitem(app.config, 'INGEST_WAIT_TIMEOUT', 0.05)
+
+    response = _post(client, 'ingest#slow', _points(1), wait=1)
+
+    assert response.status_code == 503
+    assert ingest_queue.flush(timeout=5)
+
+
+def test_sigterm_commits_pending_readings(tmp_path):
+    """The default SIGTERM action skips atexit, so the signal handler has to drain the queue"""
+    out = tmp_path / 'written.json'
+    script = textwrap.dedent(f"""
+        import json, os, signal, time
+        from backend.app.services.ingest_queue import IngestQueue
+
+        written = []
+        def write(batch):
+            written.extend(batch)
+            with open({str(out)!r}, 'w') as f:
+                json.dump(written, f)
+            return batch
+
+        # max_delay keeps the readings pending until something forces a flush
+        queue = IngestQueue(write, max_delay=60)
+        queue.drain_on_signal()
+        queue.submit([1, 2, 3])
+        os.kill(os.getpid(), signal.SIGTERM)
+        time.sleep(5)
+    """)
+
+    result = subprocess.run([sys.executable, '-c', script], timeout=30)
+
+    assert result.returncode == -15
+    assert json.loads(out.read_text()) == [1, 2, 3]
@@ -0,0 +1,75 @@
+"""
+Tests for the latest-reading cache and its races between writers and fills
+"""
+from backend.app.models.reading_cache import LatestReadingCache, latest_readings
+from backend.app.services.glucose_service import GlucoseService
+
+
+def _reading(ts, glucose=100.0, patient_id='cache#a', reading_id=None):
+    return {'id': reading_id if reading_id is not None else ts, 'patient_id': patient_id, 'glucose': glucose, 'ts': ts}
+
+
+def test_offer_leaves_uncached_patients_to_fill():
+    cache = LatestReadingCache()
+    cache.offer(_reading(1000))
+
+    assert cache.get('cache#a') == (False, None)
+
+
+def test_offer_keeps_the_newer_cached_reading():
+    cache = LatestReadingCache()
+    cache.fill('cache#a', _reading(2000), cache.generation())
+    cache.offer(_reading(1000))
+
+    assert cache.get('cache#a') == (True, _reading(2000))
+
+
+def test_offer_replaces_a_known_empty_patient():
+    cache = LatestReadingCache()
+    cache.set_empty('cache#a')
+    cache.offer(_reading(1000))
+
+    assert cache.get('cache#a') == (True, _reading(1000))
+
+
+def test_fill_read_before_a_write_to_an_uncached_patient_is_discarded():
+    cache = LatestReadingCache()
+    # Reader misses and reads the database before the write lands
+    generation = cache.generation()
+    stale = _reading(1000)
+    cache.offer(_reading(2000))
+    cache.fill('cache#a', stale, generation)
+
+    assert cache.get('cache#a') == (False, None)
+
+
+def test_fill_read_before_a_write_to_a_cached_patient_keeps_the_write():
+    cache = LatestReadingCache()
+    cache.set_empty('cache#a')
+    generation = cache.generation()
+    cache.offer(_reading(2000))
+    cache.fill('cache#a', None, generation)
+
+    assert cache.get('cache#a') == (True, _reading(2000))
+
+
+def test_fill_after_invalidate_is_discarded():
+    cache = LatestReadingCache()
+    generation = cache.generation()
+    cache.invalidate('cache#a')
+    cache.fill('cache#a', _reading(1000), generation)
+
+    assert cache.get('cache#a') == (False, None)
+
+
+def test_backfill_does_not_hide_the_newest_reading(app):
+    """Writing an older reading for an uncached patient must not make it the cached latest"""
+    patient_id = 'cache#backfill'
+    base = 1_700_000_000_000
+    GlucoseService.add_readings([{'patient_id': patient_id, 'glucose': 150.0, 'ts': base}], return_ids=True)
+    latest_readings.invalidate(patient_id)
+
+    GlucoseService.add_readings([{'patient_id': patient_id, 'glucose': 90.0, 'ts': base - 3_600_000}], return_ids=True)
+
+    latest = GlucoseService.get_latest_reading(patient_id)
+    assert (latest['glucose'], latest['ts']) == (150.0, base)
@@ -64,6 +64,7 @@ def create_test_data(conn):
     
     # Create test patients
     patient_ids = [f"P{i:03d}" for i in range(1, 11)]
+    readings = []
     
     for patient_id in patient_ids:
         # Generate basic patient information
@@ -120,11 +121,14 @@ def create_test_data(conn):
             # Ensure glucose values are within reasonable range
             glucose = max(40, min(300, glucose))
             
-            # Create glucose reading
-            cursor.execute(
-                "INSERT INTO glucose_reading (patient_id, glucose, timestamp) VALUES (?, ?, ?)",
-                (patient_id, round(glucose, 1), timestamp)
-            )
+            # Collect glucose reading for the bulk insert
+            readings.append((patient_id, round(glucose, 1), timestamp))
+    
+    # Insert all glucose readings in one executemany call
+    cursor.executemany(
+        "INSERT INTO glucose_reading (patient_id, glucose, timestamp) VALUES (?, ?, ?)",
+        readings
+    )
     
     # Commit all changes
     conn.commit()
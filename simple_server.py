@@ -6,9 +6,10 @@ from datetime import datetime, timedelta
 from flask import Flask, render_template, jsonify, request
 from flask_socketio import SocketIO, emit
 import sqlite3
-import numpy as np
 import csv
 import pandas as pd
+from backend.app.services.history_generator import generate_histories, to_readings
+from backend.app.models.timestamps import format_ms
 
 # Create Flask application
 app = Flask(__name__)
@@ -83,16 +84,20 @@ socketio = SocketIO(app, cors_allowed_origins="*")
 # Load predefined patient data
 patient_data = {}
 
+# id -> predefined patient record, for constant-time lookups
+patient_index = {}
+
 def load_patient_csv():
     """Load predefined patient data from CSV file"""
-    global patient_data
+    global patient_data, patient_index
     
     try:
         # Use pandas to read CSV file
         df = pd.read_csv(PATIENT_CSV)
         
-        # Initialize patient data dictionary
+        # Initialize patient data dictionary and lookup index
         patient_data = {}
+        patient_index = {}
         
         # Group data by patient type
         for index, row in df.iterrows():
@@ -114,12 +119,14 @@ def load_patient_csv():
                 patient_data[patient_type] = []
             
             patient_data[patient_type].append(patient_info)
+            patient_index[patient_info['id']] = patient_info
         
         print(f"Loaded {sum(len(patients) for patients in patient_data.values())} patients from CSV")
     except Exception as e:
         print(f"Error loading patient CSV data: {e}")
         # If file doesn't exist or reading fails, create an empty dictionary
         patient_data = {}
+        patient_index = {}
 
 # Load patient data at startup
 load_patient_csv()
@@ -174,19 +181,18 @@ def get_patients():
 @app.route('/patient/<patient_id>')
 def get_patient(patient_id):
     # First check predefined patient data
-    for patient_type, patients in patient_data.items():
-        for patient in patients:
-            if patient['id'] == patient_id:
-                # Ensure all necessary fields are returned in correct format
-                return jsonify({
-                    'id': patient['id'],
-                    'type': patient['type'],
-                    'age': patient['age'],
-                    'weight': float(patient['weight']),
-                    'height': float(patient['height']),
-                    'has_diabetes': bool(patient['has_diabetes']),
-                    'diabetes_type': patient.get('diabetes_type')
-                })
+    patient = patient_index.get(patient_id)
+    if patient:
+        # Ensure all necessary fields are returned in correct format
+        return jsonify({
+            'id': patient['id'],
+            'type': patient['type'],
+            'age': patient['age'],
+            'weight': float(patient['weight']),
+            'height': float(patient['height']),
+            'has_diabetes': bool(patient['has_diabetes']),
+            'diabetes_type': patient.get('diabetes_type')
+        })
     
     # If predefined patient not found, check database
     patient = query_db("SELECT * FROM patient WHERE id = ?", [patient_id], one=True)
@@ -209,17 +215,8 @@ def get_glucose(patient_id):
     limit = request.args.get('limit', default=100, type=int)
     hours = request.args.get('hours', default=3, type=int)
     
-    # Check if patient exists
-    patient_exists = False
-    
-    # First check predefined patients
-    for patient_type, patients in patient_data.items():
-        for patient in patients:
-            if patient['id'] == patient_id:
-                patient_exists = True
-                break
-        if patient_exists:
-            break
+    # Check if patient exists, first among predefined patients
+    patient_exists = patient_id in patient_index
 
     # If not a predefined patient, check database
     if not patient_exists:
@@ -265,10 +262,8 @@ def add_patient():
         patient_id = data['id']
         
         # Check if ID already exists in predefined patients
-        for patient_type, patients in patient_data.items():
-            for patient in patients:
-                if patient.get('id') == patient_id:
-                    return jsonify({"success": False, "error": "Patient ID already exists in predefined data"}), 400
+        if patient_id in patient_index:
+            return jsonify({"success": False, "error": "Patient ID already exists in predefined data"}), 400
         
         # Check if ID already exists in database
         existing_patient = query_db("SELECT id FROM patient WHERE id = ?", [patient_id], one=True)
@@ -309,17 +304,8 @@ def initialize_patient_data(patient_id):
     
     # If it's a predefined patient, check if it exists
     if is_predefined_patient:
-        patient_found = False
-        for patient_type, patients in patient_data.items():
-            for patient in patients:
-                if patient['id'] == patient_id:
-                    patient_found = True
-                    patient_info = patient
-                    break
-            if patient_found:
-                break
-        
-        if not patient_found:
+        patient_info = patient_index.get(patient_id)
+        if not patient_info:
             return jsonify({"error": "Predefined patient not found"}), 404
     else:
         # If it's a custom patient, check the database
@@ -338,99 +324,22 @@ def initialize_patient_data(patient_id):
         cursor.execute("DELETE FROM glucose_reading WHERE patient_id = ?", [patient_id])
         conn.commit()
         
-        # Determine base glucose values based on patient's diabetes status
+        # Determine glucose profile based on patient's diabetes status
         has_diabetes = patient_info.get('has_diabetes', random.choice([True, False]))
-        if has_diabetes:
-            base_glucose = random.randint(120, 180)
-            variability = random.uniform(15, 25)  # Reduce variability for better continuity
-        else:
-            base_glucose = random.randint(70, 120)
-            variability = random.uniform(5, 15)   # Reduce variability for better continuity
         
-        # Ensure accurate 24-hour data is generated, starting from current time and going back
-        # 5-minute intervals, 288 points total
+        # Generate accurate 24-hour data ending at the current time
+        # 5-minute intervals, 288 points total, already in chronological order
         now = datetime.now()
+        timestamps, glucose = generate_histories(
+            [has_diabetes], days=1, interval_minutes=5, end_time=now + timedelta(minutes=5)
+        )
+        all_data_points = to_readings([patient_id], timestamps, glucose)
         
-        # Define meal times and use smoother impact function
-        meal_times = [
-            {'hour': 7.5, 'intensity': random.uniform(20, 40)},  # Breakfast
-            {'hour': 12.5, 'intensity': random.uniform(25, 45)}, # Lunch
-            {'hour': 18.5, 'intensity': random.uniform(30, 50)}  # Dinner
-        ]
-        
-        # Initialize glucose value for first point
-        prev_glucose = base_glucose
-        all_data_points = []
-        
-        # Generate glucose history data (we generate backwards, from now to the past)
-        for i in range(288):  # 12 readings/hour * 24 hours = 288 points
-            # Generate a point every 5 minutes going backwards from now
-            timestamp = now - timedelta(minutes=5*i)
-            hour_in_day = timestamp.hour + timestamp.minute / 60.0
-            
-            # Calculate sum of all meal effects, using Gaussian function for smooth transition
-            meal_effect = 0
-            for meal in meal_times:
-                # Calculate hour difference between current time and meal time
-                hour_diff = min(abs(hour_in_day - meal['hour']), 
-                                abs(hour_in_day - meal['hour'] + 24),
-                                abs(hour_in_day - meal['hour'] - 24))
-                # Use Gaussian function to smooth meal effect transition
-                # Effect within 3 hours, peak at meal time
-                if hour_diff < 3:
-                    # Gaussian function, maximum at meal time, then gradually decreases
-                    gaussian_factor = np.exp(-((hour_diff) ** 2) / (2 * 0.5 ** 2))
-                    meal_effect += meal['intensity'] * gaussian_factor
-            
-            # Add circadian rhythm variation - use sine function to simulate natural daily fluctuation
-            day_phase = 2 * np.pi * hour_in_day / 24.0
-            circadian_effect = 8 * np.sin(day_phase)  # Circadian effect, reduce amplitude for smoothness
-            
-            # Add continuous randomness - based on previous point value, not completely random
-            # Use mean regression model: current value tends to regress towards base value, but with random fluctuation
-            regression_factor = 0.85  # Controls regression to previous value, higher means more continuity
-            
-            # Calculate target glucose value (base + meal + circadian)
-            target_glucose = base_glucose + meal_effect + circadian_effect
-            
-            # Perform mean regression between target value and previous value
-            # This ensures each point is related to the previous one, creating continuity
-            glucose = regression_factor * prev_glucose + (1 - regression_factor) * target_glucose
-            
-            # Add some small random fluctuations
-            noise = random.normalvariate(0, variability/6)  # Reduce noise for smoothness
-            glucose += noise
-            
-            # For diabetic patients, occasionally add extreme values, but maintain continuity
-            if has_diabetes and random.random() < 0.03:  # Reduce extreme value frequency
-                # Smoother extreme value handling
-                direction = 1 if glucose < base_glucose else -1  # Shift in direction opposite to current
-                extreme_factor = random.uniform(15, 30)  # Smaller extreme values for realism
-                glucose += direction * extreme_factor
-            
-            # Ensure glucose values are within reasonable range
-            glucose = max(40, min(300, glucose))
-            
-            # Save as base value for next point
-            prev_glucose = glucose
-            
-            # Add data point to list
-            all_data_points.append({
-                'patient_id': patient_id,
-                'glucose': round(glucose, 1),
-                'timestamp': timestamp
-            })
-        
-        # Data is generated from now to past, but we need to insert in chronological order
-        # Since we generated in reverse order, reverse the list to insert in time order
-        all_data_points.reverse()
-        
-        # Insert all data points
-        for point in all_data_points:
-            cursor.execute(
-                "INSERT INTO glucose_reading (patient_id, glucose, timestamp) VALUES (?, ?, ?)",
-                (point['patient_id'], point['glucose'], point['timestamp'])
-            )
+        # Insert all data points in a single executemany call
+        cursor.executemany(
+            "INSERT INTO glucose_reading (patient_id, glucose, timestamp) VALUES (?, ?, ?)",
+            [(point['patient_id'], point['glucose'], format_ms(point['ts'])) for point in all_data_points]
+        )
         
         conn.commit()
         conn.close()
@@ -487,10 +396,8 @@ def mock_update():
         patient_id = data['patient_id']
         data_points = data['data']
         
-        # Save data points to database
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
+        # Collect valid data points
+        rows = []
         for point in data_points:
             glucose = point.get('glucose')
             timestamp = point.get('timestamp')
@@ -505,12 +412,15 @@ def mock_update():
                 except:
                     pass  # If conversion fails, use original timestamp
                 
-                # Insert data point
-                cursor.execute(
-                    "INSERT INTO glucose_reading (patient_id, glucose, timestamp) VALUES (?, ?, ?)",
-                    (patient_id, glucose, timestamp)
-                )
+                rows.append((patient_id, glucose, timestamp))
         
+        # Insert all data points in one transaction
+        conn = sqlite3.connect(DB_FILE)
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT INTO glucose_reading (patient_id, glucose, timestamp) VALUES (?, ?, ?)",
+            rows
+        )
         conn.commit()
         conn.close()
         
@@ -534,19 +444,8 @@ def start_data_flow(patient_id):
     try:
         print(f"Received request to start data flow, patient ID: {patient_id}")
         
-        # Check if patient exists
-        patient_exists = False
-        
-        # Check predefined patients
-        print(f"Checking if {patient_id} exists in predefined patient list")
-        for patient_type, patients in patient_data.items():
-            for p in patients:
-                if p['id'] == patient_id:
-                    patient_exists = True
-                    print(f"Found predefined patient: {p}")
-                    break
-            if patient_exists:
-                break
+        # Check if patient exists among predefined patients
+        patient_exists = patient_id in patient_index
         
         if patient_exists:
             print(f"Patient {patient_id} found in predefined list")
@@ -665,24 +564,14 @@ def stop_patient_data_flow(patient_id):
 
 # Generate new glucose reading
 def generate_new_glucose_reading(patient_id, force_new_base=False):
-    # Get patient information
-    patient = query_db("SELECT * FROM patient WHERE id = ?", [patient_id], one=True)
-    if not patient:
-        # Check if it's a predefined patient
-        patient_found = False
-        for patient_type, patients in patient_data.items():
-            for p in patients:
-                if p['id'] == patient_id:
-                    patient_found = True
-                    patient_info = p
-                    has_diabetes = patient_info.get('has_diabetes', False)
-                    break
-            if patient_found:
-                break
-                
-        if not patient_found:
-            return None
+    # Get patient information, predefined patients first so they never hit the database
+    patient_info = patient_index.get(patient_id)
+    if patient_info:
+        has_diabetes = patient_info.get('has_diabetes', False)
     else:
+        patient = query_db("SELECT * FROM patient WHERE id = ?", [patient_id], one=True)
+        if not patient:
+            return None
         has_diabetes = bool(patient['has_diabetes'])
     
     # If force new base value, or no history found, generate new initial glucose value
@@ -106,7 +106,11 @@ document.addEventListener('DOMContentLoaded', function() {
             // Unsubscribe from current patient
             if (window.currentPatientId) {
                 console.log('Unsubscribing from patient:', window.currentPatientId);
-                // Logic to unsubscribe can be added here
+                if (typeof window.unsubscribePatient === 'function') {
+                    window.unsubscribePatient(window.currentPatientId);
+                } else if (socket) {
+                    socket.emit('unsubscribe', window.currentPatientId);
+                }
             }
             
             // Subscribe to new patient
@@ -205,7 +209,10 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Subscribe to patient data updates
     function subscribeToPatient(patientId) {
-        if (socket) {
+        if (typeof window.subscribePatient === 'function') {
+            console.log('Subscribing to patient:', patientId);
+            window.subscribePatient(patientId);
+        } else if (socket) {
             console.log('Subscribing to patient:', patientId);
             socket.emit('subscribe', patientId);
         }
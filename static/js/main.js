@@ -8,12 +8,37 @@ document.addEventListener('DOMContentLoaded', function() {
     const zoomResetButton = document.getElementById('zoom-reset');
     const fullscreenButton = document.getElementById('toggle-fullscreen');
     
+    // Upper bound on points requested for a chart; the server downsamples longer series
+    const MAX_CHART_POINTS = 2000;
+    
     // Initialize Socket.IO connection
     const socket = io();
     
+    // Patients this page is subscribed to; rooms are per connection, so they are
+    // joined again whenever the socket reconnects
+    const subscribedPatients = new Set();
+    
+    function subscribePatient(patientId) {
+        if (!patientId || subscribedPatients.has(patientId)) {
+            return;
+        }
+        subscribedPatients.add(patientId);
+        // While disconnected the connect handler sends it instead
+        if (socket.connected) {
+            socket.emit('subscribe', patientId);
+        }
+    }
+    
+    function unsubscribePatient(patientId) {
+        if (subscribedPatients.delete(patientId) && socket.connected) {
+            socket.emit('unsubscribe', patientId);
+        }
+    }
+    
     // Add socket event logging for debugging
     socket.on('connect', function() {
         console.log('WebSocket connection established, ID:', socket.id);
+        subscribedPatients.forEach(patientId => socket.emit('subscribe', patientId));
     });
     
     socket.on('connect_error', function(error) {
@@ -24,7 +49,9 @@ document.addEventListener('DOMContentLoaded', function() {
         console.warn('WebSocket connection disconnected, reason:', reason);
     });
     
-    // Make socket available to control panel
+    // Make socket and subscriptions available to control panel
+    window.subscribePatient = subscribePatient;
+    window.unsubscribePatient = unsubscribePatient;
     if (typeof window.setSocket === 'function') {
         window.setSocket(socket);
     }
@@ -405,6 +432,12 @@ document.addEventListener('DOMContentLoaded', function() {
             })
             .then(patient => {
                 console.log("Received patient data:", patient);
+                
+                // Move the socket subscription to the newly selected patient's room
+                if (currentPatientId !== patientId) {
+                    unsubscribePatient(currentPatientId);
+                    subscribePatient(patientId);
+                }
                 currentPatientId = patientId;
                 
                 // Always display patient basic information
@@ -461,6 +494,52 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
     
+    // Fetch a glucose series in the compact columnar format and expand it into reading objects
+    function fetchGlucoseSeries(url) {
+        return fetch(url, { headers: { 'Accept': 'application/vnd.glucose.columns+json' } })
+            .then(response => {
+                console.log("Response status:", response.status);
+                if (!response.ok) {
+                    throw new Error(`Server returned error: ${response.status}`);
+                }
+                return response.json();
+            })
+            .then(series => series.t.map((t, i) => ({
+                id: series.id[i],
+                patient_id: series.patient_id,
+                glucose: series.g[i],
+                // t is the server's wall clock as epoch ms, so the UTC digits are the timestamp
+                timestamp: new Date(t).toISOString().slice(0, 19).replace('T', ' ')
+            })));
+    }
+    
+    // Bring a patient's cached 24 hour history up to date, fetching only the readings
+    // after the last cached one; falls back to the full range without a usable cache
+    function refreshHistoricalData(patientId) {
+        const encodedPatientId = encodeURIComponent(patientId);
+        const fullUrl = `/glucose/${encodedPatientId}?hours=24&max_points=${MAX_CHART_POINTS}`;
+        const cached = patientStates[patientId].historicalData;
+        const last = cached && cached.length > 0 ? cached[cached.length - 1] : null;
+        if (!last || last.id == null) {
+            return fetchGlucoseSeries(fullUrl);
+        }
+        
+        return fetchGlucoseSeries(`/glucose/${encodedPatientId}?since_id=${last.id}&limit=${MAX_CHART_POINTS}`)
+            .then(newer => {
+                // A full page means too much is new to append, so reload the downsampled range
+                if (newer.length >= MAX_CHART_POINTS) {
+                    return fetchGlucoseSeries(fullUrl);
+                }
+                console.log(`Fetched ${newer.length} readings newer than the cached history`);
+                return cached.concat(newer);
+            })
+            .catch(error => {
+                // e.g. 410 when the patient was re-initialized and the cursor no longer exists
+                console.log('Incremental fetch failed, reloading the full history:', error.message);
+                return fetchGlucoseSeries(fullUrl);
+            });
+    }
+    
     function fetchGlucoseData(patientId) {
         // Don't fetch data if patient is not initialized
         if (!patientStates[patientId] || !patientStates[patientId].isDataInitialized) {
@@ -477,19 +556,12 @@ document.addEventListener('DOMContentLoaded', function() {
         const encodedPatientId = encodeURIComponent(patientId);
         
         // Log the full URL for debugging
-        const url = `/glucose/${encodedPatientId}?hours=${hours}`;
+        const url = `/glucose/${encodedPatientId}?hours=${hours}&max_points=${MAX_CHART_POINTS}`;
         console.log("Making API request to:", url);
         console.log(`Chart will display ${timeRange} hours but we're loading the full dataset for historical context`);
         
         // Fetch the data
-        fetch(url)
-            .then(response => {
-                console.log("Response status:", response.status);
-                if (!response.ok) {
-                    throw new Error(`Server returned error: ${response.status}`);
-                }
-                return response.json();
-            })
+        fetchGlucoseSeries(url)
             .then(data => {
                 console.log(`Received ${data.length} glucose readings for display`);
                 
@@ -1394,18 +1466,17 @@ document.addEventListener('DOMContentLoaded', function() {
             startButton.disabled = true;
         }
         
-        // Always fetch fresh historical data to ensure we have it for gray dotted line display
-        console.log('Fetching historical data for background display in real-time mode');
+        // Bring the historical data up to date for the gray dotted line display
+        console.log('Refreshing historical data for background display in real-time mode');
         
         // Properly encode the patient ID for URL safety
         const encodedPatientId = encodeURIComponent(patientId);
         console.log('Encoded patient ID for API request:', encodedPatientId);
         
         // First get historical data, then start the data flow
-        fetch(`/glucose/${encodedPatientId}?hours=24`)
-            .then(response => response.json())
+        refreshHistoricalData(patientId)
             .then(data => {
-                console.log(`Fetched ${data.length} historical data points for background display`);
+                console.log(`Using ${data.length} historical data points for background display`);
                 
                 // Sort the historical data by timestamp to ensure proper ordering
                 data.sort((a, b) => new Date(a.timestamp) - new Date(b.timestamp));
@@ -1470,9 +1541,9 @@ document.addEventListener('DOMContentLoaded', function() {
                     console.log('Switched to real-time mode automatically');
                 }
                 
-                // Subscribe to real-time updates for this patient
+                // Subscribe to real-time updates for this patient (a no-op once it is selected)
                 console.log('订阅患者实时数据', patientId);
-                socket.emit('subscribe', patientId);
+                subscribePatient(patientId);
                 
                 // Set up event listener for real-time data if not already set
                 if (!window.realTimeListenerSet) {
@@ -2038,6 +2109,15 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
+    // Batched updates from the server carry several patients/points in one event;
+    // replay each patient's update through the regular glucose_update handlers
+    socket.on('glucose_batch', function(batch) {
+        const handlers = socket.listeners('glucose_update');
+        (batch.updates || []).forEach(update => {
+            handlers.forEach(handler => handler(update));
+        });
+    });
+    
     // 修改socketio处理函数来处理来自服务器的实时数据更新
     socket.on('glucose_update', function(data) {
         console.log("收到WebSocket数据更新:", data);